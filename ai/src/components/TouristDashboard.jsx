@@ -5,6 +5,9 @@ import { auth } from '../firebase';
 import LoadingSpinner from './LoadingSpinner';
 import TouristMap from './TouristMap';
 
+// Geocoding, weather and routing go through the backend's caching places proxy
+const PLACES_PROXY_URL = import.meta.env.VITE_PLACES_PROXY_URL || "http://localhost:5004";
+
 const TouristDashboard = ({ onLogout }) => {
   const [wallet, setWallet] = useState(1000);
   const [weather, setWeather] = useState(null);
@@ -47,7 +50,7 @@ const TouristDashboard = ({ onLogout }) => {
           
           try {
             const res = await axios.get(
-              `https://nominatim.openstreetmap.org/reverse?format=json&lat=${latitude}&lon=${longitude}`
+              `${PLACES_PROXY_URL}/reverse?lat=${latitude}&lon=${longitude}`
             );
             if (res.data && res.data.address) {
               const locationName = 
@@ -83,7 +86,7 @@ const TouristDashboard = ({ onLogout }) => {
   const getNearbyPlaces = async (lat, lng) => {
     try {
       const response = await axios.get(
-        `https://api.open-meteo.com/v1/forecast?latitude=${lat}&longitude=${lng}&current_weather=true&timezone=auto`
+        `${PLACES_PROXY_URL}/weather?lat=${lat}&lon=${lng}`
       );
       setWeather(response.data.current_weather);
       
@@ -117,9 +120,7 @@ const TouristDashboard = ({ onLogout }) => {
     
     try {
       const res = await axios.get(
-        `https://nominatim.openstreetmap.org/search?format=json&q=${encodeURIComponent(
-          name
-        )}&limit=5&addressdetails=1`
+        `${PLACES_PROXY_URL}/search?q=${encodeURIComponent(name)}&limit=5`
       );
       
       if (res.data && res.data.length > 0) {
@@ -151,7 +152,7 @@ const TouristDashboard = ({ onLogout }) => {
       const routePromises = modes.map(async (mode) => {
         try {
           const response = await axios.get(
-            `https://router.project-osrm.org/route/v1/${mode}/${origin.lng},${origin.lat};${dest.lng},${dest.lat}?overview=full&steps=true&annotations=true`
+            `${PLACES_PROXY_URL}/route/${mode}?from_lat=${origin.lat}&from_lon=${origin.lng}&to_lat=${dest.lat}&to_lon=${dest.lng}`
           );
 
           if (response.data && response.data.routes && response.data.routes.length > 0) {
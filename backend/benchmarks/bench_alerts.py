@@ -0,0 +1,38 @@
+"""
+Benchmark listing a user's alerts at increasing total alert counts
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_alerts
+"""
+import sys
+
+from benchmarks.harness import benchmark, main, run_coroutine
+from src.alert_system import main as alert_system
+from src.alert_system.main import Alert, AlertService
+
+@benchmark('alerts.get_user_alerts', sizes=(10, 1_000, 100_000), unit='alerts')
+def get_user_alerts(n):
+    """The /alerts/{user_id} handler with n alerts spread over 1,000 users"""
+    local = AlertService()
+    local.alerts = [
+        Alert(
+            id=f"alert_{i}",
+            user_id=f"user_{i % 1_000}",
+            alert_type="panic",
+            severity="high",
+            location={"latitude": 12.9716, "longitude": 77.5946}
+        )
+        for i in range(n)
+    ]
+
+    def call():
+        # The handler reads the module's service; swap it only for the call
+        shared, alert_system.service = alert_system.service, local
+        try:
+            return run_coroutine(alert_system.get_user_alerts("user_7"))
+        finally:
+            alert_system.service = shared
+    return call
+
+if __name__ == "__main__":
+    sys.exit(main(['-k', 'alerts.'] + sys.argv[1:]))
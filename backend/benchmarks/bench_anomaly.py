@@ -0,0 +1,78 @@
+"""
+Benchmark anomaly feature extraction and scoring at increasing batch sizes
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_anomaly
+"""
+import atexit
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.harness import benchmark, main
+from src.ai_engine.main import AnomalyDetector, LocationData
+from src.ai_engine.regions import RegionModelStore
+from src.common.wire import PingColumns
+
+SIZES = (1, 100, 10_000)
+
+_detector = None
+
+def _fitted_detector() -> AnomalyDetector:
+    """One detector fit on random pings, shared by every benchmark here"""
+    global _detector
+    if _detector is None:
+        scratch = tempfile.TemporaryDirectory(prefix='bench-anomaly-')
+        atexit.register(scratch.cleanup)
+        _detector = AnomalyDetector(
+            model_path=os.path.join(scratch.name, 'model.joblib'),
+            regions=RegionModelStore(os.path.join(scratch.name, 'regions'))
+        )
+        _detector.model.fit(_detector._extract_features(_pings(2_000, seed=0)))
+    return _detector
+
+def _pings(n, seed=42):
+    rng = np.random.default_rng(seed)
+    return [
+        LocationData(
+            user_id=f"user_{i % 100}",
+            latitude=lat,
+            longitude=lon,
+            timestamp="2025-08-30T00:00:00Z",
+            speed=speed,
+            accuracy=accuracy
+        )
+        for i, (lat, lon, speed, accuracy) in enumerate(zip(
+            rng.uniform(12.85, 13.05, n).tolist(),
+            rng.uniform(77.5, 77.7, n).tolist(),
+            rng.uniform(0, 15, n).tolist(),
+            rng.uniform(5, 20, n).tolist()
+        ))
+    ]
+
+@benchmark('anomaly.extract_features', sizes=SIZES, unit='pings')
+def extract_features(n):
+    detector, pings = _fitted_detector(), _pings(n)
+    return lambda: detector._extract_features(pings)
+
+@benchmark('anomaly.score_samples', sizes=SIZES, unit='pings')
+def score_samples(n):
+    detector = _fitted_detector()
+    features = detector._extract_features(_pings(n))
+    return lambda: detector.model.score_samples(features)
+
+@benchmark('anomaly.detect_anomaly', unit='pings')
+def detect_anomaly(n):
+    detector, ping = _fitted_detector(), _pings(1)[0]
+    return lambda: detector.detect_anomaly(ping)
+
+@benchmark('anomaly.detect_batch', sizes=SIZES, unit='pings')
+def detect_batch(n):
+    detector = _fitted_detector()
+    columns = PingColumns.from_records([p.model_dump() for p in _pings(n)])
+    return lambda: detector.detect_batch(columns)
+
+if __name__ == "__main__":
+    sys.exit(main(['-k', 'anomaly.'] + sys.argv[1:]))
@@ -0,0 +1,55 @@
+"""
+Benchmark the geodesy helpers, scalar and vectorized
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_geodesy
+"""
+import math
+import sys
+
+import numpy as np
+
+from benchmarks.harness import benchmark, main
+from src.common.utils import geodesy, helpers
+
+def _scalar_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+def _pairs(n, seed=42):
+    rng = np.random.default_rng(seed)
+    lat1, lat2 = rng.uniform(-90, 90, (2, n))
+    lon1, lon2 = rng.uniform(-180, 180, (2, n))
+    return lat1, lon1, lat2, lon2
+
+@benchmark('geodesy.scalar_haversine', sizes=(1, 100, 10_000), unit='pairs')
+def scalar_haversine(n):
+    rows = list(zip(*(column.tolist() for column in _pairs(n))))
+    return lambda: [_scalar_haversine(*r) for r in rows]
+
+@benchmark('geodesy.calculate_distance', sizes=(1, 100, 10_000), unit='pairs')
+def calculate_distance(n):
+    rows = list(zip(*(column.tolist() for column in _pairs(n))))
+    return lambda: [helpers.calculate_distance(*r) for r in rows]
+
+@benchmark('geodesy.haversine', sizes=(1, 100, 10_000, 1_000_000), unit='pairs')
+def haversine(n):
+    lat1, lon1, lat2, lon2 = _pairs(n)
+    return lambda: geodesy.haversine(lat1, lon1, lat2, lon2)
+
+@benchmark('geodesy.pairwise_distances', sizes=(100, 500, 2_000), unit='points')
+def pairwise_distances(n):
+    rng = np.random.default_rng(42)
+    lats, lons = rng.uniform(-60, 60, n), rng.uniform(-180, 180, n)
+    return lambda: geodesy.pairwise_distances(lats, lons)
+
+@benchmark('geodesy.trajectory_speeds', sizes=(10, 1_000, 100_000), unit='points')
+def trajectory_speeds(n):
+    rng = np.random.default_rng(42)
+    lats, lons = rng.uniform(12, 13, n), rng.uniform(77, 78, n)
+    times = np.arange(n, dtype=np.float64) * 5.0
+    return lambda: geodesy.trajectory_speeds(lats, lons, times)
+
+if __name__ == "__main__":
+    sys.exit(main(['-k', 'geodesy.'] + sys.argv[1:]))
@@ -0,0 +1,59 @@
+"""
+Benchmark geofence containment at increasing fence counts
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_geofence
+"""
+import math
+import sys
+
+import numpy as np
+
+from benchmarks.harness import benchmark, main
+from src.common.wire import PingColumns
+from src.geo_service.main import GeoFence, GeoFenceService, Location
+
+FENCE_COUNTS = (1, 10, 100, 1_000)
+
+def _service(fences: int, seed: int = 42) -> GeoFenceService:
+    """Fences of 200-600 m squares scattered over about 10 km around Bengaluru"""
+    rng = np.random.default_rng(seed)
+    service = GeoFenceService()
+    for i, (lat, lon, half) in enumerate(zip(
+        rng.uniform(12.92, 13.02, fences).tolist(),
+        rng.uniform(77.54, 77.64, fences).tolist(),
+        rng.uniform(0.001, 0.003, fences).tolist()
+    )):
+        dlon = half / math.cos(math.radians(lat))
+        service.add_fence(GeoFence(
+            id=f"fence_{i}",
+            name=f"Zone {i}",
+            risk_level="medium",
+            coordinates=[
+                [lat - half, lon - dlon], [lat - half, lon + dlon],
+                [lat + half, lon + dlon], [lat + half, lon - dlon], [lat - half, lon - dlon]
+            ]
+        ))
+    return service
+
+@benchmark('geofence.check_location', sizes=FENCE_COUNTS, unit='fences')
+def check_location(n):
+    service = _service(n)
+    location = Location(user_id="bench_user", latitude=12.9716, longitude=77.5946, timestamp="2025-08-30T00:00:00Z")
+    return lambda: service.check_location(location)
+
+@benchmark('geofence.check_batch', sizes=FENCE_COUNTS, unit='fences')
+def check_batch(n):
+    """1,000 pings per call"""
+    service = _service(n)
+    rng = np.random.default_rng(7)
+    columns = PingColumns.from_records([
+        {"user_id": f"user_{i}", "latitude": lat, "longitude": lon, "timestamp": 1756512000.0}
+        for i, (lat, lon) in enumerate(zip(
+            rng.uniform(12.92, 13.02, 1_000).tolist(), rng.uniform(77.54, 77.64, 1_000).tolist()
+        ))
+    ])
+    return lambda: service.check_batch(columns)
+
+if __name__ == "__main__":
+    sys.exit(main(['-k', 'geofence.'] + sys.argv[1:]))
@@ -0,0 +1,342 @@
+"""
+Micro-benchmark harness with parameterized sizes, baselines and scaling curves
+
+Benchmarks are registered with ``@benchmark``. The decorated function is a
+setup function that takes a data size and returns the zero-argument callable
+to time, so building inputs is never measured:
+
+    @benchmark('geodesy.haversine', sizes=(1, 1000, 100_000), unit='pairs')
+    def haversine(n):
+        lat1, lon1, lat2, lon2 = ...
+        return lambda: geodesy.haversine(lat1, lon1, lat2, lon2)
+
+For every size the callable runs in ``rounds`` rounds of ``loops`` calls,
+with ``loops`` calibrated so one round lasts at least ``min_time`` seconds
+and the garbage collector paused (as in timeit). Per-call min, median, mean
+and standard deviation are recorded.
+
+Benchmarks with several sizes also get a scaling curve: the local log-log
+slope between neighbouring sizes and a fitted exponent. A slope near 0
+means the cost is O(1) there, near 1 means O(n), near 2 means O(n^2). The
+``knee`` is the first size at which the slope reaches 0.5, where the work
+per element starts to outweigh the fixed cost.
+
+Usage (from the backend directory):
+    python -m benchmarks                      # run everything
+    python -m benchmarks -k geofence --quick  # a subset, fewer rounds
+    python -m benchmarks --save               # store .benchmarks/baseline.json
+    python -m benchmarks --compare            # exit 1 on slowdowns past --threshold
+"""
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import argparse
+import gc
+import importlib
+import json
+import math
+import os
+import pkgutil
+import platform
+import statistics
+import sys
+import time
+
+DEFAULT_BASELINE = os.path.join('.benchmarks', 'baseline.json')
+DEFAULT_THRESHOLD = 0.10
+
+class Benchmark:
+    """A registered setup function and the sizes to run it at"""
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[int], Callable[[], Any]],
+        sizes: Sequence[int],
+        unit: str,
+        threshold: Optional[float]
+    ):
+        self.name = name
+        self.setup = setup
+        self.sizes = list(sizes)
+        self.unit = unit
+        self.threshold = threshold
+
+_registry: Dict[str, Benchmark] = {}
+
+def benchmark(
+    name: str,
+    sizes: Sequence[int] = (1,),
+    unit: str = 'items',
+    threshold: Optional[float] = None
+):
+    """
+    Register a setup function as a benchmark
+
+    Args:
+        name: Dotted benchmark name, used by -k filters and in baselines
+        sizes: Data sizes passed to the setup function, one measurement each
+        unit: What a size counts, for reports
+        threshold: Allowed slowdown for this benchmark, overriding --threshold
+    """
+    def register(setup: Callable[[int], Callable[[], Any]]):
+        existing = _registry.get(name)
+        # A module run with -m is imported again by discover(); only a different function is a clash
+        if existing is not None and existing.setup.__qualname__ != setup.__qualname__:
+            raise ValueError(f"Benchmark {name} is already registered")
+        _registry[name] = Benchmark(name, setup, sizes, unit, threshold)
+        return setup
+    return register
+
+def discover() -> Dict[str, Benchmark]:
+    """Import every benchmarks.bench_* module so their benchmarks register"""
+    package = importlib.import_module('benchmarks')
+    for module in pkgutil.iter_modules(package.__path__):
+        if module.name.startswith('bench_'):
+            importlib.import_module(f'benchmarks.{module.name}')
+    return dict(_registry)
+
+def run_coroutine(coro) -> Any:
+    """Run a coroutine that never suspends without an event loop, e.g. an async endpoint with no awaits"""
+    try:
+        coro.send(None)
+    except StopIteration as e:
+        return e.value
+    coro.close()
+    raise RuntimeError("Coroutine suspended; benchmark it on an event loop instead")
+
+def measure(func: Callable[[], Any], rounds: int = 7, min_time: float = 0.02) -> Dict[str, Any]:
+    """Per-call timing statistics of ``func`` in seconds"""
+    func()  # warm caches and lazy imports before calibrating
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        loops = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            # Aim a little past min_time so the next try usually succeeds
+            loops = max(loops * 2, int(loops * min_time * 1.2 / max(elapsed, 1e-9)))
+
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - start) / loops)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {
+        'loops': loops,
+        'rounds': rounds,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0
+    }
+
+def scaling(sizes: Sequence[int], times: Sequence[float]) -> Optional[Dict[str, Any]]:
+    """
+    Scaling curve of per-call times measured at increasing sizes
+
+    Returns:
+        Optional[Dict[str, Any]]: Local slopes, fitted exponent, complexity
+            label and knee, or None with fewer than two sizes
+    """
+    points = sorted((n, t) for n, t in zip(sizes, times) if n > 0 and t > 0)
+    if len(points) < 2:
+        return None
+    logs = [(math.log(n), math.log(t)) for n, t in points]
+    slopes = [
+        (t2 - t1) / (n2 - n1)
+        for (n1, t1), (n2, t2) in zip(logs, logs[1:])
+    ]
+    mean_n = statistics.fmean(x for x, _ in logs)
+    mean_t = statistics.fmean(y for _, y in logs)
+    exponent = (
+        sum((x - mean_n) * (y - mean_t) for x, y in logs)
+        / sum((x - mean_n) ** 2 for x, _ in logs)
+    )
+    knee = next((points[i + 1][0] for i, slope in enumerate(slopes) if slope >= 0.5), None)
+    return {
+        'sizes': [n for n, _ in points],
+        'per_call': [t for _, t in points],
+        'per_item': [t / n for n, t in points],
+        'local_slopes': slopes,
+        'exponent': exponent,
+        'complexity': _complexity(exponent),
+        'knee': knee
+    }
+
+def _complexity(exponent: float) -> str:
+    for order, label in ((0, 'O(1)'), (1, 'O(n)'), (2, 'O(n^2)')):
+        if abs(exponent - order) < 0.25:
+            return label
+    return f'O(n^{exponent:.2f})'
+
+def _metadata() -> Dict[str, Any]:
+    from src.loadgen.report import git_commit
+
+    return {
+        'commit': git_commit(os.path.dirname(os.path.abspath(__file__))),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+
+def run(
+    benchmarks: Dict[str, Benchmark],
+    rounds: int = 7,
+    min_time: float = 0.02,
+    stream=sys.stderr
+) -> Dict[str, Any]:
+    """Measure every benchmark at every size, returning the results document"""
+    results = {}
+    for name, bench in sorted(benchmarks.items()):
+        sizes = {}
+        for n in bench.sizes:
+            stats = measure(bench.setup(n), rounds, min_time)
+            sizes[str(n)] = stats
+            if stream is not None:
+                print(f"{name:<40} n={n:<8} {_format_time(stats['median'])} "
+                      f"(min {_format_time(stats['min'])}, +/-{_format_time(stats['stddev'])})", file=stream)
+        results[name] = {
+            'unit': bench.unit,
+            'threshold': bench.threshold,
+            'sizes': sizes,
+            'scaling': scaling(bench.sizes, [sizes[str(n)]['median'] for n in bench.sizes])
+        }
+    return {'meta': _metadata(), 'benchmarks': results}
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+    stat: str = 'median'
+) -> List[Dict[str, Any]]:
+    """
+    Compare results against a baseline, size by size
+
+    Args:
+        baseline, current: Results documents from ``run``
+        threshold: Relative slowdown that counts as a regression (0.1 = 10%),
+            unless a benchmark sets its own
+        stat: Statistic to compare, 'median' or 'min'
+
+    Returns:
+        List[Dict[str, Any]]: One row per benchmark and size present in both,
+            with the ratio current/baseline and a ``regressed`` flag
+    """
+    rows = []
+    for name, result in sorted(current['benchmarks'].items()):
+        base = baseline.get('benchmarks', {}).get(name)
+        if base is None:
+            continue
+        limit = result.get('threshold')
+        limit = threshold if limit is None else limit
+        for size, stats in result['sizes'].items():
+            if size not in base['sizes']:
+                continue
+            before, after = base['sizes'][size][stat], stats[stat]
+            ratio = after / before if before > 0 else math.inf
+            rows.append({
+                'benchmark': name,
+                'size': int(size),
+                'baseline': before,
+                'current': after,
+                'ratio': ratio,
+                'threshold': limit,
+                'regressed': ratio > 1 + limit
+            })
+    return rows
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.3f} {unit:<2}"
+    return f"{seconds / 1e-9:8.1f} ns"
+
+def print_curves(results: Dict[str, Any], stream=sys.stderr) -> None:
+    for name, result in sorted(results['benchmarks'].items()):
+        curve = result['scaling']
+        if curve is None:
+            continue
+        knee = f", knee at n={curve['knee']}" if curve['knee'] is not None else ''
+        print(f"\n{name}: {curve['complexity']} (exponent {curve['exponent']:.2f}{knee})", file=stream)
+        print(f"  {'n (' + result['unit'] + ')':>16} {'per call':>12} {'per item':>12} {'slope':>6}", file=stream)
+        for i, (n, per_call, per_item) in enumerate(zip(curve['sizes'], curve['per_call'], curve['per_item'])):
+            slope = f"{curve['local_slopes'][i - 1]:6.2f}" if i else ''
+            print(f"  {n:>16} {_format_time(per_call)} {_format_time(per_item)} {slope:>6}", file=stream)
+
+def print_comparison(rows: List[Dict[str, Any]], stream=sys.stderr) -> None:
+    print(f"\n{'benchmark':<40} {'n':>8} {'baseline':>11} {'current':>11} {'change':>8}", file=stream)
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(
+            f"{row['benchmark']:<40} {row['size']:>8} {_format_time(row['baseline'])} "
+            f"{_format_time(row['current'])} {(row['ratio'] - 1) * 100:+7.1f}%{flag}",
+            file=stream
+        )
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the micro-benchmark suite")
+    parser.add_argument('-k', dest='filter', default=None, help="Only benchmarks whose name contains this")
+    parser.add_argument('--list', action='store_true', help="List benchmarks and their sizes")
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.02, help="Minimum seconds per round")
+    parser.add_argument('--quick', action='store_true', help="3 short rounds per size, for smoke runs")
+    parser.add_argument('--json', default=None, help="Write the results document here")
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, default=None,
+                        help=f"Store the results as the baseline (default {DEFAULT_BASELINE})")
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, default=None,
+                        help="Compare against a baseline and exit 1 on regressions")
+    parser.add_argument('--threshold', type=float,
+                        default=float(os.getenv('BENCH_THRESHOLD', DEFAULT_THRESHOLD)),
+                        help="Allowed relative slowdown, e.g. 0.1 for 10%% (env BENCH_THRESHOLD)")
+    parser.add_argument('--stat', choices=('median', 'min'), default='median')
+    return parser.parse_args(argv)
+
+def _write(path: str, document: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+        f.write('\n')
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    benchmarks = {
+        name: bench for name, bench in discover().items()
+        if args.filter is None or args.filter in name
+    }
+    if args.list:
+        for name, bench in sorted(benchmarks.items()):
+            print(f"{name:<40} {bench.unit}: {', '.join(map(str, bench.sizes))}")
+        return 0
+    if not benchmarks:
+        print(f"No benchmarks match {args.filter!r}", file=sys.stderr)
+        return 1
+
+    rounds, min_time = (3, 0.005) if args.quick else (args.rounds, args.min_time)
+    results = run(benchmarks, rounds, min_time)
+    print_curves(results)
+
+    if args.json:
+        _write(args.json, results)
+    if args.save:
+        _write(args.save, results)
+        print(f"\nBaseline saved to {args.save}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(json.load(f), results, args.threshold, args.stat)
+        print_comparison(rows)
+        regressions = [row for row in rows if row['regressed']]
+        if regressions:
+            print(f"\n{len(regressions)} measurement(s) slower than the baseline allows", file=sys.stderr)
+            return 1
+    return 0
@@ -0,0 +1,321 @@
+"""
+Streaming anomaly score statistics and drift-triggered model refresh
+
+Every scored ping is folded into a score sketch for its scope (the global
+model, or a region model; see src.ai_engine.regions) and the current time
+window. A scope's reference sketch holds the scores of the data its model
+was last fit on. From it the scope's threshold is calibrated so that
+``target_rate`` of pings are flagged. Every flagged ping raises an alert
+(see src.ingest.main), so the rate is kept small. A model loaded from disk
+has no reference yet; it uses the fixed DEFAULT_THRESHOLD until its first
+``min_samples`` live scores arrive, which then serve as one.
+
+Drift is the Kolmogorov-Smirnov distance between the reference and the
+retained live windows. When it passes ``limit``, the refresher refits that
+scope's model on its last ``buffer_size`` unflagged pings only and
+recalibrates it. Flagged pings are never buffered, so an anomalous pattern
+causing the drift is not learned as normal. The full /train path is left
+for deliberate retrains.
+
+Memory per scope is fixed: ``windows`` sketches of ``bins`` counters plus
+a ``buffer_size`` x 4 feature ring.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import logging
+import threading
+import time
+from src.common.config import config
+from src.common.metrics import registry
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+logger = logging.getLogger(__name__)
+
+# IsolationForest.score_samples is -2 ** (-depth / c(n)), always within [-1, 0]
+SCORE_MIN, SCORE_MAX = -1.0, 0.0
+# Threshold of scopes without a calibration; the original IsolationForest cut-off
+DEFAULT_THRESHOLD = -0.5
+FEATURES = 4
+
+ANOMALY_THRESHOLD = registry.gauge(
+    'anomaly_threshold', 'Calibrated anomaly score threshold', ('scope',)
+)
+ANOMALY_DRIFT = registry.gauge(
+    'anomaly_score_drift', 'KS distance between live and reference anomaly scores', ('scope',)
+)
+MODEL_REFRESHES = registry.counter(
+    'anomaly_model_refreshes_total', 'Models refit on recent pings after drifting', ('scope',)
+)
+
+def scope_label(region: Optional[str]) -> str:
+    return 'global' if region is None else region
+
+class ScoreSketch:
+    """
+    Mergeable fixed-bin histogram of scores in [SCORE_MIN, SCORE_MAX]
+
+    Quantiles interpolate linearly within a bin, so they are exact to
+    within one bin width (1/256 by default).
+    """
+
+    def __init__(self, bins: int = 256):
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    @classmethod
+    def of(cls, scores, bins: int = 256) -> 'ScoreSketch':
+        sketch = cls(bins)
+        sketch.add(scores)
+        return sketch
+
+    @classmethod
+    def merged(cls, sketches: Iterable['ScoreSketch'], bins: int = 256) -> 'ScoreSketch':
+        total = cls(bins)
+        for sketch in sketches:
+            total.counts += sketch.counts
+        return total
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, scores) -> None:
+        scores = np.asarray(scores, dtype=float)
+        idx = ((scores - SCORE_MIN) * (self.bins / (SCORE_MAX - SCORE_MIN))).astype(np.int64)
+        self.counts += np.bincount(np.clip(idx, 0, self.bins - 1), minlength=self.bins)
+
+    def cdf(self) -> "np.ndarray":
+        """Fraction of scores at or below each bin's upper edge"""
+        cumulative = np.cumsum(self.counts)
+        return cumulative / max(cumulative[-1], 1)
+
+    def quantile(self, q: float) -> float:
+        cumulative = np.cumsum(self.counts)
+        n = cumulative[-1]
+        if n == 0:
+            raise ValueError("Quantile of an empty sketch")
+        rank = q * n
+        b = int(np.searchsorted(cumulative, rank, side='left'))
+        b = min(b, self.bins - 1)
+        below = cumulative[b - 1] if b > 0 else 0
+        within = (rank - below) / self.counts[b] if self.counts[b] else 0.0
+        width = (SCORE_MAX - SCORE_MIN) / self.bins
+        return float(SCORE_MIN + (b + min(max(within, 0.0), 1.0)) * width)
+
+    def fraction_below(self, value: float) -> float:
+        """Approximate fraction of scores below ``value``"""
+        position = (value - SCORE_MIN) * (self.bins / (SCORE_MAX - SCORE_MIN))
+        b = int(min(max(position, 0), self.bins - 1))
+        below = self.counts[:b].sum() + self.counts[b] * min(max(position - b, 0.0), 1.0)
+        return float(below / max(self.count, 1))
+
+    def distance(self, other: 'ScoreSketch') -> float:
+        """Kolmogorov-Smirnov distance between the two distributions"""
+        return float(np.max(np.abs(self.cdf() - other.cdf())))
+
+class _Scope:
+    __slots__ = ('reference', 'threshold', 'windows', 'buffer', 'filled', 'cursor', 'calibrated_at', 'refreshes')
+
+    def __init__(self, buffer_size: int):
+        self.reference: Optional[ScoreSketch] = None
+        self.threshold: Optional[float] = None
+        self.windows: Deque[Tuple[int, ScoreSketch]] = deque()
+        self.buffer = np.empty((buffer_size, FEATURES))
+        self.filled = 0
+        self.cursor = 0
+        self.calibrated_at: Optional[float] = None
+        self.refreshes = 0
+
+class DriftMonitor:
+    """
+    Score sketches, calibrated thresholds and recent pings per scope
+
+    Scopes are region names, with None for the global model. All methods
+    are thread-safe; batch scoring runs in worker threads.
+
+    Args:
+        target_rate: Fraction of pings a calibrated threshold flags (and alerts on)
+        window: Seconds covered by one live sketch
+        windows: Live sketches retained per scope
+        bins: Sketch resolution
+        min_samples: Scores needed before calibrating or measuring drift
+        limit: Drift distance that triggers a refresh
+        buffer_size: Recent unflagged pings kept per scope to refit on
+        cooldown: Seconds after a calibration before a scope can refresh again
+    """
+
+    def __init__(
+        self,
+        target_rate: float = 0.005,
+        window: int = 3600,
+        windows: int = 24,
+        bins: int = 256,
+        min_samples: int = 2000,
+        limit: float = 0.15,
+        buffer_size: int = 5000,
+        cooldown: int = 3600
+    ):
+        self.target_rate = target_rate
+        self.window = window
+        self.windows = windows
+        self.bins = bins
+        self.min_samples = min_samples
+        self.limit = limit
+        self.buffer_size = buffer_size
+        self.cooldown = cooldown
+        self._scopes: Dict[Optional[str], _Scope] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> 'DriftMonitor':
+        return cls(
+            target_rate=config.get('services.ai_engine.drift.target_rate', 0.005),
+            window=config.get('services.ai_engine.drift.window', 3600),
+            windows=config.get('services.ai_engine.drift.windows', 24),
+            bins=config.get('services.ai_engine.drift.bins', 256),
+            min_samples=config.get('services.ai_engine.drift.min_samples', 2000),
+            limit=config.get('services.ai_engine.drift.limit', 0.15),
+            buffer_size=config.get('services.ai_engine.drift.buffer_size', 5000),
+            cooldown=config.get('services.ai_engine.drift.cooldown', 3600)
+        )
+
+    def _scope(self, region: Optional[str]) -> _Scope:
+        scope = self._scopes.get(region)
+        if scope is None:
+            scope = self._scopes[region] = _Scope(self.buffer_size)
+        return scope
+
+    def threshold(self, region: Optional[str]) -> float:
+        """Calibrated threshold of a scope, else DEFAULT_THRESHOLD"""
+        scope = self._scopes.get(region)
+        if scope is not None and scope.threshold is not None:
+            return scope.threshold
+        return DEFAULT_THRESHOLD
+
+    def calibrate(self, region: Optional[str], scores) -> float:
+        """Make ``scores`` the scope's reference distribution and set its threshold from it"""
+        reference = ScoreSketch.of(scores, self.bins)
+        with self._lock:
+            self._calibrate(self._scope(region), region, reference)
+            return self._scopes[region].threshold
+
+    def _calibrate(self, scope: _Scope, region: Optional[str], reference: ScoreSketch) -> None:
+        scope.reference = reference
+        scope.threshold = reference.quantile(self.target_rate)
+        scope.windows.clear()
+        scope.calibrated_at = time.time()
+        ANOMALY_THRESHOLD.labels(scope_label(region)).set(scope.threshold)
+        logger.info(
+            "Calibrated %s threshold to %.4f from %d scores",
+            scope_label(region), scope.threshold, reference.count
+        )
+
+    def observe(self, region: Optional[str], scores, features) -> float:
+        """Record scored pings of one scope, returning the threshold to apply to them"""
+        scores = np.asarray(scores, dtype=float)
+        features = np.asarray(features, dtype=float)
+        now = int(time.time() // self.window) * self.window
+        with self._lock:
+            scope = self._scope(region)
+            if not scope.windows or scope.windows[-1][0] < now:
+                scope.windows.append((now, ScoreSketch(self.bins)))
+                while len(scope.windows) > self.windows:
+                    scope.windows.popleft()
+            scope.windows[-1][1].add(scores)
+
+            if scope.reference is None:
+                live = ScoreSketch.merged((s for _, s in scope.windows), self.bins)
+                if live.count >= self.min_samples:
+                    self._calibrate(scope, region, live)
+            threshold = scope.threshold if scope.threshold is not None else DEFAULT_THRESHOLD
+
+            # Ring buffer of the most recent unflagged pings, oldest overwritten first
+            rows = features[scores >= threshold][-self.buffer_size:]
+            end = scope.cursor + len(rows)
+            if end <= self.buffer_size:
+                scope.buffer[scope.cursor:end] = rows
+            else:
+                head = self.buffer_size - scope.cursor
+                scope.buffer[scope.cursor:] = rows[:head]
+                scope.buffer[:end - self.buffer_size] = rows[head:]
+            scope.cursor = end % self.buffer_size
+            scope.filled = min(scope.filled + len(rows), self.buffer_size)
+        return threshold
+
+    def _drift(self, scope: _Scope) -> Optional[float]:
+        if scope.reference is None:
+            return None
+        live = ScoreSketch.merged((s for _, s in scope.windows), self.bins)
+        if live.count < self.min_samples:
+            return None
+        return live.distance(scope.reference)
+
+    def drift(self, region: Optional[str]) -> Optional[float]:
+        """Distance of the scope's live scores from its reference, None while too few"""
+        with self._lock:
+            scope = self._scopes.get(region)
+            return self._drift(scope) if scope is not None else None
+
+    def drifted(self) -> List[Optional[str]]:
+        """Scopes past the drift limit that are out of cooldown and have enough recent pings"""
+        now = time.time()
+        due = []
+        with self._lock:
+            for region, scope in self._scopes.items():
+                distance = self._drift(scope)
+                if distance is None:
+                    continue
+                ANOMALY_DRIFT.labels(scope_label(region)).set(distance)
+                if (
+                    distance > self.limit
+                    and scope.filled >= self.min_samples
+                    and now - (scope.calibrated_at or 0) >= self.cooldown
+                ):
+                    due.append(region)
+        return due
+
+    def recent(self, region: Optional[str]) -> "np.ndarray":
+        """Copy of the scope's buffered unflagged pings, oldest first"""
+        with self._lock:
+            scope = self._scopes.get(region)
+            if scope is None:
+                return np.empty((0, FEATURES))
+            if scope.filled < self.buffer_size:
+                return scope.buffer[:scope.filled].copy()
+            return np.concatenate([scope.buffer[scope.cursor:], scope.buffer[:scope.cursor]])
+
+    def refreshed(self, region: Optional[str], scores) -> float:
+        """Recalibrate a scope after its model was refit on recent pings"""
+        threshold = self.calibrate(region, scores)
+        with self._lock:
+            self._scopes[region].refreshes += 1
+        MODEL_REFRESHES.labels(scope_label(region)).inc()
+        return threshold
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-scope threshold, drift and live score quantiles"""
+        with self._lock:
+            scopes = list(self._scopes.items())
+            rows = []
+            for region, scope in scopes:
+                live = ScoreSketch.merged((s for _, s in scope.windows), self.bins)
+                rows.append({
+                    'region': region,
+                    'threshold': scope.threshold,
+                    'drift': self._drift(scope),
+                    'live_samples': live.count,
+                    'reference_samples': scope.reference.count if scope.reference is not None else 0,
+                    'live_anomaly_rate': (
+                        live.fraction_below(scope.threshold)
+                        if live.count and scope.threshold is not None else None
+                    ),
+                    'live_quantiles': {
+                        str(q): live.quantile(q) for q in (0.01, 0.1, 0.5, 0.9)
+                    } if live.count else {},
+                    'buffered': scope.filled,
+                    'calibrated_at': scope.calibrated_at,
+                    'refreshes': scope.refreshes
+                })
+        return rows
@@ -0,0 +1,344 @@
+"""
+Incrementally maintained anomaly heatmap tiles
+
+Detections are folded into per-cell, per-time-bucket summaries as they are
+stored, so a map view reads a bounded number of summary documents instead of
+scanning anomaly_detections. Summaries exist at fixed Web Mercator zoom
+levels. Each served tile ``z/x/y`` is divided into a ``grid x grid`` raster
+of cells, and one ``anomaly_tiles`` document holds one cell in one bucket:
+
+    {_id, tile: "z/x/y", cell: [cx, cy], bucket, count, anomalies,
+     score_sum, score_min, score_max}
+
+Updates are merged in memory and written with one unordered bulk upsert per
+flush, so tiles lag detections by at most the flush interval.
+
+Run ``python -m src.ai_engine.heatmap`` to rebuild all tiles from the stored
+detections, e.g. after changing the zoom levels or bucket size.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+import asyncio
+import logging
+import math
+import threading
+from src.common.config import config
+from src.common.errors import ValidationError
+from src.common.metrics import registry, span
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+pymongo = lazy_import('pymongo')
+
+logger = logging.getLogger(__name__)
+
+# Web Mercator is undefined at the poles; clamp like every slippy map does
+MAX_LATITUDE = 85.05112878
+
+TILE_UPSERTS = registry.counter(
+    'heatmap_tile_upserts_total', 'Heatmap cell documents upserted'
+)
+TILE_CELLS_PENDING = registry.gauge(
+    'heatmap_cells_pending', 'Heatmap cell updates waiting to be flushed'
+)
+
+# (zoom, tile x, tile y, cell x, cell y, bucket start epoch seconds)
+CellKey = Tuple[int, int, int, int, int, int]
+
+def tile_key(z: int, x: int, y: int) -> str:
+    return f"{z}/{x}/{y}"
+
+def _merge(pending: Dict[Any, List[float]], key: Any, stats: Sequence[float]) -> None:
+    current = pending.get(key)
+    if current is None:
+        pending[key] = list(stats)
+        return
+    current[0] += stats[0]
+    current[1] += stats[1]
+    current[2] += stats[2]
+    current[3] = min(current[3], stats[3])
+    current[4] = max(current[4], stats[4])
+
+class TileAggregator:
+    """
+    Accumulates detection summaries per heatmap cell until flushed
+
+    Pending stats per cell are ``[count, anomalies, score_sum, score_min, score_max]``.
+    """
+
+    def __init__(
+        self,
+        zooms: Sequence[int] = (6, 9, 12, 15),
+        grid_bits: int = 4,
+        bucket_seconds: int = 3600,
+        max_pending: int = 20000
+    ):
+        self.zooms = tuple(sorted(zooms))
+        self.grid_bits = grid_bits
+        self.grid = 1 << grid_bits
+        self.bucket_seconds = bucket_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[CellKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls) -> 'TileAggregator':
+        return cls(
+            zooms=config.get('services.ai_engine.heatmap.zooms', (6, 9, 12, 15)),
+            grid_bits=config.get('services.ai_engine.heatmap.grid_bits', 4),
+            bucket_seconds=config.get('services.ai_engine.heatmap.bucket_seconds', 3600),
+            max_pending=config.get('services.ai_engine.heatmap.max_pending', 20000)
+        )
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def should_flush(self) -> bool:
+        return len(self._pending) >= self.max_pending
+
+    def add(
+        self,
+        latitude: float,
+        longitude: float,
+        timestamp: datetime,
+        score: float,
+        is_anomaly: bool
+    ) -> None:
+        """Fold one detection into every zoom level"""
+        bucket = int(timestamp.timestamp() // self.bucket_seconds) * self.bucket_seconds
+        lat = math.radians(min(max(latitude, -MAX_LATITUDE), MAX_LATITUDE))
+        fx = (longitude + 180.0) / 360.0
+        fy = (1.0 - math.asinh(math.tan(lat)) / math.pi) / 2.0
+        stats = (1, 1 if is_anomaly else 0, score, score, score)
+
+        with self._lock:
+            for z in self.zooms:
+                n = 1 << (z + self.grid_bits)
+                cell_x = min(max(int(fx * n), 0), n - 1)
+                cell_y = min(max(int(fy * n), 0), n - 1)
+                key = (
+                    z, cell_x >> self.grid_bits, cell_y >> self.grid_bits,
+                    cell_x & (self.grid - 1), cell_y & (self.grid - 1), bucket
+                )
+                _merge(self._pending, key, stats)
+            TILE_CELLS_PENDING.set(len(self._pending))
+
+    def add_batch(self, latitudes, longitudes, timestamps, scores, is_anomaly) -> None:
+        """
+        Fold a batch of detections into every zoom level
+
+        Args:
+            latitudes, longitudes: Coordinates in degrees
+            timestamps: Epoch seconds
+            scores: Anomaly scores
+            is_anomaly: Boolean anomaly flags
+        """
+        lat = np.radians(np.clip(np.asarray(latitudes, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE))
+        if lat.size == 0:
+            return
+        fx = (np.asarray(longitudes, dtype=np.float64) + 180.0) / 360.0
+        fy = (1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0
+        buckets = (
+            np.floor_divide(np.asarray(timestamps, dtype=np.float64), self.bucket_seconds)
+            .astype(np.int64) * self.bucket_seconds
+        )
+        scores = np.asarray(scores, dtype=np.float64)
+        flags = np.asarray(is_anomaly, dtype=np.int64)
+
+        groups = []
+        for z in self.zooms:
+            n = 1 << (z + self.grid_bits)
+            cell_x = np.clip((fx * n).astype(np.int64), 0, n - 1)
+            cell_y = np.clip((fy * n).astype(np.int64), 0, n - 1)
+            # Rows hitting the same cell and bucket are reduced before touching the dict
+            keys, inverse = np.unique(np.stack([cell_x, cell_y, buckets], axis=1), axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            size = len(keys)
+            score_min = np.full(size, np.inf)
+            score_max = np.full(size, -np.inf)
+            np.minimum.at(score_min, inverse, scores)
+            np.maximum.at(score_max, inverse, scores)
+            groups.append((z, keys.tolist(), zip(
+                np.bincount(inverse, minlength=size).tolist(),
+                np.bincount(inverse, weights=flags, minlength=size).tolist(),
+                np.bincount(inverse, weights=scores, minlength=size).tolist(),
+                score_min.tolist(),
+                score_max.tolist()
+            )))
+
+        with self._lock:
+            for z, keys, stats in groups:
+                for (cell_x, cell_y, bucket), cell_stats in zip(keys, stats):
+                    key = (
+                        z, cell_x >> self.grid_bits, cell_y >> self.grid_bits,
+                        cell_x & (self.grid - 1), cell_y & (self.grid - 1), bucket
+                    )
+                    _merge(self._pending, key, cell_stats)
+            TILE_CELLS_PENDING.set(len(self._pending))
+
+    def updates(self, pending: Dict[CellKey, List[float]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(filter, update) upsert pairs for a set of pending cells"""
+        updates = []
+        for (z, x, y, cx, cy, bucket), (count, anomalies, score_sum, score_min, score_max) in pending.items():
+            updates.append((
+                {'_id': f"{z}/{x}/{y}/{cx}/{cy}/{bucket}"},
+                {
+                    '$inc': {'count': int(count), 'anomalies': int(anomalies), 'score_sum': score_sum},
+                    '$min': {'score_min': score_min},
+                    '$max': {'score_max': score_max},
+                    '$setOnInsert': {
+                        'tile': tile_key(z, x, y),
+                        'cell': [cx, cy],
+                        'bucket': datetime.fromtimestamp(bucket, timezone.utc)
+                    }
+                }
+            ))
+        return updates
+
+    async def flush(self, db) -> int:
+        """
+        Write pending cells with one bulk upsert, returning the number written
+
+        Cells whose upserts failed are merged back so the next flush retries
+        them. When the bulk write reports which operations failed, only those
+        are retried; the rest were applied and retrying them would count
+        their detections twice. Any other error, including cancellation,
+        retries every cell.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            TILE_CELLS_PENDING.set(0)
+        if not pending:
+            return 0
+
+        keys = list(pending)
+        try:
+            with span("heatmap.flush"):
+                await db.anomaly_tiles.bulk_write([
+                    pymongo.UpdateOne(query, update, upsert=True)
+                    for query, update in self.updates(pending)
+                ], ordered=False)
+        except pymongo.errors.BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            logger.error("Error flushing %d of %d heatmap cells: %s", len(failed), len(pending), e)
+            self._restore({keys[i]: pending[keys[i]] for i in failed})
+            TILE_UPSERTS.inc(len(pending) - len(failed))
+            return len(pending) - len(failed)
+        except Exception as e:
+            logger.error("Error flushing %d heatmap cells: %s", len(pending), e)
+            self._restore(pending)
+            return 0
+        except BaseException:
+            # Cancelled mid-write, e.g. during the shutdown flush
+            self._restore(pending)
+            raise
+
+        TILE_UPSERTS.inc(len(pending))
+        return len(pending)
+
+    def _restore(self, cells: Dict[CellKey, List[float]]) -> None:
+        """Merge cells that were not written back into the pending set"""
+        with self._lock:
+            for key, stats in cells.items():
+                _merge(self._pending, key, stats)
+            TILE_CELLS_PENDING.set(len(self._pending))
+
+    def check_tile(self, z: int, x: int, y: int) -> None:
+        if z not in self.zooms:
+            raise ValidationError(
+                f"Heatmap tiles are only kept at zoom levels {list(self.zooms)}",
+                details={'zooms': list(self.zooms)}
+            )
+        if not (0 <= x < (1 << z) and 0 <= y < (1 << z)):
+            raise ValidationError(f"Tile {tile_key(z, x, y)} is out of range")
+
+    async def read_tile(
+        self,
+        db,
+        z: int,
+        x: int,
+        y: int,
+        start: datetime,
+        end: datetime
+    ) -> Dict[str, Any]:
+        """Sum a tile's cells over the buckets starting in [start, end)"""
+        self.check_tile(z, x, y)
+        cells: Dict[Tuple[int, int], List[float]] = {}
+        with span("heatmap.read"):
+            cursor = db.anomaly_tiles.find(
+                {'tile': tile_key(z, x, y), 'bucket': {'$gte': start, '$lt': end}},
+                {'_id': 0, 'cell': 1, 'count': 1, 'anomalies': 1, 'score_sum': 1, 'score_min': 1, 'score_max': 1}
+            )
+            async for doc in cursor:
+                cx, cy = doc['cell']
+                _merge(cells, (cx, cy), (
+                    doc['count'], doc['anomalies'], doc['score_sum'], doc['score_min'], doc['score_max']
+                ))
+
+        return {
+            'z': z,
+            'x': x,
+            'y': y,
+            'grid': self.grid,
+            'start': start,
+            'end': end,
+            'cells': [
+                {
+                    'x': cx,
+                    'y': cy,
+                    'count': int(count),
+                    'anomalies': int(anomalies),
+                    'mean_score': score_sum / count,
+                    'min_score': score_min,
+                    'max_score': score_max
+                }
+                for (cx, cy), (count, anomalies, score_sum, score_min, score_max) in sorted(cells.items())
+            ]
+        }
+
+async def backfill(db, aggregator: TileAggregator, batch_size: int = 5000) -> int:
+    """
+    Fold every stored detection into the tiles, returning how many were read
+
+    Counts are added to whatever the tiles already hold, so start from an
+    empty anomaly_tiles collection.
+    """
+    projection = {'_id': 0, 'location.coordinates': 1, 'timestamp': 1, 'result': 1}
+    total = 0
+    batch = []
+
+    async def fold():
+        aggregator.add_batch(
+            [d['location']['coordinates'][1] for d in batch],
+            [d['location']['coordinates'][0] for d in batch],
+            [d['timestamp'].replace(tzinfo=d['timestamp'].tzinfo or timezone.utc).timestamp() for d in batch],
+            [d['result']['details']['anomaly_score'] for d in batch],
+            [d['result']['is_anomaly'] for d in batch]
+        )
+        await aggregator.flush(db)
+
+    async for doc in db.anomaly_detections.find({}, projection).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            await fold()
+            total += len(batch)
+            batch = []
+    if batch:
+        await fold()
+        total += len(batch)
+    return total
+
+async def main():
+    """Drop and rebuild the anomaly_tiles collection"""
+    from src.common.database.connection import get_mongo_database
+
+    db = get_mongo_database()
+    await db.anomaly_tiles.delete_many({})
+    total = await backfill(db, TileAggregator.from_config())
+    logger.info("Folded %d detections into heatmap tiles", total)
+
+if __name__ == "__main__":
+    from src.common.utils.logger import configure_logging
+
+    configure_logging(service="heatmap_backfill")
+    asyncio.run(main())
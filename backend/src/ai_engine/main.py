@@ -1,20 +1,125 @@
-from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Dict, Optional, Any
-import numpy as np
-from sklearn.ensemble import IsolationForest
-from datetime import datetime
+from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException, Request
+from pydantic import BaseModel, Field, ConfigDict, PrivateAttr
+from typing import Deque, List, Dict, Optional, Any
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+import asyncio
 import logging
-import joblib
 import os
+from src.common.config import config
 from src.common.errors import with_error_handling, ValidationError, DatabaseError
 from src.common.database.connection import get_mongo_database
+from src.common.utils.logger import configure_logging, RequestIdMiddleware
+from src.common.metrics import install_metrics, observe_since_request_start, span
+from src.common.profiler import install_profiler, start_profiling
+from src.common.wire import PingColumns, decode_pings, fast_json_response, parse_timestamp
+from src.common.utils.lazy import lazy_import
+from src.common.utils.trajectory import TrajectoryCompressors, TrajectoryPoint
+from src.ai_engine.drift import DriftMonitor
+from src.ai_engine.regions import RegionModelStore, check_region_name
+from src.ai_engine.heatmap import TileAggregator
+
+# Heavy numeric dependencies load on first use, keeping cold imports cheap
+np = lazy_import('numpy')
+joblib = lazy_import('joblib')
+pymongo = lazy_import('pymongo')
+ensemble = lazy_import('sklearn.ensemble')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Heatmap cells updated by every stored detection
+tiles = TileAggregator.from_config()
+
+# Per-user compression of stored detections; None stores every ping
+trajectories: Optional[TrajectoryCompressors] = (
+    TrajectoryCompressors(
+        tolerance_m=config.get('services.ai_engine.trajectory.tolerance_m', 10.0),
+        max_interval=config.get('services.ai_engine.trajectory.max_interval', 300),
+        max_window=config.get('services.ai_engine.trajectory.max_window', 64),
+        idle_seconds=config.get('services.ai_engine.trajectory.idle_seconds', 600)
+    )
+    if config.get('services.ai_engine.trajectory.enabled', True) else None
+)
+
+# Detections whose insert failed, written ahead of the next insert
+_unwritten: Deque[Dict[str, Any]] = deque(
+    maxlen=config.get('services.ai_engine.trajectory.max_unwritten', 10000)
+)
+DUPLICATE_KEY = 11000
+
+async def flush_storage(final: bool = False) -> None:
+    """
+    Write held-back trajectory points of idle users (all users if final),
+    detections left over from failed inserts and pending tiles
+    """
+    points = []
+    if trajectories is not None:
+        points = trajectories.flush_all() if final else trajectories.take_idle()
+    if points or _unwritten:
+        await _insert_detections(get_mongo_database(), [p.payload for p in points])
+    if tiles.pending():
+        await tiles.flush(get_mongo_database())
+
+@asynccontextmanager
+async def storage_flusher():
+    """Run flush_storage in the background and once more on shutdown"""
+    interval = config.get('services.ai_engine.heatmap.flush_interval', 5)
+
+    async def run():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush_storage()
+            except Exception as e:
+                logger.error("Background storage flush failed: %s", e)
+
+    task = asyncio.create_task(run())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        await flush_storage(final=True)
+
+@asynccontextmanager
+async def drift_refresher():
+    """Periodically refit models whose score distribution has drifted"""
+    if not config.get('services.ai_engine.drift.auto_refresh', True):
+        yield
+        return
+    interval = config.get('services.ai_engine.drift.check_interval', 60)
+
+    async def run():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(load_detector().refresh_drifted)
+            except Exception as e:
+                logger.error("Drift refresh failed: %s", e)
+
+    task = asyncio.create_task(run())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging(service="ai_engine")
+    start_profiling()
+    load_detector()
+    async with storage_flusher(), drift_refresher():
+        yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+install_metrics(app)
+install_profiler(app)
 
 class LocationData(BaseModel):
     user_id: str
@@ -25,8 +130,14 @@ class LocationData(BaseModel):
     accuracy: Optional[float] = Field(None, ge=0)
     battery_level: Optional[int] = Field(None, ge=0, le=100)
 
+    # Parsed once at validation time; invalid timestamps fail validation
+    _datetime: datetime = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._datetime = datetime.fromisoformat(self.timestamp.replace('Z', '+00:00'))
+
     def get_datetime(self) -> datetime:
-        return datetime.fromisoformat(self.timestamp.replace('Z', '+00:00'))
+        return self._datetime
 
     model_config = {
         'json_schema_extra': {
@@ -46,28 +157,51 @@ class AnomalyDetectionResult(BaseModel):
     is_anomaly: bool
     confidence: float
     details: Dict[str, float]
-    timestamp: datetime = Field(default_factory=datetime.now)
+    region: Optional[str] = None  # None when scored by the global model
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class AnomalyDetector:
-    def __init__(self, model_path: Optional[str] = None):
+    """
+    Global IsolationForest plus optional per-region models
+
+    Pings are scored by their region's model when one has been trained
+    (see src.ai_engine.regions) and by the global model otherwise. Each
+    model's threshold is calibrated, and the model refreshed on drift, by
+    the detector's DriftMonitor (see src.ai_engine.drift).
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        regions: Optional[RegionModelStore] = None,
+        drift: Optional[DriftMonitor] = None
+    ):
         self.model = None
-        self.model_path = model_path or "models/anomaly_detector.joblib"
+        self.model_path = model_path or config.get(
+            'services.ai_engine.model_path', "models/anomaly_detector.joblib"
+        )
+        self.regions = regions or RegionModelStore.from_config()
+        self.drift = drift or DriftMonitor.from_config()
+        self.region_min_samples = config.get('services.ai_engine.regions.min_samples', 50)
         self.load_model()
 
+    def _new_model(self):
+        return ensemble.IsolationForest(
+            contamination=config.get('services.ai_engine.training.contamination', 0.1),
+            random_state=42,
+            n_estimators=100
+        )
+
     def load_model(self):
         try:
             if os.path.exists(self.model_path):
                 self.model = joblib.load(self.model_path)
                 logger.info("Loaded existing model")
             else:
-                self.model = IsolationForest(
-                    contamination=0.1,
-                    random_state=42,
-                    n_estimators=100
-                )
+                self.model = self._new_model()
                 logger.info("Created new model")
         except Exception as e:
-            logger.error(f"Error loading model: {str(e)}")
+            logger.error("Error loading model: %s", e)
             raise DatabaseError("Failed to load anomaly detection model")
 
     def save_model(self):
@@ -76,26 +210,115 @@ class AnomalyDetector:
             joblib.dump(self.model, self.model_path)
             logger.info("Model saved successfully")
         except Exception as e:
-            logger.error(f"Error saving model: {str(e)}")
+            logger.error("Error saving model: %s", e)
             raise DatabaseError("Failed to save anomaly detection model")
 
-    def train(self, data: List[LocationData]):
-        if not data:
-            raise ValidationError("No training data provided")
+    def train(self, data: List[LocationData], region: Optional[str] = None):
+        """
+        Fit the global model and every region with enough samples
+
+        With ``region`` set only that region's model is refit, from the
+        points that fall inside it.
+        """
+        self.check_training_data(data, region)
 
         try:
-            features = self._extract_features(data)
-            self.model.fit(features)
-            self.save_model()
+            with span("anomaly.extract_features"):
+                features = self._extract_features(data)
+            if region is None:
+                with span("anomaly.train"):
+                    self.model.fit(features)
+                self.save_model()
+                self.drift.calibrate(None, self.model.score_samples(features))
+            self.train_regions(data, features, only=region)
         except Exception as e:
-            logger.error(f"Training error: {str(e)}")
+            logger.error("Training error: %s", e)
             raise DatabaseError("Failed to train model")
 
+    def check_training_data(self, data: List[LocationData], region: Optional[str] = None) -> None:
+        """Raise ValidationError when ``train`` would fit nothing for this data"""
+        if not data:
+            raise ValidationError("No training data provided")
+        if region is None:
+            return
+        samples = self.regions.index.regions_for(
+            [p.latitude for p in data], [p.longitude for p in data]
+        ).count(region)
+        if samples < self.region_min_samples:
+            raise ValidationError(
+                f"Region {region} has {samples} training sample(s), "
+                f"at least {self.region_min_samples} are needed"
+            )
+
+    def train_regions(
+        self,
+        data: List[LocationData],
+        features: "np.ndarray",
+        only: Optional[str] = None
+    ) -> List[str]:
+        """Fit region models independently and in parallel, returning the regions trained"""
+        rows = defaultdict(list)
+        for i, region in enumerate(self.regions.index.regions_for(
+            [p.latitude for p in data], [p.longitude for p in data]
+        )):
+            if only is None or region == only:
+                rows[region].append(i)
+        eligible = {r: idx for r, idx in rows.items() if len(idx) >= self.region_min_samples}
+        if not eligible:
+            return []
+
+        def fit(item):
+            region, idx = item
+            with span("anomaly.train_region"):
+                model = self._new_model().fit(features[idx])
+            self.regions.put(region, model)
+            self.drift.calibrate(region, model.score_samples(features[idx]))
+            return region
+
+        workers = min(len(eligible), config.get('services.ai_engine.regions.train_workers', 4))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            trained = list(pool.map(fit, eligible.items()))
+        logger.info("Trained %d region model(s)", len(trained))
+        return trained
+
+    def refresh(self, region: Optional[str] = None) -> bool:
+        """Refit one model on its recent unflagged pings only and recalibrate its threshold"""
+        features = self.drift.recent(region)
+        if len(features) < self.drift.min_samples:
+            return False
+        with span("anomaly.refresh"):
+            model = self._new_model().fit(features)
+        if region is None:
+            self.model = model
+            self.save_model()
+        else:
+            self.regions.put(region, model)
+        threshold = self.drift.refreshed(region, model.score_samples(features))
+        logger.info(
+            "Refreshed %s model on %d recent pings, threshold now %.4f",
+            region or "global", len(features), threshold
+        )
+        return True
+
+    def refresh_drifted(self) -> List[Optional[str]]:
+        """Refresh every model whose scores drifted past the limit, returning their regions"""
+        refreshed = []
+        for region in self.drift.drifted():
+            try:
+                if self.refresh(region):
+                    refreshed.append(region)
+            except Exception as e:
+                logger.error("Refresh of %s model failed: %s", region or "global", e)
+        return refreshed
+
     def detect_anomaly(self, data: LocationData) -> AnomalyDetectionResult:
         try:
-            features = self._extract_features([data])
-            score = self.model.score_samples(features)[0]
-            threshold = -0.5  # Adjustable threshold
+            with span("anomaly.extract_features"):
+                features = self._extract_features([data])
+            model, region = self._model_for(data.latitude, data.longitude)
+            with span("anomaly.score"):
+                score = model.score_samples(features)[0]
+            threshold = self.drift.observe(region, [score], features)
             is_anomaly = score < threshold
             
             confidence = 1 - (1 / (1 + np.exp(-score)))  # Convert score to probability
@@ -106,13 +329,79 @@ class AnomalyDetector:
                 details={
                     "anomaly_score": float(score),
                     "threshold": threshold
-                }
+                },
+                region=region
             )
         except Exception as e:
-            logger.error(f"Detection error: {str(e)}")
+            logger.error("Detection error: %s", e)
             raise DatabaseError("Failed to detect anomaly")
 
-    def _extract_features(self, data: List[LocationData]) -> np.ndarray:
+    def detect_batch(self, columns: PingColumns) -> Dict[str, Any]:
+        """Score a columnar batch, returning per-row arrays"""
+        try:
+            with span("anomaly.extract_features"):
+                features = self._extract_column_features(columns)
+            with span("anomaly.score"):
+                scores, regions, thresholds = self._score_by_region(columns, features)
+            return {
+                "is_anomaly": scores < thresholds,
+                "confidence": 1 - (1 / (1 + np.exp(-scores))),
+                "anomaly_score": scores,
+                "region": regions,
+                "threshold": thresholds
+            }
+        except Exception as e:
+            logger.error("Batch detection error: %s", e)
+            raise DatabaseError("Failed to detect anomalies")
+
+    def _model_for(self, latitude: float, longitude: float):
+        """The model responsible for a location and its region (None for the global model)"""
+        if self.regions.has_models():
+            region = self.regions.index.region_for(latitude, longitude)
+            model = self.regions.get(region)
+            if model is not None:
+                return model, region
+        return self.model, None
+
+    def _score_by_region(self, columns: PingColumns, features: "np.ndarray"):
+        """
+        Score each region's rows with its model in one call, the rest with the
+        global model, returning scores, regions and per-row thresholds
+        """
+        if not self.regions.has_models():
+            scores = self.model.score_samples(features)
+            threshold = self.drift.observe(None, scores, features)
+            return scores, [None] * len(columns), np.full(len(columns), threshold)
+
+        regions = self.regions.index.regions_for(columns.latitude, columns.longitude)
+        names, inverse = np.unique(np.asarray(regions), return_inverse=True)
+        inverse = inverse.ravel()
+        scores = np.empty(len(columns))
+        thresholds = np.empty(len(columns))
+        fallback = np.zeros(len(columns), dtype=bool)
+        for k, region in enumerate(names.tolist()):
+            rows = inverse == k
+            model = self.regions.get(region)
+            if model is None:
+                fallback |= rows
+                continue
+            scores[rows] = model.score_samples(features[rows])
+            thresholds[rows] = self.drift.observe(region, scores[rows], features[rows])
+        if fallback.any():
+            scores[fallback] = self.model.score_samples(features[fallback])
+            thresholds[fallback] = self.drift.observe(None, scores[fallback], features[fallback])
+            regions = [None if f else r for r, f in zip(regions, fallback.tolist())]
+        return scores, regions, thresholds
+
+    def _extract_column_features(self, columns: PingColumns) -> "np.ndarray":
+        return np.column_stack([
+            columns.latitude,
+            columns.longitude,
+            np.nan_to_num(columns.speed, nan=0.0),
+            np.nan_to_num(columns.accuracy, nan=0.0)
+        ])
+
+    def _extract_features(self, data: List[LocationData]) -> "np.ndarray":
         features = []
         for point in data:
             feature_vector = [
@@ -124,61 +413,290 @@ class AnomalyDetector:
             features.append(feature_vector)
         return np.array(features)
 
-# Initialize detector
-detector = AnomalyDetector()
+# Detector is created by the app lifespan, or on first use outside of it
+detector: Optional[AnomalyDetector] = None
 
-async def get_detector():
+def load_detector() -> AnomalyDetector:
+    global detector
+    if detector is None:
+        detector = AnomalyDetector()
     return detector
 
+async def get_detector():
+    return load_detector()
+
 @app.post("/train")
 async def train_model(
     data: List[LocationData],
     background_tasks: BackgroundTasks,
+    region: Optional[str] = None,
     detector: AnomalyDetector = Depends(get_detector)
 ):
     try:
-        background_tasks.add_task(detector.train, data)
+        if region is not None:
+            check_region_name(region)
+        # Reject requests that would train nothing before answering
+        detector.check_training_data(data, region)
+        background_tasks.add_task(detector.train, data, region)
         return {"message": "Model training started"}
     except ValidationError as e:
-        logger.error(f"Validation error in training: {str(e)}")
+        logger.error("Validation error in training: %s", e)
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        logger.error(f"Training error: {str(e)}")
+        logger.error("Training error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _insert_detections(db, documents: List[Dict[str, Any]]) -> None:
+    """
+    Insert detections, preceded by any left over from failed inserts
+
+    Trajectory compression has already moved past these points, so documents
+    that fail to insert are kept for the next write rather than lost.
+    Documents are keyed by user and ping time, so duplicate key errors mean
+    an earlier attempt already wrote the document.
+    """
+    documents = list(_unwritten) + documents
+    _unwritten.clear()
+    if not documents:
+        return
+    try:
+        if len(documents) == 1:
+            await db.anomaly_detections.insert_one(documents[0])
+        else:
+            await db.anomaly_detections.insert_many(documents, ordered=False)
+    except pymongo.errors.DuplicateKeyError:
+        return
+    except pymongo.errors.BulkWriteError as e:
+        failed = [
+            documents[error['index']] for error in e.details.get('writeErrors', [])
+            if error.get('code') != DUPLICATE_KEY
+        ]
+        if not failed and not e.details.get('writeConcernErrors'):
+            return
+        _keep_unwritten(failed)
+        raise
+    except BaseException:
+        _keep_unwritten(documents)
+        raise
+
+def _keep_unwritten(documents: List[Dict[str, Any]]) -> None:
+    dropped = len(_unwritten) + len(documents) - _unwritten.maxlen
+    if dropped > 0:
+        logger.warning("Dropping %d unwritten detections beyond the retry buffer", dropped)
+    _unwritten.extend(documents)
+
+def detection_id(user_id: str, timestamp: datetime) -> str:
+    """Deterministic _id of a ping's detection, so storing it again is a duplicate key"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return f"{user_id}|{timestamp.astimezone(timezone.utc).isoformat()}"
+
+def _retain(
+    user_id: str,
+    timestamp: float,
+    latitude: float,
+    longitude: float,
+    document: Dict[str, Any],
+    keep: bool
+) -> List[Dict[str, Any]]:
+    """Documents to write now once this ping has passed through trajectory compression"""
+    if trajectories is None:
+        return [document]
+    point = TrajectoryPoint(timestamp, latitude, longitude, document)
+    return [p.payload for p in trajectories.push(user_id, point, keep)]
+
+async def store_detection(data: LocationData, result: Dict[str, Any]) -> None:
+    """
+    Persist one detection result to the anomaly_detections collection
+
+    Pings are trajectory-compressed first; anomalous pings are always kept.
+    """
+    with span("anomaly.store"):
+        db = get_mongo_database()
+        # Counted now: a failed insert is kept and written later, never retried by the caller
+        tiles.add(
+            data.latitude, data.longitude, data.get_datetime(),
+            result["details"]["anomaly_score"], result["is_anomaly"]
+        )
+        await _insert_detections(db, _retain(
+            data.user_id, data.get_datetime().timestamp(), data.latitude, data.longitude, {
+                "_id": detection_id(data.user_id, data.get_datetime()),
+                "user_id": data.user_id,
+                "location": {
+                    "type": "Point",
+                    "coordinates": [data.longitude, data.latitude]
+                },
+                "timestamp": data.get_datetime(),
+                "result": result,
+                "metadata": {
+                    "speed": data.speed,
+                    "accuracy": data.accuracy,
+                    "battery_level": data.battery_level
+                }
+            },
+            keep=result["is_anomaly"]
+        ))
+    if tiles.should_flush():
+        await tiles.flush(db)
+
+def batch_results(scored: Dict[str, Any], timestamp: datetime) -> List[Dict[str, Any]]:
+    """Split columnar detect_batch output into per-row result dicts"""
+    return [
+        {
+            "is_anomaly": flag,
+            "confidence": confidence,
+            "details": {
+                "anomaly_score": score,
+                "threshold": threshold
+            },
+            "region": region,
+            "timestamp": timestamp
+        }
+        for flag, confidence, score, threshold, region in zip(
+            scored["is_anomaly"].tolist(),
+            scored["confidence"].tolist(),
+            scored["anomaly_score"].tolist(),
+            scored["threshold"].tolist(),
+            scored["region"]
+        )
+    ]
+
+async def store_detections_batch(columns: PingColumns, results: List[Dict[str, Any]]) -> None:
+    """Persist a batch of trajectory-compressed detection results with a single insert_many"""
+    with span("anomaly.store"):
+        timestamps = columns.datetimes()
+        epochs = columns.timestamp.tolist()
+        speeds = columns.optional("speed")
+        accuracies = columns.optional("accuracy")
+        batteries = columns.optional("battery_level")
+        documents = []
+        for i, (lat, lon) in enumerate(zip(columns.latitude.tolist(), columns.longitude.tolist())):
+            documents.extend(_retain(columns.user_ids[i], epochs[i], lat, lon, {
+                "_id": detection_id(columns.user_ids[i], timestamps[i]),
+                "user_id": columns.user_ids[i],
+                "location": {
+                    "type": "Point",
+                    "coordinates": [lon, lat]
+                },
+                "timestamp": timestamps[i],
+                "result": results[i],
+                "metadata": {
+                    "speed": speeds[i],
+                    "accuracy": accuracies[i],
+                    "battery_level": batteries[i]
+                }
+            }, keep=results[i]["is_anomaly"]))
+        db = get_mongo_database()
+        tiles.add_batch(
+            columns.latitude, columns.longitude, columns.timestamp,
+            [r["details"]["anomaly_score"] for r in results],
+            [r["is_anomaly"] for r in results]
+        )
+        await _insert_detections(db, documents)
+    if tiles.should_flush():
+        await tiles.flush(db)
+
 @app.post("/detect")
 async def detect_anomaly(
     data: LocationData,
+    request: Request,
     detector: AnomalyDetector = Depends(get_detector)
 ) -> AnomalyDetectionResult:
+    observe_since_request_start(request.scope, "anomaly.validation")
     try:
         result = detector.detect_anomaly(data)
         
+        payload = result.model_dump()
+
         # Store result in MongoDB for analysis
-        db = get_mongo_database()
-        await db.anomaly_detections.insert_one({
-            "user_id": data.user_id,
-            "location": {
-                "type": "Point",
-                "coordinates": [data.longitude, data.latitude]
-            },
-            "timestamp": data.get_datetime(),
-            "result": result.dict(),
-            "metadata": {
-                "speed": data.speed,
-                "accuracy": data.accuracy,
-                "battery_level": data.battery_level
-            }
-        })
+        await store_detection(data, payload)
         
-        return result
+        return fast_json_response(payload)
     except ValidationError as e:
-        logger.error(f"Validation error in detection: {str(e)}")
+        logger.error("Validation error in detection: %s", e)
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        logger.error(f"Detection error: {str(e)}")
+        logger.error("Detection error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/detect/batch")
+async def detect_anomaly_batch(
+    request: Request,
+    detector: AnomalyDetector = Depends(get_detector)
+):
+    """
+    Score a batch of pings sent as NDJSON, length-prefixed MessagePack or
+    packed binary records (see src.common.wire), returning columnar results
+    """
+    try:
+        with span("anomaly.validation"):
+            columns = decode_pings(await request.body(), request.headers.get("content-type"))
+        if not len(columns):
+            return fast_json_response({"count": 0})
+
+        scored = detector.detect_batch(columns)
+
+        now = datetime.now(timezone.utc)
+        await store_detections_batch(columns, batch_results(scored, now))
+
+        return fast_json_response({"count": len(columns), "timestamp": now, **scored})
+    except ValidationError as e:
+        logger.error("Validation error in batch detection: %s", e)
+        raise HTTPException(status_code=422, detail=e.message)
+    except Exception as e:
+        logger.error("Batch detection error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _parse_time(value: str) -> datetime:
+    try:
+        return datetime.fromtimestamp(parse_timestamp(value), timezone.utc)
+    except ValueError:
+        raise ValidationError(f"Invalid timestamp {value!r}")
+
+@app.get("/heatmap/{z}/{x}/{y}")
+async def heatmap_tile(
+    z: int,
+    x: int,
+    y: int,
+    start: Optional[str] = None,
+    end: Optional[str] = None
+):
+    """
+    Anomaly density of one map tile as a grid of cells, summed over the
+    time buckets starting in [start, end) (default: the last 24 hours)
+    """
+    try:
+        end_time = _parse_time(end) if end else datetime.now(timezone.utc)
+        start_time = _parse_time(start) if start else end_time - timedelta(days=1)
+        tile = await tiles.read_tile(get_mongo_database(), z, x, y, start_time, end_time)
+        return fast_json_response(tile)
+    except ValidationError as e:
+        logger.error("Validation error in heatmap: %s", e)
+        raise HTTPException(status_code=422, detail=e.message)
+    except Exception as e:
+        logger.error("Heatmap error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/regions")
+async def list_regions(detector: AnomalyDetector = Depends(get_detector)):
+    store = detector.regions
+    return {
+        "available": store.available(),
+        "resident": store.resident(),
+        "resident_bytes": store.resident_bytes,
+        "memory_budget_bytes": store.memory_budget_bytes
+    }
+
+@app.get("/drift")
+async def drift_status(detector: AnomalyDetector = Depends(get_detector)):
+    """Calibrated thresholds, score drift and refresh history of every model"""
+    monitor = detector.drift
+    return fast_json_response({
+        "target_rate": monitor.target_rate,
+        "limit": monitor.limit,
+        "models": monitor.status()
+    })
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
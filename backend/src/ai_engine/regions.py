@@ -0,0 +1,201 @@
+"""
+Region-sharded anomaly models
+
+Pings are routed to a region: the first configured region polygon that
+contains them, otherwise their coarse geohash cell. Each region has its own
+model stored as ``<model_dir>/<region>.joblib`` that is trained independently
+and loaded on first use. Resident models live in an LRU bounded by an
+approximate memory budget; pings in regions without a model are scored by the
+global detector model instead.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+from src.common.config import config
+from src.common.errors import DatabaseError, ValidationError
+from src.common.metrics import registry
+from src.common.utils import geohash
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+joblib = lazy_import('joblib')
+# Only needed when region polygons are configured
+shapely = lazy_import('shapely')
+geometry = lazy_import('shapely.geometry')
+
+logger = logging.getLogger(__name__)
+
+REGION_MODELS_RESIDENT = registry.gauge(
+    'anomaly_region_models_resident', 'Region anomaly models currently loaded'
+)
+REGION_MODELS_BYTES = registry.gauge(
+    'anomaly_region_models_resident_bytes', 'Approximate memory held by loaded region models'
+)
+REGION_MODEL_LOADS = registry.counter(
+    'anomaly_region_model_loads_total', 'Region models loaded from the model store'
+)
+REGION_MODEL_EVICTIONS = registry.counter(
+    'anomaly_region_model_evictions_total', 'Region models evicted to stay within the memory budget'
+)
+
+_REGION_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def check_region_name(region: str) -> str:
+    """Reject region names that are unsafe to use as model file names"""
+    if not _REGION_NAME.match(region):
+        raise ValidationError(f"Invalid region name {region!r}")
+    return region
+
+class RegionIndex:
+    """Maps coordinates to region names"""
+
+    def __init__(self, precision: int = 3, polygons: Optional[Dict[str, List[List[float]]]] = None):
+        self.precision = precision
+        self._polygons = []
+        for name, coordinates in (polygons or {}).items():
+            # Region coordinates are [lat, lon] like geofences, so x is latitude
+            polygon = geometry.Polygon(coordinates)
+            shapely.prepare(polygon)
+            self._polygons.append((check_region_name(name), polygon))
+
+    @classmethod
+    def from_config(cls) -> 'RegionIndex':
+        polygons = None
+        path = config.get('services.ai_engine.regions.polygons_file')
+        if path:
+            with open(path, 'r') as f:
+                polygons = json.load(f)
+        return cls(config.get('services.ai_engine.regions.geohash_precision', 3), polygons)
+
+    def region_for(self, latitude: float, longitude: float) -> str:
+        """Region of a single point"""
+        return self.regions_for([latitude], [longitude])[0]
+
+    def regions_for(self, latitudes, longitudes) -> List[str]:
+        """Regions of many points, polygon regions taking precedence over geohash cells"""
+        regions = geohash.encode_many(latitudes, longitudes, self.precision)
+        if self._polygons and regions:
+            lat = np.asarray(latitudes, dtype=np.float64)
+            lon = np.asarray(longitudes, dtype=np.float64)
+            unassigned = np.ones(lat.size, dtype=bool)
+            for name, polygon in self._polygons:
+                inside = unassigned & shapely.contains_xy(polygon, lat, lon)
+                for i in np.flatnonzero(inside).tolist():
+                    regions[i] = name
+                unassigned &= ~inside
+        return regions
+
+class RegionModelStore:
+    """
+    On-disk region models with a memory-budgeted LRU of loaded ones
+
+    Model sizes are approximated by their serialized size on disk. The most
+    recently used model always stays resident, even if it alone exceeds the
+    budget.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        index: Optional[RegionIndex] = None,
+        memory_budget_bytes: int = 256 * 1024 * 1024
+    ):
+        self.model_dir = model_dir
+        self.index = index or RegionIndex()
+        self.memory_budget_bytes = memory_budget_bytes
+        self._resident: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self.resident_bytes = 0
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._available = set()
+        if os.path.isdir(model_dir):
+            self._available = {
+                name[:-len('.joblib')] for name in os.listdir(model_dir) if name.endswith('.joblib')
+            }
+
+    @classmethod
+    def from_config(cls) -> 'RegionModelStore':
+        return cls(
+            config.get('services.ai_engine.regions.model_dir', 'models/regions'),
+            RegionIndex.from_config(),
+            int(config.get('services.ai_engine.regions.memory_budget_mb', 256) * 1024 * 1024)
+        )
+
+    def has_models(self) -> bool:
+        return bool(self._available)
+
+    def available(self) -> List[str]:
+        """Regions with a trained model in the store"""
+        return sorted(self._available)
+
+    def resident(self) -> List[str]:
+        """Loaded regions, least recently used first"""
+        with self._lock:
+            return list(self._resident)
+
+    def path_for(self, region: str) -> str:
+        return os.path.join(self.model_dir, f"{check_region_name(region)}.joblib")
+
+    def get(self, region: str) -> Optional[Any]:
+        """The region's model, loading it on first use; None if it has none"""
+        with self._lock:
+            entry = self._resident.get(region)
+            if entry is not None:
+                self._resident.move_to_end(region)
+                return entry[0]
+            if region not in self._available:
+                return None
+            load_lock = self._load_locks.setdefault(region, threading.Lock())
+
+        # Loads of different regions proceed in parallel; concurrent first
+        # uses of the same region wait for a single load
+        with load_lock:
+            with self._lock:
+                entry = self._resident.get(region)
+                if entry is not None:
+                    self._resident.move_to_end(region)
+                    return entry[0]
+            path = self.path_for(region)
+            try:
+                model = joblib.load(path)
+                size = os.path.getsize(path)
+            except Exception as e:
+                logger.error("Error loading model for region %s: %s", region, e)
+                raise DatabaseError(f"Failed to load anomaly model for region {region}")
+            REGION_MODEL_LOADS.inc()
+            logger.info("Loaded model for region %s (%d bytes)", region, size)
+            self._admit(region, model, size)
+            return model
+
+    def put(self, region: str, model: Any) -> None:
+        """Save a trained region model and make it resident"""
+        path = self.path_for(region)
+        try:
+            os.makedirs(self.model_dir, exist_ok=True)
+            joblib.dump(model, path)
+            size = os.path.getsize(path)
+        except Exception as e:
+            logger.error("Error saving model for region %s: %s", region, e)
+            raise DatabaseError(f"Failed to save anomaly model for region {region}")
+        with self._lock:
+            self._available.add(region)
+        self._admit(region, model, size)
+
+    def _admit(self, region: str, model: Any, size: int) -> None:
+        with self._lock:
+            previous = self._resident.pop(region, None)
+            if previous is not None:
+                self.resident_bytes -= previous[1]
+            self._resident[region] = (model, size)
+            self.resident_bytes += size
+            while self.resident_bytes > self.memory_budget_bytes and len(self._resident) > 1:
+                evicted, (_, evicted_size) = self._resident.popitem(last=False)
+                self.resident_bytes -= evicted_size
+                REGION_MODEL_EVICTIONS.inc()
+                logger.debug("Evicted model for region %s", evicted)
+            REGION_MODELS_RESIDENT.set(len(self._resident))
+            REGION_MODELS_BYTES.set(self.resident_bytes)
@@ -1,14 +1,30 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Set
 from datetime import datetime
+from contextlib import asynccontextmanager
 import asyncio
 import logging
+from src.common.utils.logger import configure_logging, RequestIdMiddleware
+from src.common.metrics import install_metrics, registry, span
+from src.common.profiler import install_profiler, start_profiling
 
-app = FastAPI()
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging(service="alert_system")
+    start_profiling()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+install_metrics(app)
+install_profiler(app)
+
+ALERTS_CREATED = registry.counter('alerts_created_total', 'Alerts accepted', ('alert_type', 'severity'))
+ALERTS_PROCESSED = registry.counter('alerts_processed_total', 'Alerts fully dispatched', ('alert_type',))
+
 class Alert(BaseModel):
     id: str
     user_id: str
@@ -29,34 +45,53 @@ class AlertService:
     def __init__(self):
         self.alerts: List[Alert] = []
         self.emergency_contacts: dict = {}  # user_id -> List[EmergencyContact]
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add_alert(self, alert: Alert) -> None:
+        self.alerts.append(alert)
+        ALERTS_CREATED.labels(alert.alert_type, alert.severity).inc()
+
+    def dispatch(self, alert: Alert) -> asyncio.Task:
+        """Record an alert and process it in the background on the running loop"""
+        self.add_alert(alert)
+        task = asyncio.create_task(self.process_alert(alert))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
         
     async def process_alert(self, alert: Alert):
-        # Simulate alert processing
-        await asyncio.sleep(1)
-        
-        # Update alert status
-        alert.status = 'processing'
-        
-        # Notify emergency contacts
-        if alert.user_id in self.emergency_contacts:
-            await self.notify_emergency_contacts(alert)
+        with span("alert.process"):
+            # Simulate alert processing
+            with span("alert.triage"):
+                await asyncio.sleep(1)
             
-        # Notify nearest police units
-        await self.notify_police_units(alert)
-        
-        alert.status = 'resolved'
-        logger.info(f"Alert {alert.id} processed successfully")
+            # Update alert status
+            alert.status = 'processing'
+            
+            # Notify emergency contacts
+            if alert.user_id in self.emergency_contacts:
+                with span("alert.notify_contacts"):
+                    await self.notify_emergency_contacts(alert)
+                
+            # Notify nearest police units
+            with span("alert.notify_police"):
+                await self.notify_police_units(alert)
+            
+            alert.status = 'resolved'
+        ALERTS_PROCESSED.labels(alert.alert_type).inc()
+        logger.info("Alert %s processed successfully", alert.id)
         
     async def notify_emergency_contacts(self, alert: Alert):
         contacts = self.emergency_contacts.get(alert.user_id, [])
         for contact in contacts:
             # Simulate sending notifications
-            logger.info(f"Notifying emergency contact: {contact.name}")
+            logger.info("Notifying emergency contact: %s", contact.name)
             await asyncio.sleep(0.5)
             
     async def notify_police_units(self, alert: Alert):
         # Simulate notifying nearest police units
-        logger.info(f"Notifying police units for alert: {alert.id}")
+        logger.info("Notifying police units for alert: %s", alert.id)
         await asyncio.sleep(1)
 
 service = AlertService()
@@ -64,11 +99,11 @@ service = AlertService()
 @app.post("/alert")
 async def create_alert(alert: Alert, background_tasks: BackgroundTasks):
     try:
-        service.alerts.append(alert)
+        service.add_alert(alert)
         background_tasks.add_task(service.process_alert, alert)
         return {"message": "Alert created successfully", "alert_id": alert.id}
     except Exception as e:
-        logger.error(f"Error creating alert: {str(e)}")
+        logger.error("Error creating alert: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/emergency-contact")
@@ -79,7 +114,7 @@ async def add_emergency_contact(contact: EmergencyContact):
         service.emergency_contacts[contact.user_id].append(contact)
         return {"message": "Emergency contact added successfully"}
     except Exception as e:
-        logger.error(f"Error adding emergency contact: {str(e)}")
+        logger.error("Error adding emergency contact: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/alerts/{user_id}")
@@ -88,5 +123,5 @@ async def get_user_alerts(user_id: str):
         user_alerts = [alert for alert in service.alerts if alert.user_id == user_id]
         return {"alerts": user_alerts}
     except Exception as e:
-        logger.error(f"Error retrieving alerts: {str(e)}")
+        logger.error("Error retrieving alerts: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import threading
+import time
+import jwt
+from src.common.config import config
+
+RevocationHook = Callable[[Dict[str, Any]], bool]
+
+# Placeholder secret used when JWT_SECRET is unset
+DEFAULT_SECRET = 'your-secret-key'
+
+def _token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+class TokenVerifier:
+    """
+    JWT signer/verifier with precomputed key material and a bounded claims cache
+
+    Verified claims are kept in an LRU keyed by a hash of the token. An entry
+    expires at the token's ``exp`` or after ``cache_ttl`` seconds, whichever
+    comes first, so a cached token is never accepted past its expiry.
+    Revocation hooks are consulted whenever a token is verified from scratch;
+    ``revoke`` and ``revoke_jti`` also evict matching cache entries.
+    """
+
+    def __init__(
+        self,
+        secret: Optional[str] = None,
+        algorithm: Optional[str] = None,
+        cache_size: Optional[int] = None,
+        cache_ttl: Optional[int] = None
+    ):
+        self.algorithm = algorithm or config.get('jwt.algorithm', 'HS256')
+        self._algorithms = [self.algorithm]
+        self._key = jwt.get_algorithm_by_name(self.algorithm).prepare_key(
+            secret or config.get('jwt.secret', DEFAULT_SECRET)
+        )
+        self.cache_size = cache_size if cache_size is not None else config.get('jwt.cache_size', 10000)
+        self.cache_ttl = cache_ttl if cache_ttl is not None else config.get('jwt.cache_ttl', 300)
+        self._cache: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._revoked_tokens: Dict[bytes, float] = {}  # token hash -> exp
+        self._revoked_jtis: Dict[str, float] = {}  # jti -> exp
+        self._hooks: List[RevocationHook] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generate(self, payload: Dict[str, Any], expires_in: Optional[int] = None) -> str:
+        """Generate a signed JWT that expires after ``expires_in`` seconds"""
+        if expires_in is None:
+            expires_in = config.get('jwt.expires_in', 86400)
+        claims = dict(payload)
+        claims['exp'] = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        return jwt.encode(claims, self._key, algorithm=self.algorithm)
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify and decode a JWT, returning None if it is invalid, expired or revoked"""
+        key = _token_key(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return dict(claims)
+                del self._cache[key]
+            self.misses += 1
+
+        try:
+            claims = jwt.decode(token, self._key, algorithms=self._algorithms)
+        except jwt.InvalidTokenError:
+            return None
+
+        if self._is_revoked(key, claims, now):
+            return None
+
+        expires_at = now + self.cache_ttl
+        if 'exp' in claims:
+            expires_at = min(expires_at, float(claims['exp']))
+
+        if self.cache_size > 0 and expires_at > now:
+            with self._lock:
+                # A revoke() racing the decode above has already run its cache pop
+                if self._revoked_locally(key, claims, now):
+                    return None
+                self._cache[key] = (claims, expires_at)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return dict(claims)
+
+    def add_revocation_hook(self, hook: RevocationHook) -> None:
+        """
+        Register a callable that returns True for claims that must be rejected
+
+        Hooks only run on cache misses; call ``invalidate`` when an external
+        revocation should take effect before the cached entry expires.
+        """
+        self._hooks.append(hook)
+
+    def revoke(self, token: str) -> None:
+        """Reject a token for the rest of its lifetime"""
+        key = _token_key(token)
+        try:
+            claims = jwt.decode(
+                token, self._key, algorithms=self._algorithms,
+                options={'verify_exp': False}
+            )
+            exp = float(claims.get('exp', time.time() + self.cache_ttl))
+        except jwt.InvalidTokenError:
+            exp = time.time() + self.cache_ttl
+        with self._lock:
+            self._revoked_tokens[key] = exp
+            self._cache.pop(key, None)
+            self._prune_revocations()
+
+    def revoke_jti(self, jti: str, expires_at: Optional[float] = None) -> None:
+        """Reject every token carrying the given ``jti`` claim"""
+        with self._lock:
+            self._revoked_jtis[jti] = expires_at or (time.time() + config.get('jwt.expires_in', 86400))
+            for key in [k for k, (claims, _) in self._cache.items() if claims.get('jti') == jti]:
+                del self._cache[key]
+            self._prune_revocations()
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Drop one token, or the whole cache, so it is verified from scratch next time"""
+        with self._lock:
+            if token is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(_token_key(token), None)
+
+    def _is_revoked(self, key: bytes, claims: Dict[str, Any], now: float) -> bool:
+        return self._revoked_locally(key, claims, now) or any(hook(claims) for hook in self._hooks)
+
+    def _revoked_locally(self, key: bytes, claims: Dict[str, Any], now: float) -> bool:
+        if self._revoked_tokens.get(key, 0) > now:
+            return True
+        jti = claims.get('jti')
+        return jti is not None and self._revoked_jtis.get(jti, 0) > now
+
+    def _prune_revocations(self) -> None:
+        now = time.time()
+        for revoked in (self._revoked_tokens, self._revoked_jtis):
+            for k in [k for k, exp in revoked.items() if exp <= now]:
+                del revoked[k]
+
+@lru_cache(maxsize=None)
+def get_token_verifier() -> TokenVerifier:
+    """Shared verifier built from the application config"""
+    return TokenVerifier()
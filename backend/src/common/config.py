@@ -1,8 +1,18 @@
 from typing import Dict, Any
 import os
 import json
+import socket
 from dotenv import load_dotenv
 
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_duration(value: Any) -> int:
+    """Parse a duration such as 86400, '900s', '15m', '24h' or '7d' into seconds"""
+    text = str(value).strip().lower()
+    if text and text[-1] in _DURATION_UNITS:
+        return int(float(text[:-1]) * _DURATION_UNITS[text[-1]])
+    return int(text)
+
 class Config:
     """Configuration manager for the application"""
     
@@ -18,12 +28,84 @@ class Config:
                     'training': {
                         'batch_size': int(os.getenv('AI_TRAINING_BATCH_SIZE', 1000)),
                         'contamination': float(os.getenv('AI_CONTAMINATION', 0.1))
+                    },
+                    'regions': {
+                        'model_dir': os.getenv('AI_REGION_MODEL_DIR', 'models/regions'),
+                        'geohash_precision': int(os.getenv('AI_REGION_GEOHASH_PRECISION', 3)),
+                        'polygons_file': os.getenv('AI_REGION_POLYGONS_FILE', ''),
+                        'memory_budget_mb': float(os.getenv('AI_REGION_MEMORY_BUDGET_MB', 256)),
+                        'min_samples': int(os.getenv('AI_REGION_MIN_SAMPLES', 50)),
+                        'train_workers': int(os.getenv('AI_REGION_TRAIN_WORKERS', 4))
+                    },
+                    'heatmap': {
+                        'zooms': [int(z) for z in os.getenv('AI_HEATMAP_ZOOMS', '6,9,12,15').split(',')],
+                        'grid_bits': int(os.getenv('AI_HEATMAP_GRID_BITS', 4)),
+                        'bucket_seconds': parse_duration(os.getenv('AI_HEATMAP_BUCKET', '1h')),
+                        'flush_interval': parse_duration(os.getenv('AI_HEATMAP_FLUSH_INTERVAL', '5s')),
+                        'max_pending': int(os.getenv('AI_HEATMAP_MAX_PENDING', 20000))
+                    },
+                    'trajectory': {
+                        'enabled': os.getenv('AI_TRAJECTORY_COMPRESSION', 'true').lower() == 'true',
+                        'tolerance_m': float(os.getenv('AI_TRAJECTORY_TOLERANCE_M', 10)),
+                        'max_interval': parse_duration(os.getenv('AI_TRAJECTORY_MAX_INTERVAL', '5m')),
+                        'max_window': int(os.getenv('AI_TRAJECTORY_MAX_WINDOW', 64)),
+                        'max_unwritten': int(os.getenv('AI_TRAJECTORY_MAX_UNWRITTEN', 10000)),
+                        'idle_seconds': parse_duration(os.getenv('AI_TRAJECTORY_IDLE', '10m'))
+                    },
+                    'drift': {
+                        # Share of pings flagged, each raising an anomaly alert; keep it small
+                        'target_rate': float(os.getenv('AI_TARGET_ANOMALY_RATE', 0.005)),
+                        'window': parse_duration(os.getenv('AI_DRIFT_WINDOW', '1h')),
+                        'windows': int(os.getenv('AI_DRIFT_WINDOWS', 24)),
+                        'bins': int(os.getenv('AI_DRIFT_SKETCH_BINS', 256)),
+                        'min_samples': int(os.getenv('AI_DRIFT_MIN_SAMPLES', 2000)),
+                        'limit': float(os.getenv('AI_DRIFT_LIMIT', 0.15)),
+                        'buffer_size': int(os.getenv('AI_DRIFT_BUFFER_SIZE', 5000)),
+                        'cooldown': parse_duration(os.getenv('AI_DRIFT_COOLDOWN', '1h')),
+                        'check_interval': parse_duration(os.getenv('AI_DRIFT_CHECK_INTERVAL', '1m')),
+                        'auto_refresh': os.getenv('AI_DRIFT_AUTO_REFRESH', 'true').lower() == 'true'
                     }
                 },
                 'geo_service': {
                     'host': os.getenv('GEO_SERVICE_HOST', 'localhost'),
                     'port': int(os.getenv('GEO_SERVICE_PORT', 5001))
                 },
+                'ingest': {
+                    'host': os.getenv('INGEST_SERVICE_HOST', 'localhost'),
+                    'port': int(os.getenv('INGEST_SERVICE_PORT', 5003)),
+                    'alert_risk_levels': os.getenv('INGEST_ALERT_RISK_LEVELS', 'medium,high').split(','),
+                    'max_tracked_users': int(os.getenv('INGEST_MAX_TRACKED_USERS', 100000)),
+                    # Minimum ping time between two anomaly alerts for the same user
+                    'anomaly_alert_cooldown': parse_duration(os.getenv('INGEST_ANOMALY_ALERT_COOLDOWN', '10m'))
+                },
+                'places_proxy': {
+                    'host': os.getenv('PLACES_PROXY_HOST', 'localhost'),
+                    'port': int(os.getenv('PLACES_PROXY_PORT', 5004)),
+                    'cors_origins': os.getenv('PLACES_PROXY_CORS_ORIGINS', 'http://localhost:5173').split(','),
+                    'cache_path': os.getenv('PLACES_CACHE_PATH', 'cache/places.sqlite3'),
+                    'memory_size': int(os.getenv('PLACES_CACHE_MEMORY_SIZE', 10000)),
+                    'upstreams': {
+                        'nominatim': os.getenv('NOMINATIM_URL', 'https://nominatim.openstreetmap.org'),
+                        'open_meteo': os.getenv('OPEN_METEO_URL', 'https://api.open-meteo.com'),
+                        'osrm': os.getenv('OSRM_URL', 'https://router.project-osrm.org')
+                    },
+                    # Geohash precision per lookup: 7 ~ 150 m cells, 5 ~ 5 km, 8 ~ 38 m
+                    'precision': {
+                        'reverse': int(os.getenv('PLACES_REVERSE_PRECISION', 7)),
+                        'weather': int(os.getenv('PLACES_WEATHER_PRECISION', 5)),
+                        'route': int(os.getenv('PLACES_ROUTE_PRECISION', 8))
+                    },
+                    'ttl': {
+                        'reverse': parse_duration(os.getenv('PLACES_REVERSE_TTL', '7d')),
+                        'search': parse_duration(os.getenv('PLACES_SEARCH_TTL', '7d')),
+                        'weather': parse_duration(os.getenv('PLACES_WEATHER_TTL', '10m')),
+                        'route': parse_duration(os.getenv('PLACES_ROUTE_TTL', '1d'))
+                    },
+                    'user_agent': os.getenv('PLACES_USER_AGENT', 'tourist-safety-places-proxy/1.0'),
+                    'timeout': float(os.getenv('PLACES_UPSTREAM_TIMEOUT', 10)),
+                    'max_connections': int(os.getenv('PLACES_MAX_CONNECTIONS', 20)),
+                    'max_concurrency': int(os.getenv('PLACES_MAX_CONCURRENCY', 4))
+                },
                 'alert_system': {
                     'host': os.getenv('ALERT_SERVICE_HOST', 'localhost'),
                     'port': int(os.getenv('ALERT_SERVICE_PORT', 5002)),
@@ -53,16 +135,49 @@ class Config:
             },
             'jwt': {
                 'secret': os.getenv('JWT_SECRET', 'your-secret-key'),
-                'expires_in': int(os.getenv('JWT_EXPIRES_IN', 86400))
+                'algorithm': os.getenv('JWT_ALGORITHM', 'HS256'),
+                'expires_in': parse_duration(os.getenv('JWT_EXPIRES_IN', 86400)),
+                'cache_size': int(os.getenv('JWT_CACHE_SIZE', 10000)),
+                'cache_ttl': parse_duration(os.getenv('JWT_CACHE_TTL', 300))
             },
             'mqtt': {
                 'broker_url': os.getenv('MQTT_BROKER_URL', 'mqtt://localhost:1883'),
+                # Must be stable and unique per consumer for the broker to keep its session
+                'client_id': os.getenv('MQTT_CLIENT_ID', f"tourist-safety-ingest-{socket.gethostname()}"),
                 'username': os.getenv('MQTT_USERNAME', ''),
-                'password': os.getenv('MQTT_PASSWORD', '')
+                'password': os.getenv('MQTT_PASSWORD', ''),
+                'topic': os.getenv('MQTT_LOCATION_TOPIC', 'tourists/+/location'),
+                'qos': int(os.getenv('MQTT_QOS', 1)),
+                'batch_size': int(os.getenv('MQTT_BATCH_SIZE', 256)),
+                'batch_interval_ms': int(os.getenv('MQTT_BATCH_INTERVAL_MS', 50)),
+                'queue_size': int(os.getenv('MQTT_QUEUE_SIZE', 4096)),
+                'retry_initial_ms': int(os.getenv('MQTT_RETRY_INITIAL_MS', 100)),
+                'retry_max_ms': int(os.getenv('MQTT_RETRY_MAX_MS', 10000)),
+                # Failed batches are then written here and acknowledged; empty only counts them
+                'max_attempts': int(os.getenv('MQTT_MAX_ATTEMPTS', 5)),
+                'dead_letter_path': os.getenv('MQTT_DEAD_LETTER_PATH', 'dead_letters/mqtt.ndjson')
+            },
+            'profiling': {
+                'enabled': os.getenv('PROFILING_ENABLED', 'false').lower() == 'true',
+                'mode': os.getenv('PROFILING_MODE', 'all'),
+                'interval_ms': float(os.getenv('PROFILING_INTERVAL_MS', 10)),
+                'retention': parse_duration(os.getenv('PROFILING_RETENTION', '10m')),
+                'max_depth': int(os.getenv('PROFILING_MAX_DEPTH', 64)),
+                'slow_threshold_ms': float(os.getenv('PROFILING_SLOW_THRESHOLD_MS', 250)),
+                'slow_capacity': int(os.getenv('PROFILING_SLOW_CAPACITY', 50)),
+                'include_idle': os.getenv('PROFILING_INCLUDE_IDLE', 'false').lower() == 'true',
+                'signal': os.getenv('PROFILING_SIGNAL', 'SIGUSR2'),
+                'dump_dir': os.getenv('PROFILING_DUMP_DIR', 'profiles'),
+                # Mount /admin/profiler; also needs a non-default JWT_SECRET
+                'endpoints': os.getenv('PROFILING_ENDPOINTS', 'false').lower() == 'true',
+                'admin_role': os.getenv('PROFILING_ADMIN_ROLE', 'admin')
             },
             'logging': {
                 'level': os.getenv('LOG_LEVEL', 'info').upper(),
-                'file': os.getenv('LOG_FILE', 'app.log')
+                'file': os.getenv('LOG_FILE', 'app.log'),
+                # Token-bucket limit per message template; 0 disables it
+                'rate_limit': float(os.getenv('LOG_RATE_LIMIT', '50')),
+                'rate_burst': int(os.getenv('LOG_RATE_BURST', '100'))
             }
         }
     
@@ -1,18 +1,19 @@
-from typing import Optional
-import asyncpg
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
 from contextlib import asynccontextmanager
 import logging
-from urllib.parse import quote_plus
-import os
-from dotenv import load_dotenv
+from src.common.config import config
+from src.common.utils.lazy import lazy_import
 
-# Load environment variables
-load_dotenv()
+if TYPE_CHECKING:
+    import asyncpg
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+# Database drivers are imported when the first connection is made
+_asyncpg = lazy_import('asyncpg')
+_motor_asyncio = lazy_import('motor.motor_asyncio')
+_pymongo_errors = lazy_import('pymongo.errors')
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DatabaseConnection:
@@ -24,18 +25,18 @@ class DatabaseConnection:
         if cls._postgres_pool is None:
             try:
                 # Create connection pool
-                cls._postgres_pool = await asyncpg.create_pool(
-                    user=os.getenv('POSTGRES_USER', 'postgres'),
-                    password=os.getenv('POSTGRES_PASSWORD', 'postgres'),
-                    database=os.getenv('POSTGRES_DB', 'tourist_safety'),
-                    host=os.getenv('POSTGRES_HOST', 'localhost'),
-                    port=int(os.getenv('POSTGRES_PORT', 5432)),
+                cls._postgres_pool = await _asyncpg.create_pool(
+                    user=config.get('database.postgres.user'),
+                    password=config.get('database.postgres.password'),
+                    database=config.get('database.postgres.database'),
+                    host=config.get('database.postgres.host'),
+                    port=config.get('database.postgres.port'),
                     min_size=5,
                     max_size=20
                 )
                 logger.info("PostgreSQL connection pool created successfully")
             except Exception as e:
-                logger.error(f"Failed to create PostgreSQL connection pool: {str(e)}")
+                logger.error("Failed to create PostgreSQL connection pool: %s", e)
                 raise
 
         return cls._postgres_pool
@@ -44,16 +45,16 @@ class DatabaseConnection:
     def get_mongo_client(cls) -> AsyncIOMotorClient:
         if cls._mongo_client is None:
             try:
-                mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
-                cls._mongo_client = AsyncIOMotorClient(mongodb_uri)
+                mongodb_uri = config.get('database.mongodb.uri')
+                cls._mongo_client = _motor_asyncio.AsyncIOMotorClient(mongodb_uri)
                 # Verify connection
                 cls._mongo_client.admin.command('ismaster')
                 logger.info("MongoDB connection established successfully")
-            except ConnectionFailure as e:
-                logger.error(f"Failed to connect to MongoDB: {str(e)}")
+            except _pymongo_errors.ConnectionFailure as e:
+                logger.error("Failed to connect to MongoDB: %s", e)
                 raise
             except Exception as e:
-                logger.error(f"Unexpected error connecting to MongoDB: {str(e)}")
+                logger.error("Unexpected error connecting to MongoDB: %s", e)
                 raise
 
         return cls._mongo_client
@@ -77,7 +78,7 @@ async def get_postgres_connection():
         try:
             yield connection
         except Exception as e:
-            logger.error(f"Error in database operation: {str(e)}")
+            logger.error("Error in database operation: %s", e)
             raise
 
 def get_mongo_database(database_name: str = 'tourist_safety'):
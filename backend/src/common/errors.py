@@ -2,8 +2,6 @@ from fastapi import HTTPException
 from typing import Type, Optional, Dict, Any
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AppException(Exception):
@@ -71,10 +69,20 @@ class AuthorizationError(AppException):
             details=details
         )
 
+class UpstreamError(AppException):
+    """Errors from third-party services we call"""
+    def __init__(self, message: str, details: Optional[Dict[str, Any]] = None):
+        super().__init__(
+            message=message,
+            status_code=502,
+            error_code="UPSTREAM_ERROR",
+            details=details
+        )
+
 def handle_exception(e: Exception) -> HTTPException:
     """Convert application exceptions to FastAPI HTTP exceptions"""
     if isinstance(e, AppException):
-        logger.error(f"{e.error_code}: {e.message}", extra={"details": e.details})
+        logger.error("%s: %s", e.error_code, e.message, extra={"details": e.details})
         return HTTPException(
             status_code=e.status_code,
             detail={
@@ -85,7 +93,7 @@ def handle_exception(e: Exception) -> HTTPException:
         )
     
     # Handle unexpected exceptions
-    logger.error(f"Unexpected error: {str(e)}", exc_info=True)
+    logger.error("Unexpected error: %s", e, exc_info=True)
     return HTTPException(
         status_code=500,
         detail={
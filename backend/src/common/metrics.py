@@ -0,0 +1,315 @@
+"""
+Lightweight Prometheus-format metrics for the Python services
+
+Counters, gauges and histograms live in a process-wide registry and are
+rendered in the Prometheus text exposition format by the ``/metrics``
+endpoint that ``install_metrics`` adds to a FastAPI app. Named stages inside
+a request are timed with ``span``:
+
+    with span("anomaly.score"):
+        scores = model.score_samples(features)
+"""
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+import asyncio
+import threading
+import time
+
+# Latency buckets in seconds, from 100us up to 10s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+class _Metric(ABC):
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str, **kwargs: str):
+        """Return the child metric for one combination of label values"""
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child holding the value(s) of one label combination"""
+
+    def _default(self):
+        return self.labels()
+
+    def collect(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type_name}'
+        ]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+class _ValueChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def samples(self, name, labelnames, values) -> List[str]:
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self.value)}']
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[idx] += 1
+            self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def samples(self, name, labelnames, values) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f'{name}_bucket{_format_labels(labelnames, values, le)} {cumulative}')
+        labels = _format_labels(labelnames, values)
+        lines.append(f'{name}_sum{labels} {_format_value(self.sum)}')
+        lines.append(f'{name}_count{labels} {cumulative}')
+        return lines
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed bucket upper bounds"""
+    type_name = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames=labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames=labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames=labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].collect())
+        return '\n'.join(lines) + '\n'
+
+# Process-wide registry and the metrics shared by all services
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('method', 'route')
+)
+REQUESTS_TOTAL = registry.counter(
+    'http_requests_total', 'HTTP requests handled', ('method', 'route', 'status')
+)
+REQUESTS_IN_PROGRESS = registry.gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled'
+)
+STAGE_DURATION = registry.histogram(
+    'stage_duration_seconds', 'Latency of named stages inside a request', ('stage',)
+)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a named stage into the stage_duration_seconds histogram"""
+    child = STAGE_DURATION.labels(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        child.observe(time.perf_counter() - start)
+
+def timed(stage: str) -> Callable:
+    """Decorator form of ``span`` for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def observe_since_request_start(scope: dict, stage: str) -> None:
+    """
+    Record the time from the request entering MetricsMiddleware until now
+
+    Called at the top of an endpoint this measures body parsing and
+    validation, which FastAPI performs before the handler runs.
+    """
+    start = scope.get('metrics.start')
+    if start is not None:
+        STAGE_DURATION.labels(stage).observe(time.perf_counter() - start)
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if 'metrics.start' in scope:
+            # Already timed by an outer app this one is mounted in
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        scope['metrics.start'] = start
+        in_progress = REQUESTS_IN_PROGRESS.labels()
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = scope.get('route')
+            # Label by route template to keep cardinality bounded
+            path = getattr(route, 'path', None)
+            path = scope.get('root_path', '') + path if path else 'unmatched'
+            REQUEST_DURATION.labels(scope['method'], path).observe(time.perf_counter() - start)
+            REQUESTS_TOTAL.labels(scope['method'], path, str(status)).inc()
+
+def install_metrics(app, path: str = '/metrics') -> None:
+    """Add request timing middleware and a Prometheus scrape endpoint to a FastAPI app"""
+    from fastapi.responses import PlainTextResponse
+
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get(path, include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(
+            registry.render(),
+            media_type='text/plain; version=0.0.4; charset=utf-8'
+        )
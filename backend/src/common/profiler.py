@@ -0,0 +1,523 @@
+"""
+Opt-in sampling profiler for the FastAPI services
+
+While running, a daemon thread wakes every ``interval`` seconds, reads every
+thread's current stack from ``sys._current_frames()`` and counts it. A
+sample from an event loop thread is attributed to the request whose task is
+running there, labelled ``METHOD /route/template``. Samples from other
+threads are labelled with the thread name, and threads blocked in select or
+a lock wait are skipped. Counts are kept in one-second buckets for the
+retention period, so a profile can be read for any recent window.
+
+In ``slow`` mode samples are held per request and only kept for requests
+slower than a threshold. The slowest recent requests are also listed one by
+one. Samples from worker threads cannot be tied to a request and are dropped
+in this mode.
+
+Nothing is sampled until the profiler is started. It can be started through
+``POST /admin/profiler/start``, by sending the ``profiling.signal`` signal
+(SIGUSR2 by default, which toggles it and writes a profile to
+``profiling.dump_dir`` on stop), or with ``profiling.enabled`` at startup.
+At the default 100 Hz it costs 1-2% of one core, mostly the sampler thread
+waking up; ``interval_ms`` trades resolution for less.
+
+The admin endpoints are only mounted with ``profiling.endpoints`` set and a
+``jwt.secret`` other than the default, and require a bearer JWT carrying
+the ``profiling.admin_role`` role.
+
+Profiles are served as collapsed stacks (``label;frame;frame count``, the
+input of flamegraph.pl, inferno and speedscope) or as speedscope JSON.
+"""
+from collections import Counter, deque
+from types import CodeType, FrameType
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from src.common.config import config
+from src.common.errors import ValidationError
+
+logger = logging.getLogger(__name__)
+
+MODES = ('all', 'slow')
+FORMATS = ('collapsed', 'speedscope')
+
+Stack = Tuple[CodeType, ...]
+
+# Leaf frames of threads that are waiting rather than working
+_IDLE_LEAVES = {
+    ('selectors.py', 'select'),
+    ('selectors.py', 'poll'),
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+}
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    route = scope.get('route')
+    path = getattr(route, 'path', None)
+    return f"{scope['method']} {scope.get('root_path', '') + path if path else '[unrouted]'}"
+
+class _RequestState:
+    __slots__ = ('scope', 'start', 'samples', 'request_id')
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.start = time.perf_counter()
+        self.samples: List[Stack] = []
+        self.request_id: Optional[str] = None
+
+class SamplingProfiler:
+    """
+    Process-wide stack sampler with per-route aggregation
+
+    Args:
+        interval: Seconds between samples
+        retention: Seconds of samples kept for windowed profiles
+        max_depth: Innermost frames kept per stack
+        slow_threshold: Request duration in seconds that slow mode keeps
+        slow_capacity: Number of slow requests listed individually
+        include_idle: Keep samples of threads that are blocked waiting
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.01,
+        retention: int = 600,
+        max_depth: int = 64,
+        slow_threshold: float = 0.25,
+        slow_capacity: int = 50,
+        include_idle: bool = False
+    ):
+        self.interval = interval
+        self.retention = retention
+        self.max_depth = max_depth
+        self.slow_threshold = slow_threshold
+        self.include_idle = include_idle
+        self.mode: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.samples_taken = 0
+        self.slow_requests: Deque[Dict[str, Any]] = deque(maxlen=slow_capacity)
+        self._buckets: Deque[Tuple[int, Counter]] = deque()
+        self._requests: Dict[asyncio.Task, _RequestState] = {}
+        self._loops: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._labels: Dict[CodeType, str] = {}
+        self._idle: Dict[CodeType, bool] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_config(cls) -> 'SamplingProfiler':
+        return cls(
+            interval=config.get('profiling.interval_ms', 10) / 1000,
+            retention=config.get('profiling.retention', 600),
+            max_depth=config.get('profiling.max_depth', 64),
+            slow_threshold=config.get('profiling.slow_threshold_ms', 250) / 1000,
+            slow_capacity=config.get('profiling.slow_capacity', 50),
+            include_idle=config.get('profiling.include_idle', False)
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.mode is not None
+
+    def start(
+        self,
+        mode: str = 'all',
+        interval: Optional[float] = None,
+        slow_threshold: Optional[float] = None
+    ) -> None:
+        """Start sampling, or change the mode and settings of a running profiler"""
+        if mode not in MODES:
+            raise ValidationError(f"Profiler mode must be one of {list(MODES)}")
+        if interval is not None and not 0.001 <= interval <= 1.0:
+            raise ValidationError("Profiler interval must be between 1 ms and 1 s")
+        if slow_threshold is not None and slow_threshold < 0:
+            raise ValidationError("Slow request threshold must not be negative")
+        self.watch_current_loop()
+        with self._lock:
+            self.interval = interval or self.interval
+            if slow_threshold is not None:
+                self.slow_threshold = slow_threshold
+            self.mode = mode
+            if self._thread is not None:
+                return
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        logger.info("Sampling profiler started in %s mode every %.1f ms", mode, self.interval * 1000)
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self.mode = None
+            self._stop.set()
+            self._requests.clear()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+            logger.info("Sampling profiler stopped after %d samples", self.samples_taken)
+
+    def reset(self) -> None:
+        """Drop collected samples and slow request captures"""
+        with self._lock:
+            self._buckets.clear()
+            self.slow_requests.clear()
+            self.samples_taken = 0
+
+    def watch_current_loop(self) -> None:
+        """Attribute samples of the calling thread's running event loop to requests"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._loops[threading.get_ident()] = loop
+
+    def begin_request(self, scope: Dict[str, Any]) -> Optional[_RequestState]:
+        """Track the request running in the current task; returns None when not sampling"""
+        if not self.running:
+            return None
+        task = asyncio.current_task()
+        if task is None:
+            return None
+        ident = threading.get_ident()
+        if ident not in self._loops:
+            self._loops[ident] = asyncio.get_running_loop()
+        state = _RequestState(scope)
+        self._requests[task] = state
+        return state
+
+    def end_request(self, state: _RequestState) -> None:
+        task = asyncio.current_task()
+        if task is not None:
+            self._requests.pop(task, None)
+        duration = time.perf_counter() - state.start
+        if self.mode != 'slow' or duration < self.slow_threshold or not state.samples:
+            return
+        label = _route_label(state.scope)
+        stacks = Counter(state.samples)
+        self._add(int(time.time()), [((label, stack), count) for stack, count in stacks.items()])
+        self.slow_requests.append({
+            'route': label,
+            'path': state.scope.get('root_path', '') + state.scope.get('path', ''),
+            'request_id': state.request_id,
+            'duration_ms': duration * 1000,
+            'finished_at': time.time(),
+            'samples': len(state.samples),
+            'stacks': [
+                f"{self._collapse(label, stack)} {count}" for stack, count in stacks.most_common(10)
+            ]
+        })
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample(skip=own)
+            except Exception as e:  # never let a bad frame kill the sampler
+                logger.error("Profiler sample failed: %s", e)
+
+    def _stack(self, frame: Optional[FrameType]) -> Stack:
+        codes = []
+        while frame is not None and len(codes) < self.max_depth:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        return tuple(codes)
+
+    def _is_idle(self, code: CodeType) -> bool:
+        idle = self._idle.get(code)
+        if idle is None:
+            idle = self._idle[code] = (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES
+        return idle
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Take one sample of every thread except ``skip``"""
+        mode = self.mode
+        if mode is None:
+            return
+        counted = []
+        names: Optional[Dict[int, str]] = None
+        for ident, frame in sys._current_frames().items():
+            if ident == skip or (not self.include_idle and self._is_idle(frame.f_code)):
+                continue
+            stack = self._stack(frame)
+            loop = self._loops.get(ident)
+            task = asyncio.current_task(loop) if loop is not None else None
+            state = self._requests.get(task) if task is not None else None
+            if mode == 'slow':
+                if state is not None:
+                    state.samples.append(stack)
+                continue
+            if state is not None:
+                label = _route_label(state.scope)
+            elif task is not None:
+                coro = task.get_coro()
+                label = f"[task {getattr(coro, '__qualname__', task.get_name())}]"
+            elif loop is not None:
+                label = '[event loop]'
+            else:
+                if names is None:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                label = f"[thread {names.get(ident, ident)}]"
+            counted.append(((label, stack), 1))
+        self.samples_taken += 1
+        if counted:
+            self._add(int(time.time()), counted)
+
+    def _add(self, second: int, counted: List[Tuple[Tuple[str, Stack], int]]) -> None:
+        with self._lock:
+            if not self._buckets or self._buckets[-1][0] < second:
+                self._buckets.append((second, Counter()))
+            bucket = self._buckets[-1][1]
+            for key, count in counted:
+                bucket[key] += count
+            while self._buckets and self._buckets[0][0] <= second - self.retention:
+                self._buckets.popleft()
+
+    def window(self, seconds: Optional[float] = None, route: Optional[str] = None) -> Counter:
+        """Sample counts per (label, stack) over the last ``seconds`` (default: all retained)"""
+        since = int(time.time() - seconds) if seconds else 0
+        with self._lock:
+            buckets = [counts for second, counts in self._buckets if second >= since]
+        merged: Counter = Counter()
+        for counts in buckets:
+            if route is None:
+                merged.update(counts)
+            else:
+                merged.update({key: n for key, n in counts.items() if route in key[0]})
+        return merged
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            parts = code.co_filename.replace('\\', '/').split('/')
+            name = getattr(code, 'co_qualname', code.co_name)
+            label = self._labels[code] = f"{name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+        return label
+
+    def _collapse(self, label: str, stack: Stack) -> str:
+        return ';'.join([label] + [self._label(code) for code in stack])
+
+    def collapsed(self, seconds: Optional[float] = None, route: Optional[str] = None) -> str:
+        """Profile in collapsed-stack format, one ``label;frames count`` line per stack"""
+        counts = self.window(seconds, route)
+        return ''.join(
+            f"{self._collapse(label, stack)} {count}\n"
+            for (label, stack), count in counts.most_common()
+        )
+
+    def speedscope(self, seconds: Optional[float] = None, route: Optional[str] = None) -> Dict[str, Any]:
+        """Profile as a speedscope document with one sampled profile per label"""
+        counts = self.window(seconds, route)
+        frames: List[Dict[str, Any]] = []
+        index: Dict[CodeType, int] = {}
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for (label, stack), count in counts.most_common():
+            profile = profiles.get(label)
+            if profile is None:
+                profile = profiles[label] = {
+                    'type': 'sampled',
+                    'name': label,
+                    'unit': 'seconds',
+                    'startValue': 0,
+                    'endValue': 0,
+                    'samples': [],
+                    'weights': []
+                }
+            for code in stack:
+                if code not in index:
+                    index[code] = len(frames)
+                    frames.append({
+                        'name': getattr(code, 'co_qualname', code.co_name),
+                        'file': code.co_filename,
+                        'line': code.co_firstlineno
+                    })
+            weight = count * self.interval
+            profile['samples'].append([index[code] for code in stack])
+            profile['weights'].append(weight)
+            profile['endValue'] += weight
+        ordered = sorted(profiles.values(), key=lambda p: p['endValue'], reverse=True)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f"profile of the last {seconds:g}s" if seconds else "profile",
+            'exporter': 'src.common.profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': ordered
+        }
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            retained = sum(sum(counts.values()) for _, counts in self._buckets)
+        return {
+            'running': self.running,
+            'mode': self.mode,
+            'interval_ms': self.interval * 1000,
+            'slow_threshold_ms': self.slow_threshold * 1000,
+            'started_at': self.started_at,
+            'samples_taken': self.samples_taken,
+            'stacks_retained': retained,
+            'retention_seconds': self.retention,
+            'slow_requests': len(self.slow_requests)
+        }
+
+    def toggle(self, dump_dir: Optional[str] = None) -> Optional[str]:
+        """Start if stopped; otherwise stop and write the session's profile, returning its path"""
+        if not self.running:
+            self.start(config.get('profiling.mode', 'all'))
+            return None
+        started_at = self.started_at or time.time()
+        self.stop()
+        dump_dir = dump_dir or config.get('profiling.dump_dir', 'profiles')
+        os.makedirs(dump_dir, exist_ok=True)
+        path = os.path.join(dump_dir, f"profile-{os.getpid()}-{int(started_at)}.collapsed")
+        with open(path, 'w') as f:
+            f.write(self.collapsed(seconds=time.time() - started_at + 1))
+        logger.info("Wrote profile to %s", path)
+        return path
+
+# Process-wide profiler shared by every app in the process
+profiler = SamplingProfiler.from_config()
+
+_signal_installed = False
+
+def install_signal(signame: Optional[str] = None) -> bool:
+    """Toggle the profiler on a signal; only possible from the main thread"""
+    global _signal_installed
+    signame = signame if signame is not None else config.get('profiling.signal', 'SIGUSR2')
+    signum = getattr(signal, signame, None) if signame else None
+    if _signal_installed or signum is None or threading.current_thread() is not threading.main_thread():
+        return _signal_installed
+
+    def handle(signum, frame):
+        # Stopping joins the sampler thread and writes a file; keep that out of the handler
+        threading.Thread(target=profiler.toggle, name='profiler-toggle', daemon=True).start()
+
+    signal.signal(signum, handle)
+    _signal_installed = True
+    return True
+
+def start_profiling() -> None:
+    """Install the toggle signal and honour ``profiling.enabled``; call from an app lifespan"""
+    install_signal()
+    if config.get('profiling.enabled', False) and not profiler.running:
+        profiler.start(config.get('profiling.mode', 'all'))
+
+class ProfilerMiddleware:
+    """ASGI middleware registering each request's task with the profiler while it runs"""
+
+    def __init__(self, app, profiler: SamplingProfiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.profiler.running or 'profiler.state' in scope:
+            await self.app(scope, receive, send)
+            return
+
+        state = self.profiler.begin_request(scope)
+        if state is None:
+            await self.app(scope, receive, send)
+            return
+        scope['profiler.state'] = state
+
+        async def send_with_request_id(message):
+            if message['type'] == 'http.response.start':
+                for name, value in message.get('headers', []):
+                    if name == b'x-request-id':
+                        state.request_id = value.decode('latin-1')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            self.profiler.end_request(state)
+
+def _require_admin(authorization: Optional[str]) -> None:
+    from fastapi import HTTPException
+    from src.common.auth import get_token_verifier
+
+    token = None
+    if authorization and authorization[:7].lower() == 'bearer ':
+        token = authorization[7:].strip()
+    claims = get_token_verifier().verify(token) if token else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Missing or invalid bearer token")
+    if claims.get('role') != config.get('profiling.admin_role', 'admin'):
+        raise HTTPException(status_code=403, detail="Profiling requires the admin role")
+
+def install_profiler(app, prefix: str = '/admin/profiler') -> None:
+    """
+    Add the profiler middleware and, when enabled, its admin endpoints to a FastAPI app
+
+    The endpoints stay off unless ``profiling.endpoints`` is set, and also
+    while ``jwt.secret`` is the default, since anyone could mint an admin
+    token then. Signal handling and auto-start happen in ``start_profiling``.
+    """
+    from fastapi import Depends, Header, HTTPException, Query
+    from fastapi.responses import PlainTextResponse
+    from src.common.auth import DEFAULT_SECRET
+
+    app.add_middleware(ProfilerMiddleware)
+    if not config.get('profiling.endpoints', False):
+        return
+    if config.get('jwt.secret', DEFAULT_SECRET) == DEFAULT_SECRET:
+        logger.warning("Profiler endpoints disabled: jwt.secret is the default, set JWT_SECRET")
+        return
+
+    def admin(authorization: Optional[str] = Header(None)):
+        _require_admin(authorization)
+
+    @app.get(prefix, include_in_schema=False, dependencies=[Depends(admin)])
+    async def profiler_status():
+        return profiler.status()
+
+    @app.post(f"{prefix}/start", include_in_schema=False, dependencies=[Depends(admin)])
+    async def profiler_start(
+        mode: str = 'all',
+        interval_ms: Optional[float] = None,
+        threshold_ms: Optional[float] = None,
+        reset: bool = False
+    ):
+        try:
+            if reset:
+                profiler.reset()
+            profiler.start(
+                mode,
+                interval_ms / 1000 if interval_ms is not None else None,
+                threshold_ms / 1000 if threshold_ms is not None else None
+            )
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.message)
+        return profiler.status()
+
+    @app.post(f"{prefix}/stop", include_in_schema=False, dependencies=[Depends(admin)])
+    async def profiler_stop():
+        profiler.stop()
+        return profiler.status()
+
+    @app.get(f"{prefix}/profile", include_in_schema=False, dependencies=[Depends(admin)])
+    async def profiler_profile(
+        seconds: Optional[float] = Query(None, gt=0),
+        format: str = 'collapsed',
+        route: Optional[str] = None
+    ):
+        if format not in FORMATS:
+            raise HTTPException(status_code=422, detail=f"Format must be one of {list(FORMATS)}")
+        if format == 'speedscope':
+            return profiler.speedscope(seconds, route)
+        return PlainTextResponse(profiler.collapsed(seconds, route))
+
+    @app.get(f"{prefix}/slow", include_in_schema=False, dependencies=[Depends(admin)])
+    async def profiler_slow_requests():
+        return {
+            'threshold_ms': profiler.slow_threshold * 1000,
+            'requests': sorted(profiler.slow_requests, key=lambda r: r['duration_ms'], reverse=True)
+        }
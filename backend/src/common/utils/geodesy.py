@@ -0,0 +1,154 @@
+"""Vectorized geodesic helpers backed by NumPy.
+
+All functions accept scalars or array-likes of degrees and broadcast like
+regular NumPy ufuncs. Distances are great-circle (haversine) distances on a
+sphere of radius ``EARTH_RADIUS_KM``.
+"""
+from datetime import datetime
+from typing import Iterator, Optional, Sequence, Tuple, Union
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Upper bound on the number of float64 cells materialised per chunk by
+# pairwise_distances (~8 MB per intermediate array).
+DEFAULT_CHUNK_CELLS = 1 << 20
+
+ArrayLike = Union[float, Sequence[float], np.ndarray]
+
+
+def haversine(
+    lat1: ArrayLike, lon1: ArrayLike,
+    lat2: ArrayLike, lon2: ArrayLike,
+    radius: float = EARTH_RADIUS_KM
+) -> np.ndarray:
+    """Great-circle distance between point pairs, broadcasting over arrays"""
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2)
+    )
+    sin_dlat = np.sin((lat2 - lat1) * 0.5)
+    sin_dlon = np.sin((lon2 - lon1) * 0.5)
+    a = sin_dlat * sin_dlat + np.cos(lat1) * np.cos(lat2) * sin_dlon * sin_dlon
+    # Clip guards against a > 1 from rounding on antipodal points
+    return 2.0 * radius * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _iter_row_chunks(n_rows: int, n_cols: int, chunk_cells: int) -> Iterator[slice]:
+    rows_per_chunk = max(1, chunk_cells // max(1, n_cols))
+    for start in range(0, n_rows, rows_per_chunk):
+        yield slice(start, min(start + rows_per_chunk, n_rows))
+
+
+def pairwise_distances(
+    lats_a: ArrayLike, lons_a: ArrayLike,
+    lats_b: Optional[ArrayLike] = None, lons_b: Optional[ArrayLike] = None,
+    radius: float = EARTH_RADIUS_KM,
+    chunk_cells: int = DEFAULT_CHUNK_CELLS
+) -> np.ndarray:
+    """
+    Distance matrix between two point sets, computed in row chunks
+
+    Args:
+        lats_a, lons_a: Coordinates of the first set (n points)
+        lats_b, lons_b: Coordinates of the second set (m points); defaults to the first set
+        radius: Sphere radius, determines the output unit
+        chunk_cells: Maximum number of matrix cells evaluated at once
+
+    Returns:
+        np.ndarray: (n, m) matrix of distances
+    """
+    lat_a = np.radians(np.asarray(lats_a, dtype=np.float64).ravel())
+    lon_a = np.radians(np.asarray(lons_a, dtype=np.float64).ravel())
+    if lats_b is None or lons_b is None:
+        lat_b, lon_b = lat_a, lon_a
+    else:
+        lat_b = np.radians(np.asarray(lats_b, dtype=np.float64).ravel())
+        lon_b = np.radians(np.asarray(lons_b, dtype=np.float64).ravel())
+
+    cos_a = np.cos(lat_a)
+    cos_b = np.cos(lat_b)
+    out = np.empty((lat_a.size, lat_b.size), dtype=np.float64)
+
+    for rows in _iter_row_chunks(lat_a.size, lat_b.size, chunk_cells):
+        block = out[rows]
+        # Build a in place to keep one temporary per chunk
+        np.subtract(lat_b[None, :], lat_a[rows, None], out=block)
+        block *= 0.5
+        np.sin(block, out=block)
+        np.square(block, out=block)
+        dlon = np.subtract(lon_b[None, :], lon_a[rows, None])
+        dlon *= 0.5
+        np.sin(dlon, out=dlon)
+        np.square(dlon, out=dlon)
+        dlon *= cos_a[rows, None]
+        dlon *= cos_b[None, :]
+        block += dlon
+        np.clip(block, 0.0, 1.0, out=block)
+        np.sqrt(block, out=block)
+        np.arcsin(block, out=block)
+        block *= 2.0 * radius
+
+    return out
+
+
+def _to_epoch_seconds(times: Union[Sequence[datetime], np.ndarray]) -> np.ndarray:
+    arr = np.asarray(times)
+    if arr.dtype.kind == 'M':
+        return arr.astype('datetime64[us]').astype(np.int64) / 1e6
+    if arr.dtype.kind == 'O':
+        return np.array([t.timestamp() for t in arr], dtype=np.float64)
+    return arr.astype(np.float64)
+
+
+def trajectory_speeds(
+    lats: ArrayLike, lons: ArrayLike,
+    times: Union[Sequence[datetime], np.ndarray]
+) -> np.ndarray:
+    """
+    Speeds in km/h between consecutive points of a trajectory
+
+    Args:
+        lats, lons: Coordinates of the n trajectory points, in order
+        times: Datetimes, datetime64 values or epoch seconds for each point
+
+    Returns:
+        np.ndarray: n - 1 speeds; segments with no elapsed time have speed 0
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    distances = haversine(lats[:-1], lons[:-1], lats[1:], lons[1:])
+    hours = np.diff(_to_epoch_seconds(times)) / 3600.0
+    speeds = np.zeros_like(distances)
+    np.divide(distances, hours, out=speeds, where=hours != 0)
+    return speeds
+
+
+def bearing(
+    lat1: ArrayLike, lon1: ArrayLike,
+    lat2: ArrayLike, lon2: ArrayLike
+) -> np.ndarray:
+    """Initial bearing in degrees [0, 360) from the first point to the second"""
+    lat1, lon1, lat2, lon2 = (
+        np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2)
+    )
+    dlon = lon2 - lon1
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return np.degrees(np.arctan2(x, y)) % 360.0
+
+
+def trajectory_bearings(lats: ArrayLike, lons: ArrayLike) -> np.ndarray:
+    """Bearings between consecutive points of a trajectory"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    return bearing(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def nearest(
+    lat: float, lon: float,
+    lats: ArrayLike, lons: ArrayLike
+) -> Tuple[int, float]:
+    """Index of and distance to the closest candidate point"""
+    distances = haversine(lat, lon, lats, lons)
+    idx = int(np.argmin(distances))
+    return idx, float(distances[idx])
@@ -0,0 +1,105 @@
+"""Geohash encoding for scalars and NumPy coordinate arrays.
+
+Cells are computed by quantizing longitude and latitude to integers and
+interleaving their bits, so a whole array is encoded with a handful of
+vectorized operations instead of a bisection loop per point.
+"""
+from typing import List, Tuple
+import math
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 12 characters = 60 bits, the most that fits an int64 code
+MAX_PRECISION = 12
+
+def _bit_counts(precision: int) -> Tuple[int, int]:
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"Geohash precision must be between 1 and {MAX_PRECISION}")
+    bits = 5 * precision
+    # Longitude takes the first (even) bit, so it gets the extra one when odd
+    return (bits + 1) // 2, bits // 2
+
+def _to_string(code: int, precision: int) -> str:
+    chars = []
+    for shift in range(5 * (precision - 1), -1, -5):
+        chars.append(BASE32[(code >> shift) & 31])
+    return ''.join(chars)
+
+def encode(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Geohash of a single point, without NumPy"""
+    lon_bits, lat_bits = _bit_counts(precision)
+    lon_cell = min(max(int(math.floor((longitude + 180.0) / 360.0 * (1 << lon_bits))), 0), (1 << lon_bits) - 1)
+    lat_cell = min(max(int(math.floor((latitude + 90.0) / 180.0 * (1 << lat_bits))), 0), (1 << lat_bits) - 1)
+    code = 0
+    for i in range(lon_bits):
+        code |= ((lon_cell >> (lon_bits - 1 - i)) & 1) << (5 * precision - 1 - 2 * i)
+    for i in range(lat_bits):
+        code |= ((lat_cell >> (lat_bits - 1 - i)) & 1) << (5 * precision - 2 - 2 * i)
+    return _to_string(code, precision)
+
+def center(geohash: str) -> Tuple[float, float]:
+    """(lat, lon) of the middle of a geohash cell"""
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+def encode_many(latitudes, longitudes, precision: int = 6) -> List[str]:
+    """
+    Geohashes of many points at once
+
+    Args:
+        latitudes, longitudes: Coordinates in degrees
+        precision: Number of geohash characters
+
+    Returns:
+        List[str]: One geohash per point
+    """
+    lon_bits, lat_bits = _bit_counts(precision)
+    lat = np.asarray(latitudes, dtype=np.float64).ravel()
+    lon = np.asarray(longitudes, dtype=np.float64).ravel()
+    if lat.size == 0:
+        return []
+
+    lon_cells = np.clip(
+        np.floor((lon + 180.0) / 360.0 * (1 << lon_bits)), 0, (1 << lon_bits) - 1
+    ).astype(np.int64)
+    lat_cells = np.clip(
+        np.floor((lat + 90.0) / 180.0 * (1 << lat_bits)), 0, (1 << lat_bits) - 1
+    ).astype(np.int64)
+
+    codes = np.zeros(lat.size, dtype=np.int64)
+    for i in range(lon_bits):
+        # Longitude bit i (from the top) lands at interleaved position 2i
+        codes |= ((lon_cells >> (lon_bits - 1 - i)) & 1) << (5 * precision - 1 - 2 * i)
+    for i in range(lat_bits):
+        codes |= ((lat_cells >> (lat_bits - 1 - i)) & 1) << (5 * precision - 2 - 2 * i)
+
+    # Nearby points share cells, so only format each distinct code once
+    unique, inverse = np.unique(codes, return_inverse=True)
+    strings = [_to_string(code, precision) for code in unique.tolist()]
+    return [strings[i] for i in inverse.ravel().tolist()]
+
+def bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    precision = len(geohash)
+    lon_bits, lat_bits = _bit_counts(precision)
+    code = 0
+    for char in geohash:
+        index = BASE32.find(char)
+        if index < 0:
+            raise ValueError(f"Invalid geohash character {char!r}")
+        code = (code << 5) | index
+
+    lon_cell = lat_cell = 0
+    for i in range(lon_bits):
+        lon_cell = (lon_cell << 1) | ((code >> (5 * precision - 1 - 2 * i)) & 1)
+    for i in range(lat_bits):
+        lat_cell = (lat_cell << 1) | ((code >> (5 * precision - 2 - 2 * i)) & 1)
+
+    lon_size = 360.0 / (1 << lon_bits)
+    lat_size = 180.0 / (1 << lat_bits)
+    min_lat = -90.0 + lat_cell * lat_size
+    min_lon = -180.0 + lon_cell * lon_size
+    return min_lat, min_lon, min_lat + lat_size, min_lon + lon_size
@@ -2,11 +2,11 @@ from datetime import datetime, timezone
 from typing import Dict, Any, Optional
 import json
 import hashlib
-import jwt
-import os
-from dotenv import load_dotenv
+from src.common.auth import get_token_verifier
+from src.common.utils.lazy import lazy_import
 
-load_dotenv()
+# NumPy-backed; only imported once a distance is actually computed
+geodesy = lazy_import('src.common.utils.geodesy')
 
 def timestamp_utc() -> datetime:
     """Get current UTC timestamp"""
@@ -18,34 +18,15 @@ def hash_password(password: str) -> str:
 
 def generate_jwt(payload: Dict[str, Any], expires_in: int = 86400) -> str:
     """Generate a JWT token"""
-    secret = os.getenv('JWT_SECRET', 'your-secret-key')
-    exp = timestamp_utc() + datetime.timedelta(seconds=expires_in)
-    payload['exp'] = exp
-    return jwt.encode(payload, secret, algorithm='HS256')
+    return get_token_verifier().generate(payload, expires_in)
 
 def verify_jwt(token: str) -> Optional[Dict[str, Any]]:
     """Verify and decode a JWT token"""
-    try:
-        secret = os.getenv('JWT_SECRET', 'your-secret-key')
-        return jwt.decode(token, secret, algorithms=['HS256'])
-    except jwt.InvalidTokenError:
-        return None
+    return get_token_verifier().verify(token)
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """Calculate distance between two points in kilometers using Haversine formula"""
-    from math import radians, sin, cos, sqrt, atan2
-    
-    R = 6371  # Earth's radius in kilometers
-    
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    
-    a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1-a))
-    distance = R * c
-    
-    return distance
+    return float(geodesy.haversine(lat1, lon1, lat2, lon2))
 
 def calculate_speed(
     lat1: float, lon1: float, 
@@ -53,13 +34,7 @@ def calculate_speed(
     time1: datetime, time2: datetime
 ) -> float:
     """Calculate speed between two points in km/h"""
-    distance = calculate_distance(lat1, lon1, lat2, lon2)
-    time_diff = (time2 - time1).total_seconds() / 3600  # Convert to hours
-    
-    if time_diff == 0:
-        return 0
-        
-    return distance / time_diff
+    return float(geodesy.trajectory_speeds([lat1, lat2], [lon1, lon2], [time1, time2])[0])
 
 def is_valid_coordinate(lat: float, lon: float) -> bool:
     """Validate geographic coordinates"""
@@ -0,0 +1,45 @@
+import importlib
+import sys
+import threading
+import types
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder that imports the real module on first attribute access
+
+    After loading, the real module's namespace is copied onto the placeholder
+    so later attribute lookups are plain dictionary hits.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_lock'] = threading.Lock()
+        self.__dict__['_lazy_loaded'] = False
+
+    def _load(self) -> types.ModuleType:
+        with self.__dict__['_lazy_lock']:
+            module = importlib.import_module(self.__name__)
+            if not self.__dict__['_lazy_loaded']:
+                self.__dict__.update(module.__dict__)
+                self.__dict__['_lazy_loaded'] = True
+            return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Return ``name`` as a module that is only imported when first used
+
+    Already imported modules are returned as-is.
+
+    Example:
+        np = lazy_import('numpy')
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -1,62 +1,237 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from src.common.config import config
+
+# Request ID of the request currently being handled, attached to every record
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user supplied ``extra`` fields
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'request_id', 'service', 'suppressed'
+}
+
+# Argument types that are safe to format later on the listener thread
+_PRIMITIVES = frozenset({str, int, float, bool, bytes, type(None)})
+
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in ('service', 'request_id', 'suppressed'):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the service name and current request ID in the caller's context"""
+
+    def __init__(self, service: Optional[str] = None):
+        super().__init__()
+        self.service = service
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if self.service is not None:
+            record.service = self.service
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token-bucket rate limit per (logger, level, message template)
+
+    Keeping the unformatted template as the key means per-ping messages such
+    as ``"Notifying emergency contact: %s"`` share one bucket. The first
+    record let through after a drop carries a ``suppressed`` count. Only
+    WARNING and lower are throttled; ERROR and CRITICAL records always pass.
+    """
+
+    def __init__(self, rate: float = 50.0, burst: int = 100):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Tuple[str, int, str], list] = {}  # key -> [tokens, updated, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.ERROR:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+        return True
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that defers message formatting to the listener thread
+
+    The stock handler formats every record before enqueueing it, which puts
+    the formatting cost back on the caller. Records are only consumed in
+    process, so msg/args made of immutable primitives travel unformatted.
+    Any other argument could change, or be unsafe to ``str()`` without the
+    caller's locks, by the time the listener gets to it, so those records
+    are formatted here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        # A mapping is itself mutable, whether used as %(name)s args or logged with %s
+        if isinstance(args, dict) or not all(type(v) in _PRIMITIVES for v in args or ()):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+def configure_logging(
+    service: Optional[str] = None,
+    level: Optional[str] = None,
+    log_dir: Optional[str] = None,
+    json_format: bool = True
+) -> None:
+    """
+    Route all logging through a queue to a background listener thread
+
+    Safe to call more than once; only the first call installs handlers.
+
+    Args:
+        service: Service name added to every record
+        level: Root log level, defaults to ``logging.level`` from config
+        log_dir: Also write rotating log files to this directory
+        json_format: Emit JSON lines instead of plain text
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            return
+
+        formatter = JSONFormatter() if json_format else logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        handlers = [logging.StreamHandler()]
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+            handlers.append(RotatingFileHandler(
+                os.path.join(log_dir, f"{service or 'app'}.log"),
+                maxBytes=10485760,  # 10MB
+                backupCount=5
+            ))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue_handler = LazyQueueHandler(queue.SimpleQueue())
+        queue_handler.addFilter(RequestContextFilter(service))
+        queue_handler.addFilter(RateLimitFilter(
+            rate=config.get('logging.rate_limit', 50.0),
+            burst=config.get('logging.rate_burst', 100)
+        ))
+
+        root = logging.getLogger()
+        root.setLevel((level or config.get('logging.level', 'info')).upper())
+        root.addHandler(queue_handler)
+
+        _listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        root = logging.getLogger()
+        for handler in [h for h in root.handlers if isinstance(h, LazyQueueHandler)]:
+            root.removeHandler(handler)
+
+class RequestIdMiddleware:
+    """ASGI middleware binding an X-Request-ID (incoming or generated) to the request's logs"""
+
+    def __init__(self, app, header: str = 'x-request-id'):
+        self.app = app
+        self.header = header.encode('latin-1')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or request_id_var.get() is not None:
+            # Non-HTTP, or already bound by an outer app this one is mounted in
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope['headers']:
+            if name == self.header:
+                request_id = value.decode('latin-1')
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [
+                    (self.header, request_id.encode('latin-1'))
+                ]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
 
 def setup_logger(name: str, log_dir: str = "logs") -> logging.Logger:
     """
-    Set up a logger with both file and console handlers
-    
+    Set up queue-based logging with file and console output
+
     Args:
         name: Logger name
         log_dir: Directory to store log files
-    
+
     Returns:
         logging.Logger: Configured logger instance
     """
-    # Create logs directory if it doesn't exist
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Create logger
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    
-    # Create formatters
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    console_formatter = logging.Formatter(
-        '%(levelname)s: %(message)s'
-    )
-    
-    # File handler
-    log_file = os.path.join(
-        log_dir, 
-        f"{name}_{datetime.now().strftime('%Y%m%d')}.log"
-    )
-    file_handler = RotatingFileHandler(
-        log_file,
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(file_formatter)
-    
-    # Console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(console_formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+    configure_logging(service=name, log_dir=log_dir)
+    return logging.getLogger(name)
 
 def log_error(logger: logging.Logger, error: Exception, context: dict = None):
     """
     Log an error with context
-    
+
     Args:
         logger: Logger instance
         error: Exception object
@@ -67,11 +242,11 @@ def log_error(logger: logging.Logger, error: Exception, context: dict = None):
         'error_message': str(error),
         'timestamp': datetime.now().isoformat()
     }
-    
+
     if context:
         error_info.update(context)
-        
+
     logger.error(
-        f"Error occurred: {error_info['error_type']}", 
+        "Error occurred: %s", error_info['error_type'],
         extra={'error_info': error_info}
     )
@@ -0,0 +1,209 @@
+"""Streaming trajectory compression with bounded positional error.
+
+Each user's pings pass through an online opening-window simplifier
+(Douglas-Peucker evaluated incrementally) using the synchronized Euclidean
+distance: a ping may be dropped only if the position linearly interpolated
+at its timestamp, between the retained points around it, is within
+``tolerance_m`` of where it really was. Replaying retained points with
+``interpolate`` or ``resample`` therefore reproduces every dropped ping to
+within the tolerance.
+
+A dead-band of half the tolerance around the last retained point short-cuts
+the check for stationary users; anything inside it is within tolerance of
+any segment that starts at the anchor and ends inside it.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+import math
+import threading
+import time
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# Mean Earth radius in meters, matching geodesy.EARTH_RADIUS_KM
+_METERS_PER_DEGREE = math.pi * 6371000.0 / 180.0
+
+class TrajectoryPoint(NamedTuple):
+    timestamp: float  # epoch seconds
+    latitude: float
+    longitude: float
+    payload: Any = None  # carried through untouched, e.g. the document to store
+
+def _offset_m(origin: TrajectoryPoint, latitude: float, longitude: float) -> Tuple[float, float]:
+    """Local equirectangular (east, north) offset in meters; accurate at ping spacing"""
+    dlon = (longitude - origin.longitude + 180.0) % 360.0 - 180.0
+    return (
+        dlon * math.cos(math.radians(origin.latitude)) * _METERS_PER_DEGREE,
+        (latitude - origin.latitude) * _METERS_PER_DEGREE
+    )
+
+class TrajectoryCompressor:
+    """
+    Online compressor for one user's pings
+
+    ``push`` returns the points that became retained, usually none or one.
+    The latest ping is held back until a later ping shows whether it is
+    needed, so call ``flush`` when the stream ends.
+    """
+
+    def __init__(self, tolerance_m: float = 10.0, max_interval: float = 300.0, max_window: int = 64):
+        self.tolerance_m = tolerance_m
+        self.max_interval = max_interval
+        self.max_window = max_window
+        self.anchor: Optional[TrajectoryPoint] = None
+        self._window: List[TrajectoryPoint] = []  # pings after the anchor, last one is the tentative end
+        self._in_dead_band = True
+
+    def push(self, point: TrajectoryPoint, keep: bool = False) -> List[TrajectoryPoint]:
+        """
+        Add a ping, returning the points to store
+
+        Args:
+            point: The new ping
+            keep: Retain this ping regardless of the tolerance
+
+        Returns:
+            List[TrajectoryPoint]: Newly retained points in time order
+        """
+        if self.anchor is None:
+            self.anchor = point
+            return [point]
+
+        last = self._window[-1] if self._window else self.anchor
+        if point.timestamp == last.timestamp:
+            # A redelivered ping; a second point at the same time would break interpolation
+            return []
+        if point.timestamp < last.timestamp:
+            # Late pings are stored as-is and do not disturb the window
+            return [point]
+
+        retained = []
+        if not self._fits(point):
+            retained.append(self._retain_end())
+        self._window.append(point)
+        east, north = _offset_m(self.anchor, point.latitude, point.longitude)
+        self._in_dead_band = self._in_dead_band and math.hypot(east, north) <= self.tolerance_m / 2
+
+        if (
+            keep
+            or point.timestamp - self.anchor.timestamp >= self.max_interval
+            or len(self._window) >= self.max_window
+        ):
+            retained.append(self._retain_end())
+        return retained
+
+    def flush(self) -> List[TrajectoryPoint]:
+        """Retain the held-back latest ping, if any"""
+        return [self._retain_end()] if self._window else []
+
+    def _retain_end(self) -> TrajectoryPoint:
+        end = self._window[-1]
+        self.anchor = end
+        self._window = []
+        self._in_dead_band = True
+        return end
+
+    def _fits(self, point: TrajectoryPoint) -> bool:
+        """Whether every windowed ping stays within tolerance of anchor -> point"""
+        if not self._window:
+            return True
+        anchor = self.anchor
+        end_east, end_north = _offset_m(anchor, point.latitude, point.longitude)
+        if self._in_dead_band and math.hypot(end_east, end_north) <= self.tolerance_m / 2:
+            return True
+
+        span = point.timestamp - anchor.timestamp
+        for q in self._window:
+            ratio = (q.timestamp - anchor.timestamp) / span if span > 0 else 1.0
+            east, north = _offset_m(anchor, q.latitude, q.longitude)
+            if math.hypot(east - ratio * end_east, north - ratio * end_north) > self.tolerance_m:
+                return False
+        return True
+
+class TrajectoryCompressors:
+    """
+    Per-user compressors
+
+    Users that stop sending pings are flushed by ``take_idle`` so their last
+    position is not held back indefinitely.
+    """
+
+    def __init__(
+        self,
+        tolerance_m: float = 10.0,
+        max_interval: float = 300.0,
+        max_window: int = 64,
+        idle_seconds: float = 600.0
+    ):
+        self.tolerance_m = tolerance_m
+        self.max_interval = max_interval
+        self.max_window = max_window
+        self.idle_seconds = idle_seconds
+        self._compressors: Dict[str, TrajectoryCompressor] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._compressors)
+
+    def push(self, user_id: str, point: TrajectoryPoint, keep: bool = False) -> List[TrajectoryPoint]:
+        """Add a user's ping, returning the points to store"""
+        with self._lock:
+            compressor = self._compressors.get(user_id)
+            if compressor is None:
+                compressor = self._compressors[user_id] = TrajectoryCompressor(
+                    self.tolerance_m, self.max_interval, self.max_window
+                )
+            self._last_seen[user_id] = time.monotonic()
+            return compressor.push(point, keep)
+
+    def take_idle(self, now: Optional[float] = None) -> List[TrajectoryPoint]:
+        """Flush and forget users idle for ``idle_seconds``, returning their held-back pings"""
+        cutoff = (time.monotonic() if now is None else now) - self.idle_seconds
+        with self._lock:
+            idle = [u for u, seen in self._last_seen.items() if seen <= cutoff]
+            return self._drop(idle)
+
+    def flush_all(self) -> List[TrajectoryPoint]:
+        """Flush every user, e.g. on shutdown"""
+        with self._lock:
+            return self._drop(list(self._compressors))
+
+    def _drop(self, user_ids: Sequence[str]) -> List[TrajectoryPoint]:
+        retained = []
+        for user_id in user_ids:
+            retained.extend(self._compressors.pop(user_id).flush())
+            del self._last_seen[user_id]
+        return retained
+
+def interpolate(timestamps, latitudes, longitudes, at) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Positions at the requested times, linearly interpolated between retained points
+
+    Times outside the retained range are clamped to its ends. Longitudes are
+    unwrapped first so segments crossing the antimeridian interpolate the
+    short way round.
+    """
+    times = np.asarray(timestamps, dtype=np.float64)
+    at = np.asarray(at, dtype=np.float64)
+    lats = np.interp(at, times, np.asarray(latitudes, dtype=np.float64))
+    lons = np.interp(at, times, np.unwrap(np.asarray(longitudes, dtype=np.float64), period=360.0))
+    return lats, (lons + 180.0) % 360.0 - 180.0
+
+def resample(points: Sequence[TrajectoryPoint], step: float) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Replay retained points at a fixed time step
+
+    Returns:
+        Tuple of (timestamps, latitudes, longitudes) arrays
+    """
+    if not points:
+        empty = np.empty(0)
+        return empty, empty, empty
+    points = sorted(points, key=lambda p: p.timestamp)
+    times = [p.timestamp for p in points]
+    at = np.arange(times[0], times[-1], step) if times[-1] > times[0] else np.asarray(times[:1])
+    if at[-1] != times[-1]:
+        at = np.append(at, times[-1])
+    lats, lons = interpolate(times, [p.latitude for p in points], [p.longitude for p in points], at)
+    return at, lats, lons
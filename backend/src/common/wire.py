@@ -0,0 +1,237 @@
+"""
+Compact wire formats for high-rate location ping ingestion
+
+Batches of pings are decoded straight into NumPy columns (``PingColumns``)
+without building a Pydantic object per row. Supported request bodies:
+
+- ``application/x-ndjson``: one JSON object per line, same fields as LocationData
+- ``application/x-msgpack``: frames of a 4-byte big-endian length followed
+  by a MessagePack map with the LocationData fields
+- ``application/octet-stream``: back-to-back fixed-size records laid out as
+  ``PACKED_PING_FIELDS`` (little-endian, 65 bytes per ping); ``user_id``
+  is UTF-8, NUL-padded and at most ``USER_ID_BYTES`` long
+
+Timestamps are parsed once during decoding into float epoch seconds.
+Missing optional values are NaN (speed, accuracy) or -1 (battery_level).
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import struct
+from src.common.errors import ValidationError
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+NDJSON = 'application/x-ndjson'
+MSGPACK = 'application/x-msgpack'
+PACKED = 'application/octet-stream'
+
+USER_ID_BYTES = 32
+
+PACKED_PING_FIELDS = [
+    ('user_id', f'S{USER_ID_BYTES}'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('timestamp', '<f8'),
+    ('speed', '<f4'),
+    ('accuracy', '<f4'),
+    ('battery_level', 'i1'),
+]
+
+_FRAME_HEADER = struct.Struct('>I')
+
+def packed_ping_dtype():
+    """NumPy structured dtype of one packed ping record"""
+    return np.dtype(PACKED_PING_FIELDS)
+
+def parse_timestamp(value: Any) -> float:
+    """Parse an ISO-8601 string (``Z`` suffix allowed) or epoch number into epoch seconds"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+class PingColumns:
+    """Columnar batch of location pings"""
+
+    __slots__ = ('user_ids', 'latitude', 'longitude', 'timestamp', 'speed', 'accuracy', 'battery_level')
+
+    def __init__(self, user_ids, latitude, longitude, timestamp, speed, accuracy, battery_level):
+        self.user_ids: List[str] = list(user_ids)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.timestamp = np.asarray(timestamp, dtype=np.float64)
+        self.speed = np.asarray(speed, dtype=np.float64)
+        self.accuracy = np.asarray(accuracy, dtype=np.float64)
+        self.battery_level = np.asarray(battery_level, dtype=np.int16)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def validate(self) -> 'PingColumns':
+        """Apply the LocationData field constraints to every row at once"""
+        invalid = (
+            ~np.isfinite(self.latitude) | (np.abs(self.latitude) > 90)
+            | ~np.isfinite(self.longitude) | (np.abs(self.longitude) > 180)
+            | ~np.isfinite(self.timestamp)
+            | (self.speed < 0) | (self.accuracy < 0)
+            | (self.battery_level < -1) | (self.battery_level > 100)
+        )
+        if invalid.any():
+            rows = np.flatnonzero(invalid)
+            raise ValidationError(
+                f"{rows.size} invalid ping(s) in batch",
+                details={'rows': rows[:20].tolist()}
+            )
+        return self
+
+    def datetimes(self) -> List[datetime]:
+        """Timestamps as timezone-aware datetimes, for storage"""
+        return [datetime.fromtimestamp(ts, timezone.utc) for ts in self.timestamp.tolist()]
+
+    def optional(self, name: str) -> List[Optional[float]]:
+        """An optional column as Python values with missing entries as None"""
+        column = getattr(self, name)
+        missing = column < 0 if name == 'battery_level' else np.isnan(column)
+        values = column.tolist()
+        return [None if m else v for v, m in zip(values, missing.tolist())]
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> 'PingColumns':
+        """Build columns from dicts with LocationData fields"""
+        user_ids, lats, lons, times, speeds, accuracies, batteries = [], [], [], [], [], [], []
+        try:
+            for record in records:
+                user_ids.append(str(record['user_id']))
+                lats.append(record['latitude'])
+                lons.append(record['longitude'])
+                times.append(parse_timestamp(record['timestamp']))
+                speed = record.get('speed')
+                speeds.append(float('nan') if speed is None else speed)
+                accuracy = record.get('accuracy')
+                accuracies.append(float('nan') if accuracy is None else accuracy)
+                battery = record.get('battery_level')
+                batteries.append(-1 if battery is None else battery)
+            columns = cls(user_ids, lats, lons, times, speeds, accuracies, batteries)
+        # OverflowError: a value out of range for its column, e.g. battery_level 40000
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            raise ValidationError(f"Malformed ping at row {len(times)}: {e}")
+        return columns.validate()
+
+    @classmethod
+    def from_packed(cls, body: bytes) -> 'PingColumns':
+        """Decode back-to-back packed records with a single frombuffer call"""
+        dtype = packed_ping_dtype()
+        if len(body) % dtype.itemsize:
+            raise ValidationError(
+                f"Packed body length {len(body)} is not a multiple of {dtype.itemsize}"
+            )
+        records = np.frombuffer(body, dtype=dtype)
+        try:
+            user_ids = np.char.decode(np.char.rstrip(records['user_id'], b'\0'), 'utf-8')
+        except UnicodeDecodeError as e:
+            raise ValidationError(f"Packed user_id is not valid UTF-8: {e}")
+        return cls(
+            user_ids.tolist(),
+            records['latitude'], records['longitude'], records['timestamp'],
+            records['speed'], records['accuracy'], records['battery_level']
+        ).validate()
+
+def decode_ndjson(body: bytes) -> PingColumns:
+    """Decode newline-delimited JSON pings"""
+    loads = orjson.loads if orjson is not None else json.loads
+    try:
+        records = [loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as e:
+        raise ValidationError(f"Invalid NDJSON body: {e}")
+    return PingColumns.from_records(records)
+
+def decode_msgpack_frames(body: bytes) -> PingColumns:
+    """Decode length-prefixed MessagePack ping frames"""
+    try:
+        import msgpack
+    except ImportError:
+        raise ValidationError("MessagePack support requires the msgpack package")
+
+    records = []
+    view = memoryview(body)
+    offset = 0
+    while offset < len(view):
+        if offset + _FRAME_HEADER.size > len(view):
+            raise ValidationError("Truncated MessagePack frame header")
+        (length,) = _FRAME_HEADER.unpack_from(view, offset)
+        offset += _FRAME_HEADER.size
+        if offset + length > len(view):
+            raise ValidationError("Truncated MessagePack frame")
+        try:
+            records.append(msgpack.unpackb(view[offset:offset + length], raw=False))
+        except Exception as e:
+            raise ValidationError(f"Invalid MessagePack frame: {e}")
+        offset += length
+    return PingColumns.from_records(records)
+
+DECODERS = {
+    NDJSON: decode_ndjson,
+    MSGPACK: decode_msgpack_frames,
+    PACKED: PingColumns.from_packed,
+}
+
+def decode_pings(body: bytes, content_type: Optional[str]) -> PingColumns:
+    """Decode a ping batch according to its Content-Type"""
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    decoder = DECODERS.get(media_type)
+    if decoder is None:
+        raise ValidationError(
+            f"Unsupported content type {media_type or '<none>'}",
+            details={'supported': sorted(DECODERS)}
+        )
+    return decoder(body)
+
+def encode_packed(records: Iterable[Dict[str, Any]]) -> bytes:
+    """Encode ping dicts into the packed binary format"""
+    columns = PingColumns.from_records(records)
+    user_ids = [uid.encode('utf-8') for uid in columns.user_ids]
+    too_long = next((i for i, uid in enumerate(user_ids) if len(uid) > USER_ID_BYTES), None)
+    if too_long is not None:
+        raise ValidationError(
+            f"user_id at row {too_long} is longer than {USER_ID_BYTES} bytes and cannot be packed"
+        )
+    packed = np.zeros(len(columns), dtype=packed_ping_dtype())
+    packed['user_id'] = user_ids
+    for name in ('latitude', 'longitude', 'timestamp', 'speed', 'accuracy', 'battery_level'):
+        packed[name] = getattr(columns, name)
+    return packed.tobytes()
+
+def encode_msgpack_frames(records: Iterable[Dict[str, Any]]) -> bytes:
+    """Encode ping dicts as length-prefixed MessagePack frames"""
+    import msgpack
+
+    chunks = []
+    for record in records:
+        frame = msgpack.packb(record, use_bin_type=True)
+        chunks.append(_FRAME_HEADER.pack(len(frame)))
+        chunks.append(frame)
+    return b''.join(chunks)
+
+def fast_json_response(content: Any, status_code: int = 200):
+    """JSON response serialized with orjson when available (handles NumPy arrays)"""
+    from fastapi.responses import JSONResponse, Response
+
+    if orjson is None:
+        return JSONResponse(content, status_code=status_code)
+    return Response(
+        orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NAIVE_UTC),
+        status_code=status_code,
+        media_type='application/json'
+    )
@@ -1,11 +1,33 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
-import numpy as np
-from shapely.geometry import Point, Polygon
+from src.common.utils.logger import configure_logging, RequestIdMiddleware
+from src.common.metrics import install_metrics, observe_since_request_start, registry, span
+from src.common.profiler import install_profiler, start_profiling
+from src.common.utils.lazy import lazy_import
+from src.common.errors import ValidationError
+from src.common.wire import PingColumns, decode_pings, fast_json_response
 
-app = FastAPI()
+shapely = lazy_import('shapely')
+geometry = lazy_import('shapely.geometry')
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging(service="geo_service")
+    start_profiling()
+    # Pay the shapely import during startup rather than on the first /check
+    geometry.Point
+    yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+install_metrics(app)
+install_profiler(app)
+
+FENCES_ACTIVE = registry.gauge('geofence_fences_active', 'Geofences currently registered')
+FENCES_EVALUATED = registry.counter('geofence_fences_evaluated_total', 'Geofence containment tests performed')
 
 class GeoFence(BaseModel):
     id: str
@@ -28,20 +50,38 @@ class GeoFenceService:
         
     def add_fence(self, fence: GeoFence) -> None:
         self.fences.append(fence)
+        FENCES_ACTIVE.set(len(self.fences))
         
     def remove_fence(self, fence_id: str) -> None:
         self.fences = [f for f in self.fences if f.id != fence_id]
+        FENCES_ACTIVE.set(len(self.fences))
         
     def check_location(self, location: Location) -> List[GeoFence]:
-        point = Point(location.latitude, location.longitude)
-        intersecting_fences = []
-        
-        for fence in self.fences:
-            polygon = Polygon(fence.coordinates)
-            if polygon.contains(point):
-                intersecting_fences.append(fence)
-                
-        return intersecting_fences
+        with span("geofence.check"):
+            point = geometry.Point(location.latitude, location.longitude)
+            intersecting_fences = []
+            
+            for fence in self.fences:
+                polygon = geometry.Polygon(fence.coordinates)
+                if polygon.contains(point):
+                    intersecting_fences.append(fence)
+            
+            FENCES_EVALUATED.inc(len(self.fences))
+            return intersecting_fences
+
+    def check_batch(self, columns: PingColumns) -> List[List[GeoFence]]:
+        """Fences containing each ping of a columnar batch, one vectorized test per fence"""
+        with span("geofence.check_batch"):
+            matches: List[List[GeoFence]] = [[] for _ in range(len(columns))]
+            for fence in self.fences:
+                polygon = geometry.Polygon(fence.coordinates)
+                # Fence coordinates are [lat, lon], so x is latitude
+                inside = shapely.contains_xy(polygon, columns.latitude, columns.longitude)
+                for idx in inside.nonzero()[0].tolist():
+                    matches[idx].append(fence)
+
+            FENCES_EVALUATED.inc(len(self.fences) * len(columns))
+            return matches
 
 service = GeoFenceService()
 
@@ -62,18 +102,38 @@ async def delete_fence(fence_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/check")
-async def check_location(location: Location):
+async def check_location(location: Location, request: Request):
+    observe_since_request_start(request.scope, "geofence.validation")
     try:
         intersecting_fences = service.check_location(location)
-        return {
-            "in_fences": [
-                {
-                    "fence_id": fence.id,
-                    "name": fence.name,
-                    "risk_level": fence.risk_level
-                }
-                for fence in intersecting_fences
-            ]
-        }
+        return fast_json_response({
+            "in_fences": [_fence_summary(fence) for fence in intersecting_fences]
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/check/batch")
+async def check_locations_batch(request: Request):
+    """
+    Check a batch of pings sent as NDJSON, length-prefixed MessagePack or
+    packed binary records (see src.common.wire)
+    """
+    try:
+        with span("geofence.validation"):
+            columns = decode_pings(await request.body(), request.headers.get("content-type"))
+        matches = service.check_batch(columns)
+        return fast_json_response({
+            "count": len(columns),
+            "in_fences": [[_fence_summary(fence) for fence in fences] for fences in matches]
+        })
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.message)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _fence_summary(fence: GeoFence) -> dict:
+    return {
+        "fence_id": fence.id,
+        "name": fence.name,
+        "risk_level": fence.risk_level
+    }
@@ -0,0 +1,294 @@
+"""
+Single-pass ping ingestion
+
+One request validates a ping once, then scores it for anomalies and evaluates
+geofences concurrently against the in-process detector and fence set. Alerts
+are created in-process when the detector flags the ping or the user enters a
+risky fence.
+
+The ai_engine, geo_service and alert_system apps are unchanged and can still
+be deployed on their own. For a combined deployment they are mounted under
+/ai, /geo and /alerts here so fences, contacts and training share the
+in-memory state the pipeline uses.
+"""
+from fastapi import FastAPI, HTTPException, Request
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+import asyncio
+import logging
+import uuid
+from src.common.config import config
+from src.common.errors import ValidationError
+from src.common.metrics import install_metrics, observe_since_request_start, registry, span
+from src.common.profiler import install_profiler, start_profiling
+from src.common.utils.logger import configure_logging, RequestIdMiddleware
+from src.common.wire import PingColumns, fast_json_response
+from src.ai_engine import main as ai_engine
+from src.ai_engine.main import AnomalyDetector, LocationData
+from src.alert_system.main import Alert, AlertService, app as alert_app, service as alert_service
+from src.geo_service.main import GeoFence, GeoFenceService, Location, app as geo_app, service as geo_service
+
+logger = logging.getLogger(__name__)
+
+FENCE_TRANSITIONS = registry.counter(
+    'ingest_fence_transitions_total', 'Fence entries and exits seen by the pipeline', ('direction',)
+)
+ANOMALY_ALERTS_SUPPRESSED = registry.counter(
+    'ingest_anomaly_alerts_suppressed_total', 'Anomalous pings not alerted because of the per-user cooldown'
+)
+
+class PingOutcome:
+    """Everything the pipeline derived from one ping"""
+
+    __slots__ = ('anomaly', 'in_fences', 'entered', 'exited', 'alerts')
+
+    def __init__(
+        self,
+        anomaly: Dict[str, Any],
+        in_fences: List[GeoFence],
+        entered: List[GeoFence],
+        exited: List[str],
+        alerts: List[Alert]
+    ):
+        self.anomaly = anomaly
+        self.in_fences = in_fences
+        self.entered = entered
+        self.exited = exited
+        self.alerts = alerts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "anomaly": self.anomaly,
+            "in_fences": [_fence_summary(f) for f in self.in_fences],
+            "entered": [f.id for f in self.entered],
+            "exited": self.exited,
+            "alerts": [a.id for a in self.alerts]
+        }
+
+class PingPipeline:
+    """
+    Scores, fence-checks and alerts on pings
+
+    Fences each user was last seen inside are kept for users currently in at
+    least one fence, least recently pinged first out past ``max_users``. An
+    evicted user's next ping inside a fence counts as entering it again.
+
+    Anomaly alerts are raised at most once per user per ``alert_cooldown``
+    seconds of ping time; the detector flags a fixed share of all pings, so
+    a user who stays anomalous would otherwise alert on every ping.
+    """
+
+    def __init__(
+        self,
+        detector: AnomalyDetector,
+        fences: GeoFenceService,
+        alerts: AlertService,
+        alert_risk_levels: Optional[List[str]] = None,
+        store_detections: bool = True,
+        max_users: Optional[int] = None,
+        alert_cooldown: Optional[float] = None
+    ):
+        self.detector = detector
+        self.fences = fences
+        self.alerts = alerts
+        self.alert_risk_levels = frozenset(alert_risk_levels or config.get(
+            'services.ingest.alert_risk_levels', ['medium', 'high']
+        ))
+        self.store_detections = store_detections
+        self.max_users = max_users or config.get('services.ingest.max_tracked_users', 100000)
+        # user_id -> fence ids last seen inside, for users inside any fence
+        self._user_fences: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self.alert_cooldown = alert_cooldown if alert_cooldown is not None else config.get(
+            'services.ingest.anomaly_alert_cooldown', 600
+        )
+        # user_id -> ping time of the last anomaly alert, least recent first
+        self._anomaly_alerted: "OrderedDict[str, float]" = OrderedDict()
+
+    async def process(self, ping: LocationData) -> PingOutcome:
+        """Score and fence-check one validated ping, raising alerts as needed"""
+        # Geo's Location shares LocationData's already-validated fields
+        location = Location.model_construct(
+            user_id=ping.user_id,
+            latitude=ping.latitude,
+            longitude=ping.longitude,
+            timestamp=ping.get_datetime(),
+            accuracy=ping.accuracy
+        )
+
+        with span("ingest.evaluate"):
+            result, in_fences = await asyncio.gather(
+                asyncio.to_thread(self.detector.detect_anomaly, ping),
+                asyncio.to_thread(self.fences.check_location, location)
+            )
+        anomaly = result.model_dump()
+
+        entered, exited = self._transitions(ping.user_id, in_fences)
+        alerts = self._raise_alerts(
+            ping.user_id, ping.latitude, ping.longitude, ping.get_datetime(), anomaly, entered
+        )
+
+        if self.store_detections:
+            await self._store(ai_engine.store_detection(ping, anomaly))
+
+        return PingOutcome(anomaly, in_fences, entered, exited, alerts)
+
+    async def process_batch(self, columns: PingColumns) -> List[PingOutcome]:
+        """
+        Bulk variant of ``process`` for a columnar batch
+
+        Scoring and fence checks run once over the whole batch; transitions
+        and alerts are then derived row by row in arrival order.
+        """
+        if not len(columns):
+            return []
+
+        with span("ingest.evaluate_batch"):
+            scored, fence_matches = await asyncio.gather(
+                asyncio.to_thread(self.detector.detect_batch, columns),
+                asyncio.to_thread(self.fences.check_batch, columns)
+            )
+        results = ai_engine.batch_results(scored, datetime.now(timezone.utc))
+        timestamps = columns.datetimes()
+
+        outcomes = []
+        for i, (lat, lon) in enumerate(zip(columns.latitude.tolist(), columns.longitude.tolist())):
+            user_id = columns.user_ids[i]
+            entered, exited = self._transitions(user_id, fence_matches[i])
+            alerts = self._raise_alerts(user_id, lat, lon, timestamps[i], results[i], entered)
+            outcomes.append(PingOutcome(results[i], fence_matches[i], entered, exited, alerts))
+
+        if self.store_detections:
+            await self._store(ai_engine.store_detections_batch(columns, results))
+
+        return outcomes
+
+    async def _store(self, write) -> None:
+        """
+        Await a detection write without failing the ping
+
+        Alerts are already out by now. Documents of a failed insert are kept
+        and written by the next insert or background flush, so retrying the
+        whole ping would only repeat its alerts and drift updates.
+        """
+        try:
+            await write
+        except Exception as e:
+            logger.error("Storing detections failed, leaving them for the next flush: %s", e)
+
+    def _transitions(self, user_id: str, in_fences: List[GeoFence]):
+        current = frozenset(f.id for f in in_fences)
+        if current:
+            previous = self._user_fences.get(user_id, frozenset())
+            self._user_fences[user_id] = current
+            self._user_fences.move_to_end(user_id)
+            if len(self._user_fences) > self.max_users:
+                self._user_fences.popitem(last=False)
+        else:
+            previous = self._user_fences.pop(user_id, frozenset())
+
+        entered = [f for f in in_fences if f.id not in previous]
+        exited = sorted(previous - current)
+        if entered:
+            FENCE_TRANSITIONS.labels('enter').inc(len(entered))
+        if exited:
+            FENCE_TRANSITIONS.labels('exit').inc(len(exited))
+        return entered, exited
+
+    def _anomaly_alert_due(self, user_id: str, timestamp: datetime) -> bool:
+        """Whether an anomalous ping should alert, starting the user's cooldown if so"""
+        now = timestamp.timestamp()
+        last = self._anomaly_alerted.get(user_id)
+        if last is not None and now - last < self.alert_cooldown:
+            ANOMALY_ALERTS_SUPPRESSED.inc()
+            return False
+        self._anomaly_alerted[user_id] = now
+        self._anomaly_alerted.move_to_end(user_id)
+        if len(self._anomaly_alerted) > self.max_users:
+            self._anomaly_alerted.popitem(last=False)
+        return True
+
+    def _raise_alerts(
+        self,
+        user_id: str,
+        latitude: float,
+        longitude: float,
+        timestamp: datetime,
+        anomaly: Dict[str, Any],
+        entered: List[GeoFence]
+    ) -> List[Alert]:
+        location = {"latitude": latitude, "longitude": longitude}
+        alerts = []
+
+        if anomaly["is_anomaly"] and self._anomaly_alert_due(user_id, timestamp):
+            alerts.append(Alert(
+                id=uuid.uuid4().hex,
+                user_id=user_id,
+                alert_type='anomaly',
+                severity='high' if anomaly["confidence"] >= 0.7 else 'medium',
+                location=location,
+                timestamp=timestamp,
+                description=f"Anomalous movement (score {anomaly['details']['anomaly_score']:.3f})"
+            ))
+
+        for fence in entered:
+            if fence.risk_level in self.alert_risk_levels:
+                alerts.append(Alert(
+                    id=uuid.uuid4().hex,
+                    user_id=user_id,
+                    alert_type='geofence',
+                    severity=fence.risk_level,
+                    location=location,
+                    timestamp=timestamp,
+                    description=f"Entered {fence.name}"
+                ))
+
+        for alert in alerts:
+            self.alerts.dispatch(alert)
+        return alerts
+
+def _fence_summary(fence: GeoFence) -> dict:
+    return {
+        "fence_id": fence.id,
+        "name": fence.name,
+        "risk_level": fence.risk_level
+    }
+
+pipeline: Optional[PingPipeline] = None
+
+def load_pipeline() -> PingPipeline:
+    global pipeline
+    if pipeline is None:
+        pipeline = PingPipeline(ai_engine.load_detector(), geo_service, alert_service)
+    return pipeline
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging(service="ingest")
+    start_profiling()
+    load_pipeline()
+    # Mounted apps' lifespans do not run, so flush ai_engine's storage here
+    async with ai_engine.storage_flusher():
+        yield
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+install_metrics(app)
+install_profiler(app)
+app.mount("/ai", ai_engine.app)
+app.mount("/geo", geo_app)
+app.mount("/alerts", alert_app)
+
+@app.post("/ping")
+async def ingest_ping(ping: LocationData, request: Request):
+    observe_since_request_start(request.scope, "ingest.validation")
+    try:
+        outcome = await load_pipeline().process(ping)
+        return fast_json_response(outcome.to_dict())
+    except ValidationError as e:
+        logger.error("Validation error in ingestion: %s", e)
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error("Ingestion error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,479 @@
+"""
+MQTT ingestion consumer
+
+Devices publish pings to per-device topics (``tourists/<user_id>/location``
+by default) as JSON or MessagePack. The consumer micro-batches messages and
+runs each batch through ``PingPipeline.process_batch``. QoS 1/2 messages
+are acknowledged only after their batch has been processed. A failing
+batch is retried with exponential backoff up to ``mqtt.max_attempts``
+times, then written to the dead-letter file and acknowledged. Messages that
+cannot be decoded or validated are dead-lettered straight away. The
+pipeline keeps failed detection writes for its own background flush, so a
+retry only happens when scoring or fence checks fail, before any alert is
+raised.
+
+The paho transport connects with a stable ``mqtt.client_id`` and a
+persistent session, so the broker keeps the subscription and
+unacknowledged messages across reconnects and restarts.
+
+Backpressure is QoS-aware. When the internal queue is full, QoS 0 messages
+are dropped and counted. QoS 1/2 deliveries block the transport's network
+thread until there is room, so unacknowledged messages stay with the broker
+instead of piling up in memory.
+
+Run with ``python -m src.ingest.mqtt_consumer``.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from src.common.config import config
+from src.common.errors import ValidationError
+from src.common.metrics import registry, span
+from src.common.utils.logger import configure_logging
+from src.common.wire import PingColumns
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_RECEIVED = registry.counter(
+    'mqtt_messages_received_total', 'MQTT messages received', ('qos',)
+)
+MESSAGES_DROPPED = registry.counter(
+    'mqtt_messages_dropped_total', 'QoS 0 messages dropped because the queue was full'
+)
+MESSAGES_REJECTED = registry.counter(
+    'mqtt_messages_rejected_total', 'Messages acknowledged but discarded as undecodable'
+)
+MESSAGES_DEAD_LETTERED = registry.counter(
+    'mqtt_messages_dead_lettered_total', 'Messages acknowledged without being processed', ('reason',)
+)
+BATCH_SIZE = registry.histogram(
+    'mqtt_batch_size', 'Messages per processed batch',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+
+class MqttMessage:
+    __slots__ = ('topic', 'payload', 'qos', 'mid')
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, mid: int = 0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.mid = mid
+
+MessageHandler = Callable[[MqttMessage], None]
+
+class MqttTransport(ABC):
+    """
+    Interface between the consumer and an MQTT client
+
+    ``on_message`` is called for every delivery, possibly from another
+    thread. For QoS 1/2 messages it may block, which is how backpressure
+    reaches the broker.
+    """
+
+    @abstractmethod
+    async def connect(self, on_message: MessageHandler) -> None:
+        """Connect to the broker and deliver messages to ``on_message``"""
+
+    @abstractmethod
+    async def subscribe(self, topic: str, qos: int) -> None:
+        """Subscribe to a topic filter, and again after every reconnect"""
+
+    @abstractmethod
+    def ack(self, message: MqttMessage) -> None:
+        """Acknowledge a message once its batch has been processed"""
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        """Close the connection"""
+
+class PahoTransport(MqttTransport):
+    """paho-mqtt client running its network loop in a background thread with manual acks"""
+
+    def __init__(
+        self,
+        broker_url: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        client_id: Optional[str] = None
+    ):
+        url = urlparse(broker_url or config.get('mqtt.broker_url', 'mqtt://localhost:1883'))
+        self.host = url.hostname or 'localhost'
+        self.port = url.port or 1883
+        self.username = username if username is not None else config.get('mqtt.username')
+        self.password = password if password is not None else config.get('mqtt.password')
+        self.client_id = client_id if client_id is not None else config.get('mqtt.client_id')
+        if not self.client_id:
+            raise ValidationError("mqtt.client_id is required for a persistent MQTT session")
+        self._subscriptions: Dict[str, int] = {}
+        self._client = None
+
+    async def connect(self, on_message: MessageHandler) -> None:
+        import paho.mqtt.client as mqtt
+
+        loop = asyncio.get_running_loop()
+        connected = loop.create_future()
+
+        client = mqtt.Client(
+            mqtt.CallbackAPIVersion.VERSION2,
+            client_id=self.client_id,
+            clean_session=False,
+            manual_ack=True
+        )
+        if self.username:
+            client.username_pw_set(self.username, self.password or None)
+
+        def handle_connect(client, userdata, flags, reason_code, properties):
+            if not reason_code.is_failure:
+                # Restore subscriptions after paho's automatic reconnects too
+                for topic, qos in self._subscriptions.items():
+                    client.subscribe(topic, qos)
+            if not connected.done():
+                if reason_code.is_failure:
+                    loop.call_soon_threadsafe(
+                        connected.set_exception, ConnectionError(f"MQTT connect failed: {reason_code}")
+                    )
+                else:
+                    loop.call_soon_threadsafe(connected.set_result, None)
+
+        def handle_message(client, userdata, msg):
+            on_message(MqttMessage(msg.topic, msg.payload, msg.qos, msg.mid))
+
+        client.on_connect = handle_connect
+        client.on_message = handle_message
+        client.connect_async(self.host, self.port)
+        client.loop_start()
+        self._client = client
+        await connected
+
+    async def subscribe(self, topic: str, qos: int) -> None:
+        self._subscriptions[topic] = qos
+        self._client.subscribe(topic, qos)
+
+    def ack(self, message: MqttMessage) -> None:
+        if message.qos > 0:
+            self._client.ack(message.mid, message.qos)
+
+    async def disconnect(self) -> None:
+        if self._client is not None:
+            self._client.disconnect()
+            await asyncio.to_thread(self._client.loop_stop)
+            self._client = None
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """MQTT topic filter match supporting ``+`` and ``#`` wildcards"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for i, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if i >= len(topic_parts) or (part != '+' and part != topic_parts[i]):
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+class InProcessBroker:
+    """
+    Minimal in-memory broker stand-in for tests and local runs
+
+    Publishing to a subscribed topic runs the subscriber's delivery handler
+    in a worker thread, like paho's network thread. It also tracks
+    unacknowledged QoS 1/2 messages so tests can check acknowledgement.
+    """
+
+    def __init__(self):
+        self._subscriptions: List[Tuple[str, int, 'InProcessTransport']] = []
+        self._next_mid = 1
+        self._lock = threading.Lock()
+        self.unacked: Dict[int, MqttMessage] = {}
+
+    async def publish(self, topic: str, payload: bytes, qos: int = 1) -> None:
+        for pattern, max_qos, transport in list(self._subscriptions):
+            if topic_matches(pattern, topic):
+                with self._lock:
+                    mid = self._next_mid
+                    self._next_mid += 1
+                message = MqttMessage(topic, payload, min(qos, max_qos), mid)
+                if message.qos > 0:
+                    self.unacked[mid] = message
+                await asyncio.to_thread(transport.deliver, message)
+
+    def subscribe(self, pattern: str, qos: int, transport: 'InProcessTransport') -> None:
+        self._subscriptions.append((pattern, qos, transport))
+
+    def unsubscribe_all(self, transport: 'InProcessTransport') -> None:
+        self._subscriptions = [s for s in self._subscriptions if s[2] is not transport]
+
+    def ack(self, mid: int) -> None:
+        self.unacked.pop(mid, None)
+
+class InProcessTransport(MqttTransport):
+    def __init__(self, broker: InProcessBroker):
+        self.broker = broker
+        self._on_message: Optional[MessageHandler] = None
+
+    async def connect(self, on_message: MessageHandler) -> None:
+        self._on_message = on_message
+
+    async def subscribe(self, topic: str, qos: int) -> None:
+        self.broker.subscribe(topic, qos, self)
+
+    def deliver(self, message: MqttMessage) -> None:
+        self._on_message(message)
+
+    def ack(self, message: MqttMessage) -> None:
+        if message.qos > 0:
+            self.broker.ack(message.mid)
+
+    async def disconnect(self) -> None:
+        self.broker.unsubscribe_all(self)
+
+def _decode_payload(message: MqttMessage) -> Dict[str, Any]:
+    payload = message.payload
+    if payload[:1] in (b'{', b' ', b'\n'):
+        record = json.loads(payload)
+    else:
+        import msgpack
+        record = msgpack.unpackb(payload, raw=False)
+    if not isinstance(record, dict):
+        raise ValueError("payload is not an object")
+    if 'user_id' not in record:
+        # tourists/<user_id>/location carries the device's user in the topic
+        parts = message.topic.split('/')
+        if len(parts) >= 2:
+            record['user_id'] = parts[1]
+    return record
+
+BatchProcessor = Callable[[PingColumns], Awaitable[Any]]
+
+class MqttIngestConsumer:
+    def __init__(
+        self,
+        transport: MqttTransport,
+        process_batch: BatchProcessor,
+        topic: Optional[str] = None,
+        qos: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        batch_interval: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        retry_initial: Optional[float] = None,
+        retry_max: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        dead_letter_path: Optional[str] = None
+    ):
+        self.transport = transport
+        self.process_batch = process_batch
+        self.topic = topic or config.get('mqtt.topic', 'tourists/+/location')
+        self.qos = qos if qos is not None else config.get('mqtt.qos', 1)
+        self.batch_size = batch_size or config.get('mqtt.batch_size', 256)
+        self.batch_interval = batch_interval if batch_interval is not None else (
+            config.get('mqtt.batch_interval_ms', 50) / 1000
+        )
+        self.queue_size = queue_size or config.get('mqtt.queue_size', 4096)
+        self.retry_initial = retry_initial if retry_initial is not None else (
+            config.get('mqtt.retry_initial_ms', 100) / 1000
+        )
+        self.retry_max = retry_max if retry_max is not None else (
+            config.get('mqtt.retry_max_ms', 10000) / 1000
+        )
+        self.max_attempts = max_attempts or config.get('mqtt.max_attempts', 5)
+        self.dead_letter_path = dead_letter_path if dead_letter_path is not None else (
+            config.get('mqtt.dead_letter_path', 'dead_letters/mqtt.ndjson')
+        )
+        self.batches_failed = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self.batches_processed = 0
+
+    def _on_message(self, message: MqttMessage) -> None:
+        """Called from the transport's thread for every delivery"""
+        MESSAGES_RECEIVED.labels(str(message.qos)).inc()
+        if self._stopping:
+            return
+        if message.qos == 0:
+            self._loop.call_soon_threadsafe(self._offer, message)
+            return
+        # Block the network thread until there is room; the broker keeps the
+        # rest of the in-flight window unacknowledged meanwhile
+        pending = asyncio.run_coroutine_threadsafe(self._queue.put(message), self._loop)
+        while True:
+            try:
+                pending.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                if self._stopping:
+                    pending.cancel()
+                    return
+
+    def _offer(self, message: MqttMessage) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            MESSAGES_DROPPED.inc()
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        await self.transport.connect(self._on_message)
+        await self.transport.subscribe(self.topic, self.qos)
+        logger.info("Subscribed to %s (qos %s)", self.topic, self.qos)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        await self.transport.disconnect()
+
+    async def _next_batch(self) -> List[MqttMessage]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    async def handle_batch(self, batch: List[MqttMessage]) -> None:
+        records, accepted, rejected = [], [], []
+        columns = None
+        for message in batch:
+            try:
+                records.append(_decode_payload(message))
+                accepted.append(message)
+            except Exception as e:
+                logger.warning("Rejecting undecodable message on %s: %s", message.topic, e)
+                rejected.append(message)
+
+        if records:
+            try:
+                columns = PingColumns.from_records(records)
+            except Exception as e:
+                # One bad row fails the columnar batch; fall back to per-row validation
+                logger.warning("Invalid ping in batch, validating individually: %s", e)
+                columns, accepted, invalid = self._validate_individually(records, accepted)
+                rejected.extend(invalid)
+
+        # Rejected messages would fail again on redelivery, so ack them now
+        if rejected:
+            MESSAGES_REJECTED.inc(len(rejected))
+            await self._dead_letter(rejected, 'invalid')
+        for message in rejected:
+            self.transport.ack(message)
+
+        if columns is not None and len(columns) and not await self._process_with_retry(columns):
+            await self._dead_letter(accepted, 'failed')
+
+        for message in accepted:
+            self.transport.ack(message)
+        BATCH_SIZE.observe(len(batch))
+        self.batches_processed += 1
+
+    async def _process_with_retry(self, columns: PingColumns) -> bool:
+        """
+        Process a batch, retrying with exponential backoff up to ``max_attempts`` times
+
+        Its messages stay unacknowledged meanwhile, so a full queue stops
+        further deliveries instead of the broker's in-flight window silently
+        filling up. Returns False once the attempts are used up; raises if
+        the consumer is stopping.
+        """
+        delay = self.retry_initial
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with span("mqtt.process_batch"):
+                    await self.process_batch(columns)
+                return True
+            except Exception as e:
+                self.batches_failed += 1
+                if self._stopping:
+                    raise
+                if attempt == self.max_attempts:
+                    logger.error(
+                        "Giving up on batch of %s pings after %d attempts: %s", len(columns), attempt, e
+                    )
+                    return False
+                logger.error(
+                    "Failed to process batch of %s pings, retrying in %.1fs: %s", len(columns), delay, e
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.retry_max)
+        return False
+
+    async def _dead_letter(self, messages: List[MqttMessage], reason: str) -> None:
+        """Append messages acknowledged without processing to the dead-letter file"""
+        MESSAGES_DEAD_LETTERED.labels(reason).inc(len(messages))
+        if not self.dead_letter_path:
+            return
+        now = time.time()
+        lines = ''.join(
+            json.dumps({
+                'topic': m.topic,
+                'payload': m.payload.decode('utf-8', 'backslashreplace'),
+                'reason': reason,
+                'dead_lettered_at': now
+            }) + '\n'
+            for m in messages
+        )
+
+        def write():
+            os.makedirs(os.path.dirname(self.dead_letter_path) or '.', exist_ok=True)
+            with open(self.dead_letter_path, 'a') as f:
+                f.write(lines)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            logger.error("Could not write %d dead letters to %s: %s", len(messages), self.dead_letter_path, e)
+
+    @staticmethod
+    def _validate_individually(records, messages):
+        valid_records, valid_messages, invalid = [], [], []
+        for record, message in zip(records, messages):
+            try:
+                PingColumns.from_records([record])
+                valid_records.append(record)
+                valid_messages.append(message)
+            except Exception:
+                invalid.append(message)
+        columns = PingColumns.from_records(valid_records)
+        return columns, valid_messages, invalid
+
+    async def run(self) -> None:
+        """
+        Consume until cancelled, starting the subscription if needed
+
+        An unexpected error disconnects and propagates rather than skipping
+        the batch; its messages are redelivered on the next connect.
+        """
+        if self._queue is None:
+            await self.start()
+        try:
+            while True:
+                await self.handle_batch(await self._next_batch())
+        finally:
+            await self.stop()
+
+async def main() -> None:
+    from src.ai_engine.main import storage_flusher
+    from src.ingest.main import load_pipeline
+
+    configure_logging(service="mqtt_consumer")
+    pipeline = load_pipeline()
+    consumer = MqttIngestConsumer(PahoTransport(), pipeline.process_batch)
+    async with storage_flusher():
+        await consumer.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
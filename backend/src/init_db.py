@@ -4,9 +4,8 @@ import os
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 import logging
+from src.common.utils.logger import configure_logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -40,7 +39,7 @@ async def init_postgres():
 
         await conn.close()
     except Exception as e:
-        logger.error(f"Error initializing PostgreSQL: {str(e)}")
+        logger.error("Error initializing PostgreSQL: %s", e)
         raise
 
 async def init_mongodb():
@@ -53,6 +52,7 @@ async def init_mongodb():
         # Create collections
         await db.create_collection('users')
         await db.create_collection('anomaly_detections')
+        await db.create_collection('anomaly_tiles')
         await db.create_collection('alerts')
         await db.create_collection('audit_logs')
 
@@ -60,13 +60,14 @@ async def init_mongodb():
         await db.users.create_index('email', unique=True)
         await db.anomaly_detections.create_index([('location', '2dsphere')])
         await db.anomaly_detections.create_index('timestamp')
+        await db.anomaly_tiles.create_index([('tile', 1), ('bucket', 1)])
         await db.alerts.create_index([('location', '2dsphere')])
         await db.alerts.create_index('timestamp')
         await db.audit_logs.create_index('timestamp')
 
         logger.info("MongoDB collections and indexes created successfully")
     except Exception as e:
-        logger.error(f"Error initializing MongoDB: {str(e)}")
+        logger.error("Error initializing MongoDB: %s", e)
         raise
 
 async def main():
@@ -76,8 +77,9 @@ async def main():
         await init_mongodb()
         logger.info("Database initialization completed successfully")
     except Exception as e:
-        logger.error(f"Database initialization failed: {str(e)}")
+        logger.error("Database initialization failed: %s", e)
         raise
 
 if __name__ == "__main__":
+    configure_logging(service="init_db")
     asyncio.run(main())
@@ -0,0 +1,264 @@
+"""
+Replay a Scenario against the ai_engine, geo_service and alert_system apps
+
+Each ping becomes POST /detect on ai_engine and POST /check on geo_service.
+Each panic becomes POST /alert followed by GET /alerts/{user_id} on
+alert_system. Fences, emergency contacts and a training batch are sent
+first and are not measured.
+
+Targets are either the ASGI apps called in-process (``AsgiTarget``) or
+services over HTTP (``HttpTarget``). An in-process request counts as done
+when its last response body chunk is sent, as on a real server, so
+background tasks run afterwards without adding to its latency.
+
+With ``rate`` unset the driver is closed-loop: ``concurrency`` workers send
+requests back to back. With ``rate`` set requests are started on a fixed
+schedule, and latency is measured from the scheduled start. Time spent
+waiting for a free slot is counted, so a stalled service cannot hide its
+queueing delay.
+"""
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+from src.loadgen.report import Recorder
+from src.loadgen.trajectories import Scenario
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ('ai', 'geo', 'alerts')
+
+def _dumps(body: Any) -> bytes:
+    return orjson.dumps(body) if orjson is not None else json.dumps(body).encode()
+
+class Request(NamedTuple):
+    service: str
+    method: str
+    path: str
+    body: Optional[Dict[str, Any]]
+    name: str  # Endpoint label in the report, with path parameters templated
+
+class AsgiTarget:
+    """Calls an ASGI app directly on the running event loop"""
+
+    def __init__(self, app):
+        self.app = app
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> int:
+        payload = _dumps(body) if body is not None else b''
+        headers = [(b'host', b'loadgen'), (b'content-length', str(len(payload)).encode())]
+        if body is not None:
+            headers.append((b'content-type', b'application/json'))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': b'',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('loadgen', 80),
+        }
+        done = asyncio.get_running_loop().create_future()
+        status = 0
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': payload, 'more_body': False}
+            # Block like a client that keeps the connection open until the app finishes
+            await done
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body' and not message.get('more_body', False):
+                if not done.done():
+                    done.set_result(status)
+
+        async def run():
+            try:
+                await self.app(scope, receive, send)
+            except Exception as e:
+                if not done.done():
+                    done.set_exception(e)
+                else:
+                    logger.error("Error after response to %s %s: %s", method, path, e)
+            finally:
+                if not done.done():
+                    done.set_result(status or 500)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return await done
+
+    async def drain(self) -> None:
+        """Wait for background work started by earlier requests, such as training"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def aclose(self, timeout: float = 5.0) -> None:
+        """Give background work started by requests a moment to finish, then cancel it"""
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+class HttpTarget:
+    """Sends requests to a running service over a pooled keep-alive connection"""
+
+    def __init__(self, base_url: str, max_connections: int = 100, timeout: float = 30.0, settle: float = 2.0):
+        import httpx
+
+        self.settle = settle
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+
+    async def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> int:
+        content = _dumps(body) if body is not None else None
+        headers = {'content-type': 'application/json'} if body is not None else None
+        response = await self.client.request(method, path, content=content, headers=headers)
+        await response.aread()
+        return response.status_code
+
+    async def drain(self) -> None:
+        """Background work on a remote service cannot be observed, so wait a fixed time"""
+        await asyncio.sleep(self.settle)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+def build_requests(scenario: Scenario) -> List[Request]:
+    """The measured requests of a scenario, in the order they are sent"""
+    requests = []
+    for event in scenario.events():
+        if event.kind == 'ping':
+            ping = event.payload
+            requests.append(Request('ai', 'POST', '/detect', ping, 'ai POST /detect'))
+            requests.append(Request('geo', 'POST', '/check', {
+                "user_id": ping["user_id"],
+                "latitude": ping["latitude"],
+                "longitude": ping["longitude"],
+                "timestamp": ping["timestamp"],
+                "accuracy": ping["accuracy"]
+            }, 'geo POST /check'))
+        elif event.kind == 'panic':
+            requests.append(Request('alerts', 'POST', '/alert', event.payload, 'alerts POST /alert'))
+            requests.append(Request(
+                'alerts', 'GET', f"/alerts/{event.user_id}", None, 'alerts GET /alerts/{user_id}'
+            ))
+    return requests
+
+async def prepare(scenario: Scenario, targets: Dict[str, Any], training_size: int = 2000) -> None:
+    """Create fences and contacts and train the anomaly model; none of it is measured"""
+    for fence in scenario.fences():
+        await _expect_ok(targets['geo'], 'POST', '/fence', fence)
+    for contact in scenario.contacts():
+        await _expect_ok(targets['alerts'], 'POST', '/emergency-contact', contact)
+    if training_size:
+        await _expect_ok(targets['ai'], 'POST', '/train', scenario.training_pings(training_size))
+        # Training runs as a background task; detections before it finishes would fail
+        await targets['ai'].drain()
+
+async def _expect_ok(target, method: str, path: str, body: Any) -> None:
+    status = await target.request(method, path, body)
+    if not 200 <= status < 300:
+        raise RuntimeError(f"Setup request {method} {path} failed with status {status}")
+
+async def drive(
+    requests: List[Request],
+    targets: Dict[str, Any],
+    concurrency: int = 32,
+    rate: Optional[float] = None,
+    recorder: Optional[Recorder] = None
+) -> Recorder:
+    """
+    Send requests and record their latency
+
+    Args:
+        requests: Requests in the order to send them
+        targets: Target per service name ('ai', 'geo', 'alerts')
+        concurrency: Requests in flight at once
+        rate: Requests per second to schedule at (open loop), or None to
+            send as fast as the services respond (closed loop)
+        recorder: Recorder to add to, a new one by default
+
+    Returns:
+        Recorder: Latencies and statuses per endpoint
+    """
+    recorder = recorder or Recorder()
+
+    async def send(request: Request, scheduled: float) -> None:
+        try:
+            status = await targets[request.service].request(request.method, request.path, request.body)
+        except Exception as e:
+            logger.error("%s %s failed: %s", request.method, request.path, e)
+            status = 0
+        recorder.record(request.name, time.perf_counter() - scheduled, status)
+
+    recorder.start()
+    if rate is None:
+        queue = iter(requests)
+
+        async def worker():
+            for request in queue:
+                await send(request, time.perf_counter())
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    else:
+        slots = asyncio.Semaphore(max(1, concurrency))
+        in_flight: Set[asyncio.Task] = set()
+        origin = time.perf_counter()
+
+        async def bounded(request: Request, scheduled: float):
+            try:
+                await send(request, scheduled)
+            finally:
+                slots.release()
+
+        for i, request in enumerate(requests):
+            scheduled = origin + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await slots.acquire()
+            task = asyncio.create_task(bounded(request, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    recorder.stop()
+    return recorder
+
+async def run_scenario(
+    scenario: Scenario,
+    targets: Dict[str, Any],
+    concurrency: int = 32,
+    rate: Optional[float] = None,
+    training_size: int = 2000
+) -> Tuple[Recorder, int]:
+    """Prepare the services and drive the whole scenario, returning the recorder and request count"""
+    await prepare(scenario, targets, training_size)
+    requests = build_requests(scenario)
+    logger.info("Driving %d requests with concurrency %d", len(requests), concurrency)
+    return await drive(requests, targets, concurrency, rate), len(requests)
@@ -0,0 +1,170 @@
+"""
+Load test the Python services with synthetic tourist trajectories
+
+Usage (from the backend directory):
+    python -m src.loadgen.main --tourists 200 --duration 300 --output report.json
+    python -m src.loadgen.main --mode http --serve --rate 400
+    python -m src.loadgen.main --mode http --ai-url http://staging:5000 ...
+
+``inprocess`` (the default) calls the ai_engine, geo_service and
+alert_system apps directly on one event loop, with MongoDB and PostgreSQL
+replaced by the in-memory stand-ins in src.loadgen.standins and the anomaly
+model written to a temporary directory. ``http`` drives services over HTTP;
+with ``--serve`` it first starts all three under uvicorn on localhost using
+the same stand-ins.
+
+The JSON report (see src.loadgen.report) goes to --output, or stdout.
+"""
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+from src.common.config import config
+from src.loadgen import standins
+from src.loadgen.driver import SERVICES, AsgiTarget, HttpTarget, run_scenario
+from src.loadgen.report import build_report
+from src.loadgen.trajectories import Scenario
+
+logger = logging.getLogger(__name__)
+
+_CONFIG_KEYS = {'ai': 'ai_engine', 'geo': 'geo_service', 'alerts': 'alert_system'}
+
+def _apps(model_dir: str) -> Dict[str, Any]:
+    """The three apps, with the detector pointed at a scratch model directory"""
+    from src.ai_engine import main as ai_engine
+    from src.ai_engine.regions import RegionIndex, RegionModelStore
+    from src.alert_system.main import app as alert_app
+    from src.geo_service.main import app as geo_app
+
+    ai_engine.detector = ai_engine.AnomalyDetector(
+        model_path=os.path.join(model_dir, 'anomaly_detector.joblib'),
+        regions=RegionModelStore(os.path.join(model_dir, 'regions'), RegionIndex.from_config())
+    )
+    return {'ai': ai_engine.app, 'geo': geo_app, 'alerts': alert_app}
+
+async def _serve(stack: AsyncExitStack, apps: Dict[str, Any], host: str) -> Dict[str, str]:
+    """Start each app under uvicorn in this process, returning their base URLs"""
+    import uvicorn
+
+    servers = {}
+    for name, app in apps.items():
+        port = config.get(f'services.{_CONFIG_KEYS[name]}.port')
+        server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level='warning'))
+        servers[name] = (server, asyncio.create_task(server.serve()), f"http://{host}:{port}")
+
+    async def shutdown():
+        for server, _, _ in servers.values():
+            server.should_exit = True
+        await asyncio.gather(*(task for _, task, _ in servers.values()), return_exceptions=True)
+
+    stack.push_async_callback(shutdown)
+    while not all(server.started for server, _, _ in servers.values()):
+        failed = [name for name, (_, task, _) in servers.items() if task.done()]
+        if failed:
+            raise RuntimeError(f"Could not start {', '.join(failed)} on {host}")
+        await asyncio.sleep(0.05)
+    return {name: url for name, (_, _, url) in servers.items()}
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    scenario = Scenario(
+        tourists=args.tourists,
+        duration=args.duration,
+        ping_interval=args.ping_interval,
+        seed=args.seed,
+        fences=args.fences
+    )
+    async with AsyncExitStack() as stack:
+        targets: Dict[str, Any] = {}
+        if args.mode == 'inprocess' or args.serve:
+            stack.enter_context(standins.install())
+            model_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix='loadgen-'))
+            apps = _apps(model_dir)
+
+        if args.mode == 'inprocess':
+            for name, app in apps.items():
+                await stack.enter_async_context(app.router.lifespan_context(app))
+                targets[name] = AsgiTarget(app)
+        else:
+            urls = await _serve(stack, apps, args.host) if args.serve else {
+                name: getattr(args, f'{name}_url') or "http://{}:{}".format(
+                    config.get(f'services.{_CONFIG_KEYS[name]}.host'),
+                    config.get(f'services.{_CONFIG_KEYS[name]}.port')
+                )
+                for name in SERVICES
+            }
+            for name, url in urls.items():
+                targets[name] = HttpTarget(url, max_connections=args.concurrency)
+        for target in targets.values():
+            stack.push_async_callback(target.aclose)
+
+        recorder, requests = await run_scenario(
+            scenario, targets, args.concurrency, args.rate, args.training_size
+        )
+
+    return build_report(
+        recorder,
+        mode='http' if args.mode == 'http' else 'inprocess',
+        served=bool(args.serve),
+        requests=requests,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        scenario={
+            'tourists': scenario.tourists,
+            'duration': scenario.duration,
+            'ping_interval': scenario.ping_interval,
+            'seed': scenario.seed,
+            'fences': args.fences,
+            'mix': scenario.mix
+        }
+    )
+
+def _print_table(report: Dict[str, Any], stream) -> None:
+    print(f"{'endpoint':<32} {'count':>7} {'err':>5} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)",
+          file=stream)
+    for name, stats in report['endpoints'].items():
+        latency = stats['latency_ms']
+        print(
+            f"{name:<32} {stats['count']:>7} {stats['errors']:>5} {stats['throughput_rps']:>9.1f} "
+            f"{latency.get('p50', 0):>8.2f} {latency.get('p95', 0):>8.2f} {latency.get('p99', 0):>8.2f}",
+            file=stream
+        )
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--tourists', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=600.0, help="Simulated seconds of pings")
+    parser.add_argument('--ping-interval', type=float, default=5.0)
+    parser.add_argument('--fences', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight at once")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="Open-loop requests per second (default: closed loop, as fast as possible)")
+    parser.add_argument('--training-size', type=int, default=2000,
+                        help="Pings sent to /train before the measured run, 0 to skip")
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--serve', action='store_true',
+                        help="With --mode http, start the services on localhost with in-memory databases")
+    parser.add_argument('--host', default='127.0.0.1', help="Address --serve binds to")
+    for name in SERVICES:
+        parser.add_argument(f'--{name}-url', default=None, help=f"Base URL of the {_CONFIG_KEYS[name]} service")
+    parser.add_argument('--output', default='-', help="Report path, or - for stdout")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    _print_table(report, sys.stderr)
+    text = json.dumps(report, indent=2, default=str)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Latency recording and the machine-readable load test report
+
+A report is a JSON object with a ``meta`` block describing the run (commit,
+Python version, scenario parameters) and an ``endpoints`` block holding, per
+endpoint, request and error counts, throughput and latency percentiles in
+milliseconds. Reports from different commits can be diffed key by key.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import os
+import platform
+import subprocess
+import time
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+PERCENTILES = (50, 95, 99)
+
+def git_commit(cwd: Optional[str] = None) -> Optional[str]:
+    """Commit of the working tree, with a -dirty suffix if it has local changes"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+class Recorder:
+    """Latencies (seconds) and status codes per endpoint"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.started: Optional[float] = None
+        self.stopped: Optional[float] = None
+
+    def start(self) -> None:
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def stop(self) -> None:
+        self.stopped = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.stopped or time.perf_counter()) - self.started
+
+    def record(self, endpoint: str, latency: float, status: int) -> None:
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+
+    @staticmethod
+    def _summary(latencies: List[float], statuses: Counter, elapsed: float) -> Dict[str, Any]:
+        values = np.asarray(latencies, dtype=np.float64) * 1e3
+        count = int(values.size)
+        errors = sum(n for status, n in statuses.items() if not 200 <= status < 300)
+        latency = {'mean': float(values.mean()), 'max': float(values.max())} if count else {}
+        if count:
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES).tolist()):
+                latency[f"p{p}"] = value
+        return {
+            'count': count,
+            'errors': errors,
+            'throughput_rps': count / elapsed if elapsed > 0 else 0.0,
+            'latency_ms': latency,
+            'statuses': {str(status): n for status, n in sorted(statuses.items())}
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-endpoint statistics plus an ``all`` entry over every request"""
+        elapsed = self.elapsed
+        endpoints = {
+            name: self._summary(self.latencies[name], self.statuses[name], elapsed)
+            for name in sorted(self.latencies)
+        }
+        endpoints['all'] = self._summary(
+            [value for values in self.latencies.values() for value in values],
+            sum(self.statuses.values(), Counter()),
+            elapsed
+        )
+        return endpoints
+
+def build_report(recorder: Recorder, **meta: Any) -> Dict[str, Any]:
+    """
+    Report of a finished run
+
+    Args:
+        recorder: Recorder the run wrote to
+        **meta: Run parameters to include, such as the scenario settings
+
+    Returns:
+        Dict[str, Any]: JSON-serializable report
+    """
+    return {
+        'meta': {
+            'commit': git_commit(os.path.dirname(os.path.abspath(__file__))),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'elapsed_s': recorder.elapsed,
+            **meta
+        },
+        'endpoints': recorder.summary()
+    }
@@ -0,0 +1,341 @@
+"""
+In-memory stand-ins for MongoDB and PostgreSQL
+
+They implement the parts of the Motor and asyncpg APIs the services use, so
+the apps can run under load tests and unit tests without database servers.
+``install()`` puts them into DatabaseConnection, after which
+get_mongo_database() and get_postgres_connection() return them.
+
+Mongo queries support equality and the $eq/$ne/$gt/$gte/$lt/$lte/$in
+operators on dotted paths. Updates support $set, $inc, $min, $max and
+$setOnInsert. Duplicate _ids raise DuplicateKeyError, or BulkWriteError
+from insert_many and bulk_write, as with the driver. No service queries PostgreSQL at runtime, so its stand-in only
+records statements and returns empty results.
+"""
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import copy
+import itertools
+from src.common.database.connection import DatabaseConnection
+from src.common.utils.lazy import lazy_import
+
+pymongo = lazy_import('pymongo')
+
+_MISSING = object()
+_DUPLICATE_KEY = 11000
+
+_COMPARISONS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$gt': lambda value, operand: value is not _MISSING and value > operand,
+    '$gte': lambda value, operand: value is not _MISSING and value >= operand,
+    '$lt': lambda value, operand: value is not _MISSING and value < operand,
+    '$lte': lambda value, operand: value is not _MISSING and value <= operand,
+    '$in': lambda value, operand: value in operand,
+}
+
+def _lookup(document: Dict[str, Any], path: str) -> Any:
+    value: Any = document
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+def _assign(document: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, leaf = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[leaf] = value
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Whether a document satisfies a Mongo filter"""
+    for path, condition in (query or {}).items():
+        value = _lookup(document, path)
+        if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+            for op, operand in condition.items():
+                if op not in _COMPARISONS:
+                    raise NotImplementedError(f"Query operator {op} is not supported")
+                if not _COMPARISONS[op](value, operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+def project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Copy of a document restricted by an inclusion or exclusion projection"""
+    if not projection:
+        return copy.deepcopy(document)
+    included = [path for path, flag in projection.items() if flag and path != '_id']
+    if included:
+        result: Dict[str, Any] = {}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        for path in included:
+            value = _lookup(document, path)
+            if value is not _MISSING:
+                _assign(result, path, copy.deepcopy(value))
+        return result
+    result = copy.deepcopy(document)
+    for path, flag in projection.items():
+        if not flag:
+            *parents, leaf = path.split('.')
+            parent = _lookup(result, '.'.join(parents)) if parents else result
+            if isinstance(parent, dict):
+                parent.pop(leaf, None)
+    return result
+
+def apply_update(document: Dict[str, Any], update: Dict[str, Any], inserting: bool = False) -> None:
+    """Apply a Mongo update document in place"""
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, operand in fields.items():
+            current = _lookup(document, path)
+            if op in ('$set', '$setOnInsert'):
+                value = copy.deepcopy(operand)
+            elif op == '$inc':
+                value = operand if current is _MISSING else current + operand
+            elif op == '$min':
+                value = operand if current is _MISSING else min(current, operand)
+            elif op == '$max':
+                value = operand if current is _MISSING else max(current, operand)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported")
+            _assign(document, path, value)
+
+class MemoryCursor:
+    """Async iterator over query results, with the chaining methods Motor cursors have"""
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self._documents = documents
+        self._iter: Optional[Iterator[Dict[str, Any]]] = None
+
+    def batch_size(self, size: int) -> 'MemoryCursor':
+        return self
+
+    def sort(self, key: str, direction: int = 1) -> 'MemoryCursor':
+        self._documents.sort(key=lambda d: _lookup(d, key), reverse=direction < 0)
+        return self
+
+    def skip(self, count: int) -> 'MemoryCursor':
+        self._documents = self._documents[count:]
+        return self
+
+    def limit(self, count: int) -> 'MemoryCursor':
+        if count:
+            self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._documents[:length] if length else list(self._documents)
+
+    def __aiter__(self) -> 'MemoryCursor':
+        self._iter = iter(self._documents)
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class MemoryCollection:
+    """A Motor collection backed by an insertion-ordered dict keyed by _id"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.documents: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self.indexes: List[Tuple[Any, Dict[str, Any]]] = []
+        self._ids = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _insert(self, document: Dict[str, Any]) -> Any:
+        # Like the driver, assign the _id on the caller's document
+        if '_id' not in document:
+            document['_id'] = next(self._ids)
+        if document['_id'] in self.documents:
+            message = (
+                f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {document['_id']!r}"
+            )
+            raise pymongo.errors.DuplicateKeyError(message, _DUPLICATE_KEY, {
+                'code': _DUPLICATE_KEY, 'errmsg': message, 'keyValue': {'_id': document['_id']}
+            })
+        self.documents[document['_id']] = copy.deepcopy(document)
+        return document['_id']
+
+    def _bulk(self, operations: List[Any], ordered: bool, apply) -> None:
+        """Apply operations in turn, raising BulkWriteError for duplicates like the driver"""
+        errors = []
+        for index, op in enumerate(operations):
+            try:
+                apply(op)
+            except pymongo.errors.DuplicateKeyError as e:
+                errors.append(dict(e.details, index=index))
+                if ordered:
+                    break
+        if errors:
+            raise pymongo.errors.BulkWriteError({'writeErrors': errors, 'writeConcernErrors': []})
+
+    async def insert_one(self, document: Dict[str, Any]):
+        return SimpleNamespace(inserted_id=self._insert(document))
+
+    async def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True):
+        inserted_ids = []
+        self._bulk(documents, ordered, lambda d: inserted_ids.append(self._insert(d)))
+        return SimpleNamespace(inserted_ids=inserted_ids)
+
+    def _upsert(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool) -> Tuple[int, Any]:
+        for document in self.documents.values():
+            if matches(document, query):
+                apply_update(document, update)
+                return 1, None
+        if not upsert:
+            return 0, None
+        document = {
+            path: value for path, value in query.items()
+            if not (isinstance(value, dict) and any(k.startswith('$') for k in value))
+        }
+        apply_update(document, update, inserting=True)
+        return 0, self._insert(document)
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        matched, upserted_id = self._upsert(query, update, upsert)
+        return SimpleNamespace(matched_count=matched, modified_count=matched, upserted_id=upserted_id)
+
+    async def bulk_write(self, operations, ordered: bool = True):
+        """Apply pymongo InsertOne and UpdateOne requests"""
+        inserted = matched = upserted = 0
+
+        def apply(op):
+            nonlocal inserted, matched, upserted
+            if hasattr(op, '_filter'):
+                count, upserted_id = self._upsert(op._filter, op._doc, getattr(op, '_upsert', False))
+                matched += count
+                upserted += upserted_id is not None
+            else:
+                self._insert(op._doc)
+                inserted += 1
+
+        self._bulk(list(operations), ordered, apply)
+        return SimpleNamespace(
+            inserted_count=inserted, matched_count=matched, modified_count=matched, upserted_count=upserted
+        )
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        return MemoryCursor([project(d, projection) for d in self.documents.values() if matches(d, query)])
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        for document in self.documents.values():
+            if matches(document, query):
+                return project(document, projection)
+        return None
+
+    async def count_documents(self, query: Optional[Dict[str, Any]] = None) -> int:
+        return sum(1 for d in self.documents.values() if matches(d, query))
+
+    async def delete_many(self, query: Optional[Dict[str, Any]] = None):
+        doomed = [key for key, d in self.documents.items() if matches(d, query)]
+        for key in doomed:
+            del self.documents[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+    async def create_index(self, keys, **kwargs) -> str:
+        self.indexes.append((keys, kwargs))
+        return kwargs.get('name', f"index_{len(self.indexes)}")
+
+class MemoryDatabase:
+    """Creates collections on first access, as Motor does"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def create_collection(self, name: str) -> MemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return sorted(self._collections)
+
+class MemoryMongoClient:
+    def __init__(self):
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(name)
+        return self._databases[name]
+
+    def close(self) -> None:
+        pass
+
+class MemoryPostgresConnection:
+    """Records every statement; queries return no rows"""
+
+    def __init__(self, statements: List[Tuple[str, tuple]]):
+        self.statements = statements
+
+    async def execute(self, query: str, *args) -> str:
+        self.statements.append((query, args))
+        return query.split(None, 1)[0].upper() if query.strip() else ''
+
+    async def executemany(self, query: str, args) -> None:
+        for row in args:
+            self.statements.append((query, tuple(row)))
+
+    async def fetch(self, query: str, *args) -> List[Any]:
+        self.statements.append((query, args))
+        return []
+
+    async def fetchrow(self, query: str, *args) -> Optional[Any]:
+        self.statements.append((query, args))
+        return None
+
+    async def fetchval(self, query: str, *args) -> Optional[Any]:
+        self.statements.append((query, args))
+        return None
+
+class MemoryPostgresPool:
+    def __init__(self):
+        self.statements: List[Tuple[str, tuple]] = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield MemoryPostgresConnection(self.statements)
+
+    async def close(self) -> None:
+        pass
+
+@contextmanager
+def install(
+    mongo: Optional[MemoryMongoClient] = None,
+    postgres: Optional[MemoryPostgresPool] = None
+):
+    """
+    Route DatabaseConnection to in-memory stand-ins until the block exits
+
+    Yields:
+        Tuple[MemoryMongoClient, MemoryPostgresPool]: The installed stand-ins
+    """
+    mongo = mongo or MemoryMongoClient()
+    postgres = postgres or MemoryPostgresPool()
+    saved = DatabaseConnection._mongo_client, DatabaseConnection._postgres_pool
+    DatabaseConnection._mongo_client, DatabaseConnection._postgres_pool = mongo, postgres
+    try:
+        yield mongo, postgres
+    finally:
+        DatabaseConnection._mongo_client, DatabaseConnection._postgres_pool = saved
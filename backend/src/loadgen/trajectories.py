@@ -0,0 +1,293 @@
+"""
+Synthetic tourist trajectories for load generation
+
+Every simulated tourist follows one behaviour for the whole run:
+
+- ``stroll``: walking pace with gradual turns and occasional stops
+- ``loiter``: GPS jitter around one spot, as from a phone left on a table
+- ``transit``: vehicle speeds on a mostly straight heading
+- ``fence_crossing``: walks back and forth over the edge of a geofence
+- ``panic``: strolls, then runs with one ping per second and raises a panic alert
+
+All randomness comes from one seeded generator, so a seed always produces
+the same fences, pings and alerts in the same order.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import math
+from src.common.utils.lazy import lazy_import
+
+np = lazy_import('numpy')
+
+# 2025-08-30T00:00:00Z, so generated timestamps do not depend on the clock
+START = 1756512000.0
+
+METERS_PER_DEGREE = 111195.0
+
+BEHAVIOURS = ('stroll', 'loiter', 'transit', 'fence_crossing', 'panic')
+
+DEFAULT_MIX = {
+    'stroll': 0.5,
+    'loiter': 0.2,
+    'transit': 0.15,
+    'fence_crossing': 0.1,
+    'panic': 0.05
+}
+
+RISK_LEVELS = ('low', 'medium', 'high')
+
+class Event(NamedTuple):
+    """One thing a tourist's phone sends, ``at`` seconds into the run"""
+    at: float
+    kind: str  # 'ping' or 'panic'
+    user_id: str
+    payload: Dict[str, Any]
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+class Scenario:
+    """
+    A reproducible population of tourists around a city centre
+
+    Args:
+        tourists: Number of simulated users
+        duration: Length of the simulated period in seconds
+        ping_interval: Mean seconds between pings (jittered by 10%)
+        seed: Seed for every random draw
+        center: (lat, lon) the tourists and fences are placed around
+        radius_m: Distance from the centre tourists start within
+        fences: Number of rectangular geofences to create
+        mix: Share of tourists per behaviour, defaults to DEFAULT_MIX
+    """
+
+    def __init__(
+        self,
+        tourists: int = 100,
+        duration: float = 600.0,
+        ping_interval: float = 5.0,
+        seed: int = 0,
+        center: Tuple[float, float] = (12.9716, 77.5946),
+        radius_m: float = 3000.0,
+        fences: int = 8,
+        mix: Optional[Dict[str, float]] = None,
+        start: float = START
+    ):
+        mix = dict(mix or DEFAULT_MIX)
+        unknown = set(mix) - set(BEHAVIOURS)
+        if unknown:
+            raise ValueError(f"Unknown behaviours {sorted(unknown)}")
+        if ping_interval <= 0 or duration <= 0:
+            raise ValueError("duration and ping_interval must be positive")
+        self.tourists = tourists
+        self.duration = float(duration)
+        self.ping_interval = float(ping_interval)
+        self.seed = seed
+        self.center = center
+        self.radius_m = radius_m
+        self.start = start
+        self.mix = mix
+
+        rng = np.random.default_rng(seed)
+        self._fences = self._make_fences(rng, fences)
+        weights = np.array([mix.get(b, 0.0) for b in BEHAVIOURS], dtype=np.float64)
+        self.behaviours: List[str] = [
+            BEHAVIOURS[i] for i in rng.choice(len(BEHAVIOURS), size=tourists, p=weights / weights.sum())
+        ]
+        # One child seed per tourist keeps each trajectory independent of the others
+        self._seeds = rng.integers(0, 2 ** 63 - 1, size=tourists).tolist()
+
+    def user_id(self, index: int) -> str:
+        return f"tourist_{index:05d}"
+
+    def _offset(self, north_m, east_m):
+        """Degrees of (lat, lon) for a displacement in metres at the centre's latitude"""
+        return (
+            north_m / METERS_PER_DEGREE,
+            east_m / (METERS_PER_DEGREE * math.cos(math.radians(self.center[0])))
+        )
+
+    def _make_fences(self, rng, count: int) -> List[Dict[str, Any]]:
+        fences = []
+        for i in range(count):
+            north, east = (rng.uniform(-0.8, 0.8, 2) * self.radius_m).tolist()
+            half_h, half_w = rng.uniform(100, 300, 2).tolist()
+            lat, lon = (c + d for c, d in zip(self.center, self._offset(north, east)))
+            dlat, dlon = self._offset(half_h, half_w)
+            fences.append({
+                "id": f"fence_{i:03d}",
+                "name": f"Synthetic zone {i}",
+                "coordinates": [
+                    [lat - dlat, lon - dlon],
+                    [lat - dlat, lon + dlon],
+                    [lat + dlat, lon + dlon],
+                    [lat + dlat, lon - dlon],
+                    [lat - dlat, lon - dlon]
+                ],
+                "risk_level": RISK_LEVELS[i % len(RISK_LEVELS)],
+                "description": "Generated by src.loadgen"
+            })
+        return fences
+
+    def fences(self) -> List[Dict[str, Any]]:
+        """Geofences in the geo_service /fence request shape"""
+        return [dict(f) for f in self._fences]
+
+    def contacts(self) -> List[Dict[str, Any]]:
+        """One emergency contact per tourist, in the alert_system request shape"""
+        return [
+            {
+                "user_id": self.user_id(i),
+                "name": f"Contact of tourist {i}",
+                "phone": f"+91{9000000000 + i}",
+                "relationship": "family"
+            }
+            for i in range(self.tourists)
+        ]
+
+    def _times(self, rng, start: float, end: float, interval: float):
+        steps = rng.uniform(0.9, 1.1, int((end - start) / interval) + 2) * interval
+        times = start + rng.uniform(0, interval) + np.concatenate([[0.0], np.cumsum(steps)])
+        return times[times < end]
+
+    def _walk(self, rng, times, speed_m_s: float, turn_sigma: float, p_stop: float, p_go: float):
+        """North/east displacements of a correlated random walk, and the speed at each step"""
+        n = len(times)
+        dt = np.diff(times, prepend=times[0] if n else 0.0)
+        heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, turn_sigma, n))
+        moving = np.empty(n, dtype=bool)
+        state = True
+        draws = rng.random(n)
+        for i in range(n):
+            state = draws[i] >= p_stop if state else draws[i] < p_go
+            moving[i] = state
+        speed = np.where(moving, speed_m_s * rng.uniform(0.8, 1.2, n), 0.0)
+        north = np.cumsum(speed * dt * np.cos(heading))
+        east = np.cumsum(speed * dt * np.sin(heading))
+        return north, east, speed
+
+    def _track(self, index: int):
+        """(times, north_m, east_m, speed, panic_at) of one tourist's true path"""
+        behaviour = self.behaviours[index]
+        rng = np.random.default_rng(self._seeds[index])
+        start_north, start_east = rng.uniform(-1, 1, 2) * self.radius_m
+        times = self._times(rng, 0.0, self.duration, self.ping_interval)
+        panic_at = None
+
+        if behaviour == 'loiter':
+            n = len(times)
+            north = np.full(n, start_north) + rng.normal(0, 3, n)
+            east = np.full(n, start_east) + rng.normal(0, 3, n)
+            speed = np.abs(rng.normal(0, 0.2, n))
+        elif behaviour == 'transit':
+            north, east, speed = self._walk(rng, times, rng.uniform(8, 15), 0.05, 0.01, 0.3)
+            north, east = north + start_north, east + start_east
+        elif behaviour == 'fence_crossing' and self._fences:
+            fence = self._fences[int(rng.integers(len(self._fences)))]
+            (lat_min, lon_min), (lat_max, lon_max) = fence["coordinates"][0], fence["coordinates"][2]
+            # Pace east-west across the fence's eastern edge, 150 m either side of it
+            edge_north, edge_east = (
+                ((lat_min + lat_max) / 2 - self.center[0]) * METERS_PER_DEGREE,
+                (lon_max - self.center[1]) * METERS_PER_DEGREE * math.cos(math.radians(self.center[0]))
+            )
+            period = rng.uniform(240, 480)
+            phase = 2 * np.pi * times / period + rng.uniform(0, 2 * np.pi)
+            north = edge_north + rng.normal(0, 5, len(times))
+            east = edge_east + 150.0 * np.sin(phase)
+            speed = np.abs(150.0 * 2 * np.pi / period * np.cos(phase))
+        else:
+            north, east, speed = self._walk(rng, times, rng.uniform(1.0, 1.6), 0.3, 0.02, 0.1)
+            north, east = north + start_north, east + start_east
+            if behaviour == 'panic':
+                panic_at = float(rng.uniform(0.3, 0.7) * self.duration)
+                before = times < panic_at
+                burst_end = min(panic_at + 60.0, self.duration)
+                burst = np.arange(panic_at, burst_end, 1.0)
+                origin_north = north[before][-1] if before.any() else start_north
+                origin_east = east[before][-1] if before.any() else start_east
+                heading, run_speed = rng.uniform(0, 2 * np.pi), rng.uniform(3, 5)
+                run_north = origin_north + run_speed * (burst - panic_at) * np.cos(heading)
+                run_east = origin_east + run_speed * (burst - panic_at) * np.sin(heading)
+                # After the burst the tourist stays where the run ended
+                after = times >= burst_end
+                rest = int(after.sum())
+                times = np.concatenate([times[before], burst, times[after]])
+                north = np.concatenate([north[before], run_north, np.full(rest, run_north[-1])])
+                east = np.concatenate([east[before], run_east, np.full(rest, run_east[-1])])
+                speed = np.concatenate([speed[before], np.full(len(burst), run_speed), np.zeros(rest)])
+        return times, north, east, speed, panic_at
+
+    def tourist_events(self, index: int) -> List[Event]:
+        """Pings (and the panic alert, if any) of one tourist in time order"""
+        times, north, east, speed, panic_at = self._track(index)
+        rng = np.random.default_rng(self._seeds[index] ^ 0x5EED)
+        n = len(times)
+        accuracy = rng.uniform(5, 20, n)
+        # GPS error with a standard deviation of about half the reported accuracy
+        north = north + rng.normal(0, 1, n) * accuracy / 2
+        east = east + rng.normal(0, 1, n) * accuracy / 2
+        dlat, dlon = self._offset(north, east)
+        lats = np.clip(self.center[0] + dlat, -90.0, 90.0).tolist()
+        lons = (((self.center[1] + dlon) + 180.0) % 360.0 - 180.0).tolist()
+        battery = np.clip(100 - rng.uniform(0, 40) - times / 360.0, 1, 100).astype(int).tolist()
+
+        user_id = self.user_id(index)
+        events = [
+            Event(at, 'ping', user_id, {
+                "user_id": user_id,
+                "latitude": lat,
+                "longitude": lon,
+                "timestamp": _iso(self.start + at),
+                "speed": spd,
+                "accuracy": acc,
+                "battery_level": bat
+            })
+            for at, lat, lon, spd, acc, bat in zip(
+                times.tolist(), lats, lons, speed.tolist(), accuracy.tolist(), battery
+            )
+        ]
+        if panic_at is not None:
+            at_panic = next((e for e in events if e.at >= panic_at), events[-1] if events else None)
+            location = (
+                {"latitude": at_panic.payload["latitude"], "longitude": at_panic.payload["longitude"]}
+                if at_panic is not None else {"latitude": self.center[0], "longitude": self.center[1]}
+            )
+            events.append(Event(panic_at, 'panic', user_id, {
+                "id": f"panic_{index:05d}",
+                "user_id": user_id,
+                "alert_type": "panic",
+                "severity": "high",
+                "location": location,
+                "timestamp": _iso(self.start + panic_at),
+                "description": "Panic button pressed"
+            }))
+            events.sort(key=lambda e: e.at)
+        return events
+
+    def events(self) -> List[Event]:
+        """Every tourist's events merged in time order"""
+        merged = []
+        for i in range(self.tourists):
+            merged.extend(self.tourist_events(i))
+        # Stable sort: simultaneous events keep tourist order
+        merged.sort(key=lambda e: e.at)
+        return merged
+
+    def training_pings(self, count: int = 2000, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Pings of ordinary strolling tourists for fitting the anomaly model
+
+        Drawn from a separate seed so they are not the pings replayed under load.
+        """
+        warmup = Scenario(
+            tourists=max(1, -(-count // max(1, int(self.duration / self.ping_interval)))),
+            duration=self.duration,
+            ping_interval=self.ping_interval,
+            seed=self.seed + 1 if seed is None else seed,
+            center=self.center,
+            radius_m=self.radius_m,
+            fences=0,
+            mix={'stroll': 0.7, 'loiter': 0.2, 'transit': 0.1},
+            start=self.start
+        )
+        return [e.payload for e in warmup.events() if e.kind == 'ping'][:count]
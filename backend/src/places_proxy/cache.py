@@ -0,0 +1,164 @@
+"""
+Two-tier TTL cache with request coalescing
+
+Entries live in an in-memory LRU in front of a SQLite file, so hot keys are
+a dictionary lookup and the cache survives restarts. Concurrent misses for
+the same key share a single fetch.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+def _dumps(value: Any) -> bytes:
+    return orjson.dumps(value) if orjson is not None else json.dumps(value).encode()
+
+def _loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+class MemoryCache:
+    """LRU of (value, expires_at) entries"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, now: float) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+class DiskCache:
+    """SQLite-backed store of serialized values with expiry times"""
+
+    # Expired rows are deleted after this many writes
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, float]]:
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        return row
+
+    def set(self, key: str, value: bytes, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, expires_at)
+            )
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class TieredCache:
+    """
+    Memory LRU over an optional DiskCache, with one fetch per key in flight
+
+    ``get_or_fetch`` reports where the value came from: ``memory``, ``disk``,
+    ``upstream`` (this call fetched it) or ``coalesced`` (it waited for
+    another caller's fetch).
+    """
+
+    def __init__(self, memory_size: int = 10000, path: Optional[str] = None):
+        self.memory = MemoryCache(memory_size)
+        self.disk = DiskCache(path) if path else None
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: float,
+        fetch: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """Cached value for ``key``, calling ``fetch`` and caching its result for ``ttl`` seconds on a miss"""
+        value = self.memory.get(key, time.time())
+        if value is not None:
+            return value, 'memory'
+
+        task = self._inflight.get(key)
+        if task is not None:
+            value, _ = await asyncio.shield(task)
+            return value, 'coalesced'
+
+        # The load runs as its own task so a cancelled caller does not fail the others
+        task = asyncio.ensure_future(self._load(key, ttl, fetch))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved even if every caller went away
+
+    async def _load(self, key: str, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        if self.disk is not None:
+            row = await asyncio.to_thread(self.disk.get, key)
+            if row is not None and row[1] > time.time():
+                value = _loads(row[0])
+                self.memory.set(key, value, row[1])
+                return value, 'disk'
+
+        value = await fetch()
+        expires_at = time.time() + ttl
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, _dumps(value), expires_at)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error("Error writing cache entry %s: %s", key, e)
+        return value, 'upstream'
+
+    def close(self) -> None:
+        if self.disk is not None:
+            self.disk.close()
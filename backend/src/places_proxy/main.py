@@ -0,0 +1,230 @@
+"""
+Cached proxy for reverse geocoding, place search, weather and routing
+
+The tourist dashboard used to call Nominatim, Open-Meteo and OSRM directly
+from every browser on every position update. It now calls this service.
+Coordinates are quantized to geohash cells, so nearby lookups share one cache
+entry and upstream is asked about the cell centre. Results are served from a
+TieredCache (memory LRU over SQLite) with a TTL per kind of lookup.
+Concurrent identical lookups share one upstream call, made over a pooled
+keep-alive httpx client.
+
+Responses keep the upstream JSON shapes. The X-Cache header reports which
+tier answered.
+"""
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.middleware.cors import CORSMiddleware
+from typing import Any, Dict, Optional, Tuple
+from contextlib import asynccontextmanager
+from datetime import datetime
+import asyncio
+import logging
+import re
+import httpx
+from src.common.config import config
+from src.common.errors import UpstreamError, ValidationError
+from src.common.metrics import install_metrics, registry, span
+from src.common.profiler import install_profiler, start_profiling
+from src.common.utils import geohash
+from src.common.utils.logger import configure_logging, RequestIdMiddleware
+from src.common.wire import fast_json_response
+from src.places_proxy.cache import TieredCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = registry.counter(
+    'places_cache_lookups_total', 'Proxy lookups by kind and the cache tier that answered', ('kind', 'source')
+)
+UPSTREAM_REQUESTS = registry.counter(
+    'places_upstream_requests_total', 'Requests made to upstream providers', ('upstream', 'outcome')
+)
+
+_MODE = re.compile(r'^[a-z]{1,20}$')
+
+def _normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+class PlacesProxy:
+    """Cached lookups against Nominatim, Open-Meteo and OSRM"""
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        cache: TieredCache,
+        settings: Optional[Dict[str, Any]] = None
+    ):
+        self.client = client
+        self.cache = cache
+        self.settings = settings or config.get('services.places_proxy')
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _cell(self, kind: str, latitude: float, longitude: float) -> Tuple[str, float, float]:
+        """Geohash cell of a point at this kind's precision, and the cell centre"""
+        cell = geohash.encode(latitude, longitude, self.settings['precision'][kind])
+        return (cell, *geohash.center(cell))
+
+    async def _lookup(self, kind: str, key: str, fetch) -> Tuple[Any, str]:
+        value, source = await self.cache.get_or_fetch(f"{kind}:{key}", self.settings['ttl'][kind], fetch)
+        CACHE_LOOKUPS.labels(kind, source).inc()
+        return value, source
+
+    async def _get(self, upstream: str, path: str, params: Dict[str, Any]) -> Any:
+        limit = self._limits.get(upstream)
+        if limit is None:
+            limit = self._limits[upstream] = asyncio.Semaphore(self.settings['max_concurrency'])
+        url = self.settings['upstreams'][upstream].rstrip('/') + path
+        async with limit:
+            try:
+                with span(f"places.upstream.{upstream}"):
+                    response = await self.client.get(url, params=params)
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                UPSTREAM_REQUESTS.labels(upstream, str(e.response.status_code)).inc()
+                raise UpstreamError(
+                    f"{upstream} returned {e.response.status_code}",
+                    details={'status': e.response.status_code}
+                )
+            except httpx.HTTPError as e:
+                UPSTREAM_REQUESTS.labels(upstream, 'error').inc()
+                raise UpstreamError(f"{upstream} request failed: {e}")
+        try:
+            payload = response.json()
+        except ValueError:
+            # An HTML error page or maintenance notice served with 200
+            UPSTREAM_REQUESTS.labels(upstream, 'invalid').inc()
+            raise UpstreamError(
+                f"{upstream} returned a non-JSON body",
+                details={'status': response.status_code, 'content_type': response.headers.get('content-type')}
+            )
+        UPSTREAM_REQUESTS.labels(upstream, str(response.status_code)).inc()
+        return payload
+
+    async def reverse(self, latitude: float, longitude: float) -> Tuple[Any, str]:
+        cell, lat, lon = self._cell('reverse', latitude, longitude)
+        return await self._lookup('reverse', cell, lambda: self._get('nominatim', '/reverse', {
+            'format': 'json', 'lat': lat, 'lon': lon
+        }))
+
+    async def search(self, query: str, limit: int = 5) -> Tuple[Any, str]:
+        query = _normalize_query(query)
+        if not query:
+            raise ValidationError("Search query is empty")
+        return await self._lookup('search', f"{limit}:{query}", lambda: self._get('nominatim', '/search', {
+            'format': 'json', 'q': query, 'limit': limit, 'addressdetails': 1
+        }))
+
+    async def weather(self, latitude: float, longitude: float) -> Tuple[Any, str]:
+        cell, lat, lon = self._cell('weather', latitude, longitude)
+        return await self._lookup('weather', cell, lambda: self._get('open_meteo', '/v1/forecast', {
+            'latitude': lat, 'longitude': lon, 'current_weather': 'true', 'timezone': 'auto'
+        }))
+
+    async def route(
+        self,
+        mode: str,
+        origin: Tuple[float, float],
+        destination: Tuple[float, float]
+    ) -> Tuple[Any, str]:
+        if not _MODE.match(mode):
+            raise ValidationError(f"Invalid routing mode {mode!r}")
+        from_cell, from_lat, from_lon = self._cell('route', *origin)
+        to_cell, to_lat, to_lon = self._cell('route', *destination)
+        path = f"/route/v1/{mode}/{from_lon},{from_lat};{to_lon},{to_lat}"
+        return await self._lookup('route', f"{mode}:{from_cell}:{to_cell}", lambda: self._get('osrm', path, {
+            'overview': 'full', 'steps': 'true', 'annotations': 'true'
+        }))
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+        self.cache.close()
+
+def build_client(transport: Optional[httpx.AsyncBaseTransport] = None) -> httpx.AsyncClient:
+    """Pooled keep-alive client shared by every upstream"""
+    settings = config.get('services.places_proxy')
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(settings['timeout']),
+        limits=httpx.Limits(
+            max_connections=settings['max_connections'],
+            max_keepalive_connections=settings['max_connections'],
+            keepalive_expiry=60.0
+        ),
+        # Nominatim's usage policy requires an identifying User-Agent
+        headers={'User-Agent': settings['user_agent']}
+    )
+
+proxy: Optional[PlacesProxy] = None
+
+def load_proxy() -> PlacesProxy:
+    global proxy
+    if proxy is None:
+        settings = config.get('services.places_proxy')
+        proxy = PlacesProxy(
+            build_client(),
+            TieredCache(settings['memory_size'], settings['cache_path'] or None),
+            settings
+        )
+    return proxy
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global proxy
+    configure_logging(service="places_proxy")
+    start_profiling()
+    load_proxy()
+    yield
+    await proxy.aclose()
+    proxy = None
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=config.get('services.places_proxy.cors_origins', []),
+    allow_methods=['GET'],
+    expose_headers=['X-Cache']
+)
+install_metrics(app)
+install_profiler(app)
+
+async def _respond(lookup):
+    try:
+        value, source = await lookup
+        response = fast_json_response(value)
+        response.headers['X-Cache'] = source
+        return response
+    except ValidationError as e:
+        logger.error("Validation error in places proxy: %s", e)
+        raise HTTPException(status_code=422, detail=e.message)
+    except UpstreamError as e:
+        logger.error("Upstream error in places proxy: %s", e)
+        raise HTTPException(status_code=502, detail=e.message)
+    except Exception as e:
+        logger.error("Places proxy error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/reverse")
+async def reverse_geocode(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    return await _respond(load_proxy().reverse(lat, lon))
+
+@app.get("/search")
+async def search_places(q: str = Query(..., max_length=256), limit: int = Query(5, ge=1, le=20)):
+    return await _respond(load_proxy().search(q, limit))
+
+@app.get("/weather")
+async def current_weather(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180)):
+    return await _respond(load_proxy().weather(lat, lon))
+
+@app.get("/route/{mode}")
+async def route(
+    mode: str,
+    from_lat: float = Query(..., ge=-90, le=90),
+    from_lon: float = Query(..., ge=-180, le=180),
+    to_lat: float = Query(..., ge=-90, le=90),
+    to_lon: float = Query(..., ge=-180, le=180)
+):
+    return await _respond(load_proxy().route(mode, (from_lat, from_lon), (to_lat, to_lon)))
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "timestamp": datetime.now()}
@@ -7,16 +7,30 @@ import sys
 import asyncio
 from datetime import datetime, timezone
 
-# Add src directory to Python path
+# Add the backend directory to Python path so tests can import src.*
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import your FastAPI applications
-from ai_engine.main import app as ai_app
-from geo_service.main import app as geo_app
-from alert_system.main import app as alert_app
+from src.ai_engine import main as ai_engine
+from src.ai_engine.main import app as ai_app
+from src.ai_engine.regions import RegionModelStore
+from src.geo_service.main import app as geo_app
+from src.alert_system.main import app as alert_app
+from src.loadgen import standins
 
 @pytest.fixture
-def ai_client() -> Generator:
+def memory_databases() -> Generator:
+    """In-memory MongoDB and PostgreSQL behind DatabaseConnection"""
+    with standins.install() as databases:
+        yield databases
+
+@pytest.fixture
+def ai_client(memory_databases, tmp_path, monkeypatch) -> Generator:
+    # Train into a scratch directory rather than over the checked-in model
+    monkeypatch.setattr(ai_engine, "detector", ai_engine.AnomalyDetector(
+        model_path=str(tmp_path / "anomaly_detector.joblib"),
+        regions=RegionModelStore(str(tmp_path / "regions"))
+    ))
     with TestClient(ai_app) as client:
         yield client
 
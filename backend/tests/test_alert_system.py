@@ -0,0 +1,27 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.alert_system import main as alert_system
+
+@pytest.fixture
+def instant_alerts(monkeypatch):
+    """Fresh alert state without the simulated notification delays"""
+    async def no_wait(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(alert_system.service, "alerts", [])
+    monkeypatch.setattr(alert_system.service, "emergency_contacts", {})
+    monkeypatch.setattr(alert_system.service, "notify_police_units", no_wait)
+    monkeypatch.setattr(alert_system.service, "notify_emergency_contacts", no_wait)
+
+def test_alert_lifecycle(alert_client: TestClient, instant_alerts, test_alert_data):
+    """Test a created alert is processed and listed for its user"""
+    contact = {"user_id": "test_user_1", "name": "Asha", "phone": "+919000000000", "relationship": "sister"}
+    assert alert_client.post("/emergency-contact", json=contact).status_code == 200
+
+    response = alert_client.post("/alert", json=test_alert_data)
+    assert response.status_code == 200 and response.json()["alert_id"] == test_alert_data["id"]
+
+    alerts = alert_client.get("/alerts/test_user_1").json()["alerts"]
+    assert [(a["id"], a["status"]) for a in alerts] == [(test_alert_data["id"], "resolved")]
+    assert alert_client.get("/alerts/someone_else").json()["alerts"] == []
@@ -0,0 +1,69 @@
+import time
+
+import jwt
+import pytest
+
+from src.common.auth import TokenVerifier
+
+SECRET = "test-secret-key-with-at-least-32-bytes!"
+
+@pytest.fixture
+def verifier() -> TokenVerifier:
+    return TokenVerifier(secret=SECRET, cache_size=2, cache_ttl=300)
+
+def test_generate_and_verify(verifier: TokenVerifier):
+    """Test a generated token round-trips and repeat verifications hit the cache"""
+    token = verifier.generate({"sub": "test_user_1"}, expires_in=60)
+    claims = verifier.verify(token)
+    assert claims["sub"] == "test_user_1"
+    assert claims["exp"] > time.time()
+
+    assert verifier.verify(token) == claims
+    assert verifier.hits == 1
+    assert verifier.misses == 1
+
+def test_verify_rejects_bad_tokens(verifier: TokenVerifier):
+    """Test tampered, foreign and expired tokens are rejected"""
+    token = verifier.generate({"sub": "test_user_1"}, expires_in=60)
+    assert verifier.verify(token[:-2] + "xx") is None
+    assert verifier.verify(jwt.encode({"sub": "x"}, "another-secret-key-that-is-long-enough", algorithm="HS256")) is None
+    assert verifier.verify(verifier.generate({"sub": "test_user_1"}, expires_in=-1)) is None
+
+def test_cache_entry_never_outlives_exp(verifier: TokenVerifier):
+    """Test a cached token stops verifying once its exp passes"""
+    token = jwt.encode({"sub": "test_user_1", "exp": int(time.time()) + 1}, SECRET, algorithm="HS256")
+    assert verifier.verify(token) is not None
+    time.sleep(1.1)
+    assert verifier.verify(token) is None
+
+def test_cache_is_bounded(verifier: TokenVerifier):
+    """Test the LRU evicts the least recently used token"""
+    tokens = [verifier.generate({"sub": f"user_{i}"}, expires_in=60) for i in range(3)]
+    for token in tokens:
+        verifier.verify(token)
+    assert len(verifier._cache) == 2
+    verifier.verify(tokens[0])
+    assert verifier.misses == 4
+
+def test_revocation(verifier: TokenVerifier):
+    """Test revoke, revoke_jti and revocation hooks"""
+    token = verifier.generate({"sub": "test_user_1"}, expires_in=60)
+    assert verifier.verify(token) is not None
+    verifier.revoke(token)
+    assert verifier.verify(token) is None
+
+    jti_token = verifier.generate({"sub": "test_user_2", "jti": "abc"}, expires_in=60)
+    assert verifier.verify(jti_token) is not None
+    verifier.revoke_jti("abc")
+    assert verifier.verify(jti_token) is None
+
+    banned = verifier.generate({"sub": "banned"}, expires_in=60)
+    verifier.add_revocation_hook(lambda claims: claims.get("sub") == "banned")
+    assert verifier.verify(banned) is None
+
+def test_revoke_racing_verify_is_not_cached(verifier: TokenVerifier):
+    """Test a token revoked after the revocation checks but before caching is rejected"""
+    token = verifier.generate({"sub": "test_user_1"}, expires_in=60)
+    verifier.add_revocation_hook(lambda claims: verifier.revoke(token) or False)
+    assert verifier.verify(token) is None
+    assert len(verifier._cache) == 0
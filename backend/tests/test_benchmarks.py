@@ -0,0 +1,47 @@
+import pytest
+
+from benchmarks.harness import compare, measure, run_coroutine, scaling
+
+def _results(medians, threshold=None):
+    return {"benchmarks": {
+        "bench.x": {
+            "threshold": threshold,
+            "sizes": {str(n): {"median": t, "min": t} for n, t in medians.items()}
+        }
+    }}
+
+def test_scaling_classifies_complexity():
+    """Test the fitted exponent, labels and knee of synthetic curves"""
+    sizes = [1, 10, 100, 1000, 10000]
+    assert scaling(sizes, [5e-6] * 5)["complexity"] == "O(1)"
+    assert scaling(sizes, [n * 1e-7 for n in sizes])["complexity"] == "O(n)"
+    assert scaling(sizes, [n * n * 1e-9 for n in sizes])["complexity"] == "O(n^2)"
+
+    # Fixed 10 us overhead plus 10 ns per item: flat until the per-item work dominates
+    curve = scaling(sizes, [1e-5 + n * 1e-8 for n in sizes])
+    assert curve["knee"] == 10000
+    assert curve["local_slopes"][0] == pytest.approx(0.0, abs=0.01)
+    assert curve["per_item"][-1] == pytest.approx(1.1e-8)
+    assert scaling([1], [1e-6]) is None
+
+def test_compare_flags_regressions_past_threshold():
+    """Test slowdowns beyond the threshold are flagged, per-benchmark overrides win"""
+    baseline = _results({1: 1.0, 10: 1.0, 100: 1.0})
+    rows = compare(baseline, _results({1: 1.05, 10: 1.2, 1000: 9.0}), threshold=0.1)
+    assert [(r["size"], r["regressed"]) for r in rows] == [(1, False), (10, True)]
+    assert rows[1]["ratio"] == pytest.approx(1.2)
+
+    rows = compare(baseline, _results({10: 1.2}, threshold=0.5), threshold=0.1)
+    assert not rows[0]["regressed"]
+    assert compare({"benchmarks": {}}, _results({1: 1.0})) == []
+
+def test_measure_and_run_coroutine():
+    """Test timing statistics are consistent and synchronous coroutines complete"""
+    stats = measure(lambda: sum(range(100)), rounds=3, min_time=0.001)
+    assert stats["rounds"] == 3 and stats["loops"] >= 1
+    assert 0 < stats["min"] <= stats["median"] <= max(stats["mean"], stats["median"])
+
+    async def answer():
+        return 42
+
+    assert run_coroutine(answer()) == 42
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from src.ai_engine.drift import DEFAULT_THRESHOLD, DriftMonitor, ScoreSketch
+from src.ai_engine.main import AnomalyDetector, LocationData
+from src.ai_engine.regions import RegionIndex, RegionModelStore
+from src.common.wire import PingColumns
+
+def _records(n, lat=12.97, lon=77.59, speed=5.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "user_id": f"user_{i}",
+            "latitude": float(a),
+            "longitude": float(o),
+            "timestamp": "2025-08-30T00:00:00Z",
+            "speed": float(s),
+            "accuracy": 10.0
+        }
+        for i, (a, o, s) in enumerate(zip(
+            rng.normal(lat, 0.01, n), rng.normal(lon, 0.01, n), rng.gamma(2.0, speed / 2, n)
+        ))
+    ]
+
+def _pings(n, **kwargs):
+    return PingColumns.from_records(_records(n, **kwargs))
+
+@pytest.fixture
+def detector(tmp_path):
+    monitor = DriftMonitor(target_rate=0.05, min_samples=200, limit=0.2, buffer_size=600, cooldown=0)
+    return AnomalyDetector(
+        model_path=str(tmp_path / "global.joblib"),
+        regions=RegionModelStore(str(tmp_path / "regions"), RegionIndex(precision=3)),
+        drift=monitor
+    )
+
+def _fit(detector, columns):
+    features = detector._extract_column_features(columns)
+    detector.model.fit(features)
+    detector.drift.calibrate(None, detector.model.score_samples(features))
+
+def test_sketch_quantiles_and_distance():
+    """Test sketch quantiles stay within a bin of the exact ones and KS distance tracks shifts"""
+    rng = np.random.default_rng(0)
+    scores = np.clip(rng.normal(-0.45, 0.06, 20000), -1, 0)
+    sketch = ScoreSketch(256)
+    for chunk in np.array_split(scores, 7):
+        sketch.add(chunk)
+    assert sketch.count == len(scores)
+    for q in (0.01, 0.05, 0.5, 0.95):
+        assert sketch.quantile(q) == pytest.approx(np.quantile(scores, q), abs=1 / 256)
+    assert sketch.fraction_below(sketch.quantile(0.05)) == pytest.approx(0.05, abs=0.005)
+
+    same = ScoreSketch.of(np.clip(rng.normal(-0.45, 0.06, 20000), -1, 0))
+    shifted = ScoreSketch.of(np.clip(rng.normal(-0.55, 0.06, 20000), -1, 0))
+    assert sketch.distance(same) < 0.03 < 0.5 < sketch.distance(shifted)
+
+def test_threshold_is_calibrated_to_target_rate(detector):
+    """Test training sets per-model thresholds that flag about the target share of similar pings"""
+    detector.train([LocationData(**r) for r in _records(2000)])
+    region = detector.regions.available()[0]
+    calibrated = {m["region"]: m["threshold"] for m in detector.drift.status()}
+    assert set(calibrated) == {None, region} and None not in calibrated.values()
+
+    scored = detector.detect_batch(_pings(4000, seed=1))
+    assert set(scored["region"]) == {region}
+    assert np.all(scored["threshold"] == detector.drift.threshold(region))
+    assert scored["is_anomaly"].mean() == pytest.approx(0.05, abs=0.015)
+    assert detector.drift.drift(None) is None
+    assert detector.drift.drift(region) < detector.drift.limit
+    assert detector.refresh_drifted() == []
+
+def test_loaded_model_calibrates_from_live_scores(detector, tmp_path):
+    """Test a model without a reference uses the default threshold until enough live scores arrive"""
+    detector.model.fit(detector._extract_column_features(_pings(1000)))
+    assert detector.drift.threshold(None) == DEFAULT_THRESHOLD
+
+    detector.detect_batch(_pings(150, seed=1))
+    assert detector.drift.status()[0]["threshold"] is None
+    scored = detector.detect_batch(_pings(150, seed=2))
+    status = detector.drift.status()[0]
+    assert status["reference_samples"] == 300 and status["threshold"] is not None
+    assert np.all(scored["threshold"] == status["threshold"])
+
+def test_drift_triggers_refresh_on_recent_unflagged_pings(detector):
+    """Test a shifted score distribution refits the model on recent pings that were not flagged"""
+    _fit(detector, _pings(2000))
+    old_model = detector.model
+
+    # Tourists drift north and move faster than the model was trained on
+    shifted = _pings(1000, lat=12.985, speed=8.0, seed=3)
+    before = detector.detect_batch(shifted)
+    flagged = before["is_anomaly"]
+    assert 0.2 < flagged.mean() < 0.5
+    assert detector.drift.drift(None) > detector.drift.limit
+
+    recent = detector.drift.recent(None)
+    np.testing.assert_array_equal(recent, detector._extract_column_features(shifted)[~flagged][-600:])
+
+    assert detector.refresh_drifted() == [None]
+    assert detector.model is not old_model
+    after = detector.detect_batch(_pings(2000, lat=12.985, speed=8.0, seed=4))
+    assert after["is_anomaly"].mean() < flagged.mean()
+    assert detector.drift.status()[0]["refreshes"] == 1
+
+def test_anomalies_are_not_buffered_for_refresh(detector):
+    """Test a burst of flagged pings drifts the scores but is never refit on"""
+    _fit(detector, _pings(2000))
+    detector.detect_batch(_pings(300, seed=1))
+    buffered = detector.drift.recent(None)
+
+    burst = detector.detect_batch(_pings(300, lat=13.2, lon=77.9, speed=60.0, seed=2))
+    assert burst["is_anomaly"].all()
+    assert detector.drift.drift(None) > detector.drift.limit
+    np.testing.assert_array_equal(detector.drift.recent(None), buffered)
+
+def test_drift_endpoint(ai_client, test_location_data):
+    """Test /drift reports per-model thresholds after detections"""
+    from src.ai_engine import main as ai_engine
+
+    ai_engine.detector.drift.min_samples = 5
+    _fit(ai_engine.detector, _pings(500))
+    for _ in range(6):
+        assert ai_client.post("/detect", json=test_location_data).status_code == 200
+
+    body = ai_client.get("/drift").json()
+    assert body["target_rate"] == ai_engine.detector.drift.target_rate
+    (model,) = body["models"]
+    assert model["region"] is None and model["live_samples"] == 6
+    assert model["threshold"] == ai_engine.detector.drift.threshold(None)
+    assert model["drift"] is not None and set(model["live_quantiles"]) == {"0.01", "0.1", "0.5", "0.9"}
@@ -0,0 +1,49 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.geo_service import main as geo_service
+
+@pytest.fixture(autouse=True)
+def no_fences(monkeypatch):
+    monkeypatch.setattr(geo_service.service, "fences", [])
+
+def _square(lat, lon, size=0.01):
+    return [[lat, lon], [lat, lon + size], [lat + size, lon + size], [lat + size, lon], [lat, lon]]
+
+def test_fence_lifecycle_and_check(geo_client: TestClient, test_geofence_data, test_location_data):
+    """Test a location is reported inside a fence until the fence is removed"""
+    fence = dict(test_geofence_data, coordinates=_square(12.97, 77.59))
+    response = geo_client.post("/fence", json=fence)
+    assert response.status_code == 200 and response.json()["fence_id"] == fence["id"]
+
+    response = geo_client.post("/check", json=test_location_data)
+    assert response.status_code == 200
+    assert response.json()["in_fences"] == [
+        {"fence_id": fence["id"], "name": fence["name"], "risk_level": fence["risk_level"]}
+    ]
+
+    outside = dict(test_location_data, latitude=13.5)
+    assert geo_client.post("/check", json=outside).json()["in_fences"] == []
+
+    assert geo_client.delete(f"/fence/{fence['id']}").status_code == 200
+    assert geo_client.post("/check", json=test_location_data).json()["in_fences"] == []
+
+def test_check_batch(geo_client: TestClient, test_geofence_data, test_location_data):
+    """Test an NDJSON batch is checked against every fence"""
+    geo_client.post("/fence", json=dict(test_geofence_data, coordinates=_square(12.97, 77.59)))
+    lines = [
+        '{{"user_id": "u{}", "latitude": {}, "longitude": 77.5946, "timestamp": "{}"}}'.format(
+            i, lat, test_location_data["timestamp"]
+        )
+        for i, lat in enumerate((12.9716, 13.5))
+    ]
+    response = geo_client.post(
+        "/check/batch", content="\n".join(lines), headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 2
+    assert [len(fences) for fences in body["in_fences"]] == [1, 0]
+
+    response = geo_client.post("/check/batch", content="not json", headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 422
@@ -0,0 +1,81 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from src.common.utils import geodesy
+from src.common.utils.helpers import calculate_distance, calculate_speed
+
+# Reference distances (km) on a 6371 km sphere
+KNOWN_DISTANCES = [
+    # (lat1, lon1, lat2, lon2, km)
+    (12.9716, 77.5946, 13.0827, 80.2707, 290.2),     # Bengaluru -> Chennai
+    (51.5074, -0.1278, 48.8566, 2.3522, 343.6),      # London -> Paris
+    (40.7128, -74.0060, 34.0522, -118.2437, 3935.7), # New York -> Los Angeles
+    (0.0, 0.0, 0.0, 180.0, math.pi * 6371.0),        # Antipodal on the equator
+]
+
+def _scalar_haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+@pytest.mark.parametrize("lat1,lon1,lat2,lon2,expected", KNOWN_DISTANCES)
+def test_haversine_known_distances(lat1, lon1, lat2, lon2, expected):
+    """Test haversine against reference city distances"""
+    assert geodesy.haversine(lat1, lon1, lat2, lon2) == pytest.approx(expected, rel=1e-3)
+    assert calculate_distance(lat1, lon1, lat2, lon2) == pytest.approx(expected, rel=1e-3)
+
+def test_haversine_matches_scalar_reference():
+    """Test batched haversine agrees with the scalar formula"""
+    rng = np.random.default_rng(0)
+    lat1, lat2 = rng.uniform(-90, 90, (2, 1000))
+    lon1, lon2 = rng.uniform(-180, 180, (2, 1000))
+    batched = geodesy.haversine(lat1, lon1, lat2, lon2)
+    expected = [_scalar_haversine(*row) for row in zip(lat1, lon1, lat2, lon2)]
+    np.testing.assert_allclose(batched, expected, rtol=1e-9, atol=1e-9)
+
+def test_pairwise_distances_chunking_is_exact():
+    """Test chunked distance matrix matches a single-shot broadcast"""
+    rng = np.random.default_rng(1)
+    lats_a, lons_a = rng.uniform(-60, 60, 37), rng.uniform(-180, 180, 37)
+    lats_b, lons_b = rng.uniform(-60, 60, 23), rng.uniform(-180, 180, 23)
+    expected = geodesy.haversine(lats_a[:, None], lons_a[:, None], lats_b[None, :], lons_b[None, :])
+    chunked = geodesy.pairwise_distances(lats_a, lons_a, lats_b, lons_b, chunk_cells=50)
+    assert chunked.shape == (37, 23)
+    np.testing.assert_allclose(chunked, expected, rtol=1e-12)
+
+def test_pairwise_distances_self_is_symmetric():
+    """Test self distance matrix is symmetric with a zero diagonal"""
+    rng = np.random.default_rng(2)
+    lats, lons = rng.uniform(-60, 60, 15), rng.uniform(-180, 180, 15)
+    matrix = geodesy.pairwise_distances(lats, lons)
+    np.testing.assert_allclose(matrix, matrix.T, atol=1e-9)
+    np.testing.assert_allclose(np.diag(matrix), 0, atol=1e-9)
+
+def test_trajectory_speeds():
+    """Test consecutive speeds, including a zero-duration segment"""
+    start = datetime(2025, 8, 30, tzinfo=timezone.utc)
+    times = [start, start + timedelta(hours=1), start + timedelta(hours=1)]
+    lats, lons = [0.0, 0.0, 0.0], [0.0, 1.0, 2.0]
+    speeds = geodesy.trajectory_speeds(lats, lons, times)
+    one_degree = 2 * math.pi * 6371.0 / 360
+    np.testing.assert_allclose(speeds, [one_degree, 0.0], rtol=1e-9)
+
+    epoch = [t.timestamp() for t in times]
+    np.testing.assert_allclose(geodesy.trajectory_speeds(lats, lons, epoch), speeds)
+    assert calculate_speed(0.0, 0.0, 0.0, 1.0, times[0], times[1]) == pytest.approx(one_degree)
+    assert calculate_speed(0.0, 0.0, 0.0, 1.0, times[1], times[1]) == 0
+
+def test_bearing_cardinal_directions():
+    """Test bearings for due north, east, south and west"""
+    bearings = geodesy.bearing(0, 0, [1, 0, -1, 0], [0, 1, 0, -1])
+    np.testing.assert_allclose(bearings, [0, 90, 180, 270], atol=1e-9)
+    np.testing.assert_allclose(geodesy.trajectory_bearings([0, 1, 1], [0, 0, 1]), [0, 89.99127], atol=1e-4)
+
+def test_nearest():
+    """Test nearest candidate lookup"""
+    idx, distance = geodesy.nearest(12.97, 77.59, [13.08, 12.98, 28.6], [80.27, 77.6, 77.2])
+    assert idx == 1
+    assert distance < 2
@@ -0,0 +1,205 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pymongo
+import pytest
+from fastapi.testclient import TestClient
+
+from src.ai_engine import main as ai_engine
+from src.ai_engine.heatmap import TileAggregator
+
+class _Cursor:
+    def __init__(self, documents):
+        self._documents = iter(documents)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._documents)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class _FakeTiles:
+    """Applies the upserts TileAggregator.flush issues and answers tile queries"""
+
+    def __init__(self):
+        self.documents = {}
+        self.fail = False
+        self.fail_indexes = set()
+        self.block = None
+
+    async def bulk_write(self, operations, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo unavailable")
+        if self.block is not None:
+            await self.block.wait()
+        errors = []
+        for index, op in enumerate(operations):
+            if index in self.fail_indexes:
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+                continue
+            update = op._doc
+            doc = self.documents.setdefault(op._filter['_id'], dict(update['$setOnInsert']))
+            for field, amount in update['$inc'].items():
+                doc[field] = doc.get(field, 0) + amount
+            for field, value in update['$min'].items():
+                doc[field] = min(doc.get(field, value), value)
+            for field, value in update['$max'].items():
+                doc[field] = max(doc.get(field, value), value)
+        if errors:
+            raise pymongo.errors.BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+    def find(self, query, projection=None):
+        bucket = query['bucket']
+        return _Cursor([
+            dict(doc) for doc in self.documents.values()
+            if doc['tile'] == query['tile'] and bucket['$gte'] <= doc['bucket'] < bucket['$lt']
+        ])
+
+class _FakeDatabase:
+    def __init__(self):
+        self.anomaly_tiles = _FakeTiles()
+
+def _detections(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 8, 30, tzinfo=timezone.utc).timestamp()
+    return (
+        rng.uniform(12.9, 13.0, n),
+        rng.uniform(77.55, 77.65, n),
+        start + rng.uniform(0, 3 * 3600, n),
+        rng.uniform(-0.7, -0.3, n),
+        rng.random(n) < 0.2
+    )
+
+def _tile_of(lat, lon, z):
+    n = 1 << z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2.0 * n)
+    return x, y
+
+def test_add_and_add_batch_agree():
+    """Test the scalar and vectorized paths produce identical pending cells"""
+    lats, lons, times, scores, flags = _detections()
+    scalar, batch = TileAggregator(zooms=(8, 12)), TileAggregator(zooms=(8, 12))
+    for lat, lon, ts, score, flag in zip(lats, lons, times, scores, flags):
+        scalar.add(lat, lon, datetime.fromtimestamp(ts, timezone.utc), score, flag)
+    batch.add_batch(lats, lons, times, scores, flags)
+
+    assert scalar._pending.keys() == batch._pending.keys()
+    for key, stats in scalar._pending.items():
+        np.testing.assert_allclose(stats, batch._pending[key])
+    # Every zoom level sees every detection exactly once
+    for z in (8, 12):
+        assert sum(s[0] for k, s in batch._pending.items() if k[0] == z) == len(lats)
+
+def test_flush_and_read_tile():
+    """Test flushed cells are summed per cell over the requested buckets"""
+    lats, lons, times, scores, flags = _detections()
+    aggregator = TileAggregator(zooms=(10,), bucket_seconds=3600)
+    db = _FakeDatabase()
+
+    async def run():
+        aggregator.add_batch(lats[:100], lons[:100], times[:100], scores[:100], flags[:100])
+        assert await aggregator.flush(db) > 0
+        aggregator.add_batch(lats[100:], lons[100:], times[100:], scores[100:], flags[100:])
+        await aggregator.flush(db)
+
+    asyncio.run(run())
+    assert aggregator.pending() == 0
+
+    tiles = {doc['tile'] for doc in db.anomaly_tiles.documents.values()}
+    start = datetime(2025, 8, 30, tzinfo=timezone.utc)
+    total = 0
+    for key in tiles:
+        z, x, y = (int(v) for v in key.split('/'))
+        tile = asyncio.run(aggregator.read_tile(db, z, x, y, start, start + timedelta(hours=3)))
+        assert len({(c['x'], c['y']) for c in tile['cells']}) == len(tile['cells'])
+        total += sum(c['count'] for c in tile['cells'])
+    assert total == len(lats)
+
+    # Only the first hour's bucket
+    first_hour = sum(
+        c['count']
+        for key in tiles
+        for c in asyncio.run(aggregator.read_tile(
+            db, *(int(v) for v in key.split('/')), start, start + timedelta(hours=1)
+        ))['cells']
+    )
+    assert first_hour == int(np.sum(times < start.timestamp() + 3600))
+
+def test_partially_failed_flush_retries_only_failed_cells():
+    """Test cells applied by a partly failed bulk write are not counted again"""
+    aggregator = TileAggregator(zooms=(10,))
+    db = _FakeDatabase()
+    when = datetime(2025, 8, 30, tzinfo=timezone.utc)
+    aggregator.add(12.97, 77.59, when, -0.4, False)
+    aggregator.add(28.61, 77.21, when, -0.5, False)
+    db.anomaly_tiles.fail_indexes = {1}
+    assert asyncio.run(aggregator.flush(db)) == 1
+    assert aggregator.pending() == 1
+
+    db.anomaly_tiles.fail_indexes = set()
+    assert asyncio.run(aggregator.flush(db)) == 1
+    assert sorted(doc['count'] for doc in db.anomaly_tiles.documents.values()) == [1, 1]
+
+def test_cancelled_flush_keeps_pending():
+    """Test cells swapped out by a flush that is cancelled are kept for the next one"""
+    aggregator = TileAggregator(zooms=(10,))
+    db = _FakeDatabase()
+    db.anomaly_tiles.block = asyncio.Event()
+    aggregator.add(12.97, 77.59, datetime(2025, 8, 30, tzinfo=timezone.utc), -0.4, False)
+
+    async def run():
+        task = asyncio.create_task(aggregator.flush(db))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert aggregator.pending() == 1
+
+def test_failed_flush_keeps_pending():
+    """Test cells are retried after a failed bulk write"""
+    aggregator = TileAggregator(zooms=(10,))
+    db = _FakeDatabase()
+    db.anomaly_tiles.fail = True
+    aggregator.add(12.97, 77.59, datetime(2025, 8, 30, tzinfo=timezone.utc), -0.4, False)
+    assert asyncio.run(aggregator.flush(db)) == 0
+    assert aggregator.pending() == 1
+
+    db.anomaly_tiles.fail = False
+    aggregator.add(12.97, 77.59, datetime(2025, 8, 30, tzinfo=timezone.utc), -0.6, True)
+    assert asyncio.run(aggregator.flush(db)) == 1
+    (doc,) = db.anomaly_tiles.documents.values()
+    assert doc['count'] == 2 and doc['anomalies'] == 1
+    assert doc['score_min'] == -0.6 and doc['score_max'] == -0.4
+
+def test_heatmap_endpoint(monkeypatch):
+    """Test the tile endpoint serves flushed cells and rejects unsupported zooms"""
+    db = _FakeDatabase()
+    monkeypatch.setattr(ai_engine, "get_mongo_database", lambda: db)
+    aggregator = TileAggregator(zooms=(10,))
+    monkeypatch.setattr(ai_engine, "tiles", aggregator)
+    now = datetime.now(timezone.utc)
+    aggregator.add(12.97, 77.59, now, -0.4, False)
+    aggregator.add(12.97, 77.59, now, -0.6, True)
+    asyncio.run(aggregator.flush(db))
+    x, y = _tile_of(12.97, 77.59, 10)
+
+    with TestClient(ai_engine.app) as client:
+        response = client.get(f"/heatmap/10/{x}/{y}")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["grid"] == aggregator.grid
+        (cell,) = body["cells"]
+        assert cell["count"] == 2 and cell["anomalies"] == 1
+        assert cell["mean_score"] == pytest.approx(-0.5)
+
+        assert client.get(f"/heatmap/11/{x}/{y}").status_code == 422
+        assert client.get(f"/heatmap/10/{x}/{y}?start=yesterday").status_code == 422
+        old = client.get(f"/heatmap/10/{x}/{y}", params={"end": "2020-01-01T00:00:00Z"})
+        assert old.json()["cells"] == []
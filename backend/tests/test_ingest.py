@@ -0,0 +1,129 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.ai_engine import main as ai_engine
+from src.ai_engine.main import AnomalyDetector, LocationData
+from src.alert_system.main import AlertService
+from src.geo_service.main import GeoFence, GeoFenceService
+from src.ingest.main import PingPipeline, app as ingest_app
+
+class _FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    async def insert_one(self, document):
+        self.documents.append(document)
+
+    async def bulk_write(self, operations, ordered=True):
+        self.documents.extend(operations)
+
+class _FakeDatabase:
+    def __init__(self):
+        self.anomaly_detections = _FakeCollection()
+        self.anomaly_tiles = _FakeCollection()
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = _FakeDatabase()
+    monkeypatch.setattr(ai_engine, "get_mongo_database", lambda: db)
+    # Store every ping so tests can count them
+    monkeypatch.setattr(ai_engine, "trajectories", None)
+    return db
+
+@pytest.fixture
+def pipeline(test_location_data):
+    detector = AnomalyDetector(model_path="/nonexistent/model.joblib")
+    rng = np.random.default_rng(0)
+    training = [
+        LocationData(**dict(test_location_data, latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(12.85, 13.05, 300), rng.uniform(77.5, 77.7, 300))
+    ]
+    detector.model.fit(detector._extract_features(training))
+
+    fences = GeoFenceService()
+    fences.add_fence(GeoFence(
+        id="market", name="Night Market", risk_level="high",
+        coordinates=[[12.95, 77.58], [12.95, 77.60], [12.99, 77.60], [12.99, 77.58], [12.95, 77.58]]
+    ))
+    return PingPipeline(detector, fences, AlertService())
+
+def _ping(test_location_data, **overrides):
+    return LocationData(**dict(test_location_data, **overrides))
+
+def test_pipeline_fence_transitions_raise_alerts(pipeline, fake_db, test_location_data):
+    """Test entering a risky fence alerts once and exiting is reported"""
+    async def run():
+        outside = await pipeline.process(_ping(test_location_data, latitude=12.90))
+        entered = await pipeline.process(_ping(test_location_data))
+        inside = await pipeline.process(_ping(test_location_data))
+        left = await pipeline.process(_ping(test_location_data, latitude=12.90))
+        return outside, entered, inside, left
+
+    outside, entered, inside, left = asyncio.run(run())
+    assert outside.in_fences == [] and outside.entered == []
+    assert [f.id for f in entered.entered] == ["market"]
+    assert [a.alert_type for a in entered.alerts] == ["geofence"]
+    assert entered.alerts[0].severity == "high"
+    assert inside.entered == [] and not [a for a in inside.alerts if a.alert_type == "geofence"]
+    assert left.exited == ["market"]
+    assert len(fake_db.anomaly_detections.documents) == 4
+    assert pipeline._user_fences == {}
+
+def test_pipeline_fence_state_is_bounded(pipeline, fake_db, test_location_data):
+    """Test only users inside a fence are tracked, least recently pinged evicted first"""
+    pipeline.max_users = 2
+    inside = pipeline.fences.fences
+    for user_id in ("u1", "u2", "u3"):
+        pipeline._transitions(user_id, inside)
+    pipeline._transitions("u4", [])
+    assert list(pipeline._user_fences) == ["u2", "u3"]
+    entered, _ = pipeline._transitions("u1", inside)
+    assert [f.id for f in entered] == ["market"]
+
+def test_pipeline_raises_anomaly_alert(pipeline, fake_db, test_location_data):
+    """Test a ping far from the training distribution creates an anomaly alert"""
+    outcome = asyncio.run(pipeline.process(
+        _ping(test_location_data, latitude=-45.0, longitude=-120.0, speed=300.0, accuracy=500.0)
+    ))
+    assert outcome.anomaly["is_anomaly"]
+    assert [a.alert_type for a in outcome.alerts] == ["anomaly"]
+    assert pipeline.alerts.alerts == outcome.alerts
+
+def test_pipeline_anomaly_alerts_have_a_cooldown(pipeline, fake_db, test_location_data):
+    """Test a user who stays anomalous is alerted once per cooldown, other users independently"""
+    pipeline.alert_cooldown = 600
+
+    def anomalous(user_id, minute):
+        return _ping(
+            test_location_data, user_id=user_id, timestamp=f"2025-08-30T00:{minute:02d}:00Z",
+            latitude=-45.0, longitude=-120.0, speed=300.0, accuracy=500.0
+        )
+
+    async def run():
+        return [
+            await pipeline.process(anomalous(user_id, minute))
+            for user_id, minute in (("u1", 0), ("u1", 1), ("u2", 2), ("u1", 9), ("u1", 10), ("u1", 11))
+        ]
+
+    outcomes = asyncio.run(run())
+    assert all(o.anomaly["is_anomaly"] for o in outcomes)
+    assert [len(o.alerts) for o in outcomes] == [1, 0, 1, 0, 1, 0]
+
+def test_ping_endpoint(fake_db, test_location_data, test_geofence_data):
+    """Test /ping runs detection and fence checks in one request"""
+    with TestClient(ingest_app) as client:
+        assert client.post("/geo/fence", json=test_geofence_data).status_code == 200
+        try:
+            response = client.post("/ping", json=test_location_data)
+            assert response.status_code == 200
+            body = response.json()
+            assert set(body) == {"anomaly", "in_fences", "entered", "exited", "alerts"}
+            assert "anomaly_score" in body["anomaly"]["details"]
+            assert len(fake_db.anomaly_detections.documents) == 1
+
+            assert client.post("/ping", json=dict(test_location_data, latitude=100)).status_code == 422
+        finally:
+            client.delete(f"/geo/fence/{test_geofence_data['id']}")
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import numpy as np
+import pymongo
+import pytest
+from shapely.geometry import Point, Polygon
+
+from src.ai_engine import main as ai_engine
+from src.ai_engine.regions import RegionModelStore
+from src.common.database.connection import get_mongo_database, get_postgres_connection
+from src.common.utils.geodesy import haversine
+from src.loadgen import standins
+from src.loadgen.driver import AsgiTarget, build_requests, run_scenario
+from src.loadgen.report import build_report
+from src.loadgen.trajectories import Scenario
+
+def _tracks(scenario, behaviour):
+    for i, name in enumerate(scenario.behaviours):
+        if name == behaviour:
+            yield [e for e in scenario.tourist_events(i) if e.kind == 'ping'], scenario.tourist_events(i)
+
+def test_scenario_is_reproducible():
+    """Test a seed fixes every fence, ping and alert"""
+    first, second = Scenario(tourists=30, duration=300, seed=7), Scenario(tourists=30, duration=300, seed=7)
+    assert first.fences() == second.fences()
+    assert first.events() == second.events()
+    assert first.events() != Scenario(tourists=30, duration=300, seed=8).events()
+    times = [e.at for e in first.events()]
+    assert times == sorted(times) and all(0 <= t < 300 for t in times)
+
+def test_behaviours():
+    """Test each behaviour moves the way it is described"""
+    scenario = Scenario(tourists=200, duration=900, seed=1)
+
+    for pings, _ in _tracks(scenario, 'loiter'):
+        lats = [p.payload["latitude"] for p in pings]
+        lons = [p.payload["longitude"] for p in pings]
+        spread_km = haversine(lats, lons, np.mean(lats), np.mean(lons))
+        assert np.max(spread_km) < 0.1
+
+    for pings, _ in _tracks(scenario, 'transit'):
+        assert np.median([p.payload["speed"] for p in pings]) > 5
+
+    fences = [Polygon(f["coordinates"]) for f in scenario.fences()]
+    crossers = list(_tracks(scenario, 'fence_crossing'))
+    assert crossers
+    for pings, _ in crossers:
+        inside = [any(f.contains(Point(p.payload["latitude"], p.payload["longitude"])) for f in fences) for p in pings]
+        assert any(inside) and not all(inside)
+
+    panics = list(_tracks(scenario, 'panic'))
+    assert panics
+    for pings, events in panics:
+        panic = next(e for e in events if e.kind == 'panic')
+        burst = [p.at for p in pings if panic.at <= p.at < panic.at + 60]
+        assert np.allclose(np.diff(burst), 1.0) and len(burst) >= 59
+        assert panic.payload["alert_type"] == "panic" and panic.payload["user_id"] == pings[0].user_id
+
+def test_mongo_standin_queries_and_updates():
+    """Test the stand-in applies heatmap-style upserts and filtered projections"""
+    async def run():
+        with standins.install():
+            db = get_mongo_database()
+            await db.anomaly_tiles.bulk_write([
+                pymongo.UpdateOne(
+                    {'_id': 'a'},
+                    {'$inc': {'count': 1}, '$max': {'score_max': s}, '$setOnInsert': {'tile': 't', 'bucket': b}},
+                    upsert=True
+                )
+                for s, b in ((0.1, 1), (0.3, 1), (0.2, 1))
+            ] + [pymongo.UpdateOne({'_id': 'b'}, {'$inc': {'count': 5}, '$setOnInsert': {'tile': 't', 'bucket': 9}},
+                                   upsert=True)])
+            found = await db.anomaly_tiles.find(
+                {'tile': 't', 'bucket': {'$gte': 0, '$lt': 5}}, {'_id': 0, 'count': 1, 'score_max': 1}
+            ).to_list()
+            await db.anomaly_detections.insert_many([{'location': {'coordinates': [i, 0]}} for i in range(4)])
+            nested = [d async for d in db.anomaly_detections.find({'location.coordinates': {'$in': [[2, 0]]}})]
+            deleted = await db.anomaly_detections.delete_many({})
+            async with get_postgres_connection() as conn:
+                await conn.execute("SELECT 1")
+            return found, nested, deleted.deleted_count, await db.anomaly_detections.count_documents({})
+
+    found, nested, deleted, remaining = asyncio.run(run())
+    assert found == [{'count': 3, 'score_max': 0.3}]
+    assert [d['location']['coordinates'] for d in nested] == [[2, 0]]
+    assert (deleted, remaining) == (4, 0)
+
+def test_mongo_standin_duplicate_keys():
+    """Test duplicate _ids raise the driver's errors, unordered inserts carrying on past them"""
+    async def run():
+        collection = standins.MemoryCollection("detections")
+        await collection.insert_one({"_id": "a"})
+        with pytest.raises(pymongo.errors.DuplicateKeyError):
+            await collection.insert_one({"_id": "a"})
+        with pytest.raises(pymongo.errors.BulkWriteError) as ordered:
+            await collection.insert_many([{"_id": "b"}, {"_id": "a"}, {"_id": "c"}])
+        with pytest.raises(pymongo.errors.BulkWriteError) as unordered:
+            await collection.insert_many([{"_id": "a"}, {"_id": "c"}, {"_id": "b"}], ordered=False)
+        return list(collection.documents), ordered.value.details, unordered.value.details
+
+    ids, ordered, unordered = asyncio.run(run())
+    assert ids == ["a", "b", "c"]
+    assert [(e["index"], e["code"]) for e in ordered["writeErrors"]] == [(1, 11000)]
+    assert [e["index"] for e in unordered["writeErrors"]] == [0, 2]
+
+def test_inprocess_run_reports_percentiles(memory_databases, tmp_path, monkeypatch):
+    """Test a short in-process run hits every endpoint without errors and reports JSON"""
+    from src.alert_system.main import app as alert_app
+    from src.geo_service.main import app as geo_app, service as geo_service
+
+    monkeypatch.setattr(geo_service, "fences", [])
+    monkeypatch.setattr(ai_engine, "detector", ai_engine.AnomalyDetector(
+        model_path=str(tmp_path / "model.joblib"), regions=RegionModelStore(str(tmp_path / "regions"))
+    ))
+    scenario = Scenario(tourists=6, duration=60, seed=3, mix={'stroll': 0.5, 'panic': 0.5})
+
+    async def run():
+        targets = {'ai': AsgiTarget(ai_engine.app), 'geo': AsgiTarget(geo_app), 'alerts': AsgiTarget(alert_app)}
+        try:
+            return await run_scenario(scenario, targets, concurrency=8, training_size=300)
+        finally:
+            for target in targets.values():
+                await target.aclose(timeout=0)
+
+    recorder, requests = asyncio.run(run())
+    report = json.loads(json.dumps(build_report(recorder, requests=requests), default=str))
+    endpoints = report["endpoints"]
+    assert requests == len(build_requests(scenario)) == endpoints["all"]["count"]
+    assert set(endpoints) == {
+        "ai POST /detect", "geo POST /check", "alerts POST /alert", "alerts GET /alerts/{user_id}", "all"
+    }
+    for stats in endpoints.values():
+        latency = stats["latency_ms"]
+        assert stats["errors"] == 0 and stats["throughput_rps"] > 0
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    stored = memory_databases[0]["tourist_safety"].anomaly_detections
+    assert len(stored) > 0
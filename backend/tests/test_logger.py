@@ -0,0 +1,80 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.common.utils.logger import (
+    JSONFormatter, LazyQueueHandler, RateLimitFilter, RequestContextFilter,
+    RequestIdMiddleware, request_id_var
+)
+
+def _record(msg="Notifying emergency contact: %s", args=("Asha",), level=logging.INFO, **extra):
+    record = logging.LogRecord("alert_system", level, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+def test_json_formatter_includes_context_and_extras():
+    """Test records render as JSON with request id, service and extra fields"""
+    record = _record(details={"fence_id": "f1"})
+    token = request_id_var.set("req-123")
+    try:
+        RequestContextFilter("alert_system").filter(record)
+    finally:
+        request_id_var.reset(token)
+
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "Notifying emergency contact: Asha"
+    assert entry["request_id"] == "req-123"
+    assert entry["service"] == "alert_system"
+    assert entry["details"] == {"fence_id": "f1"}
+
+def test_rate_limit_filter_drops_and_reports_suppressed():
+    """Test a noisy message template is rate limited and the drop count surfaces"""
+    limiter = RateLimitFilter(rate=0.001, burst=3)
+    results = [limiter.filter(_record(args=(f"contact_{i}",))) for i in range(10)]
+    assert results == [True] * 3 + [False] * 7
+    assert limiter.filter(_record(level=logging.CRITICAL))
+    assert all(limiter.filter(_record(level=logging.ERROR)) for _ in range(10))
+
+    limiter._buckets[("alert_system", logging.INFO, "Notifying emergency contact: %s")][0] = 1
+    record = _record()
+    assert limiter.filter(record)
+    assert record.suppressed == 7
+
+def test_lazy_queue_handler_defers_formatting():
+    """Test records are enqueued without formatting msg/args"""
+    handler = LazyQueueHandler(None)
+    record = _record()
+    prepared = handler.prepare(record)
+    assert prepared.msg == "Notifying emergency contact: %s"
+    assert prepared.args == ("Asha",)
+
+def test_lazy_queue_handler_snapshots_mutable_args():
+    """Test records with non-primitive args are formatted as they were at the call"""
+    handler = LazyQueueHandler(None)
+    contacts = ["Asha"]
+    prepared = handler.prepare(_record(args=(contacts,)))
+    contacts.append("Ravi")
+    assert prepared.getMessage() == "Notifying emergency contact: ['Asha']"
+    assert prepared.args is None
+
+    prepared = handler.prepare(_record(args=({"name": "Asha"},)))
+    assert prepared.getMessage() == "Notifying emergency contact: {'name': 'Asha'}"
+
+def test_request_id_middleware():
+    """Test incoming request ids are bound to the context and echoed back"""
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/whoami")
+    async def whoami():
+        return {"request_id": request_id_var.get()}
+
+    with TestClient(app) as client:
+        response = client.get("/whoami", headers={"X-Request-ID": "abc"})
+        assert response.json() == {"request_id": "abc"}
+        assert response.headers["x-request-id"] == "abc"
+
+        generated = client.get("/whoami")
+        assert generated.json()["request_id"] == generated.headers["x-request-id"]
@@ -0,0 +1,82 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.common.metrics import Registry, install_metrics, span, timed
+
+def test_counter_and_histogram_rendering():
+    """Test Prometheus text exposition of counters and histograms"""
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    requests.labels("/detect").inc()
+    requests.labels(route="/detect").inc(2)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/detect"} 3.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "latency_seconds_sum 3.65" in text
+
+def test_registry_rejects_type_conflicts():
+    """Test re-registering a name as a different metric type fails"""
+    registry = Registry()
+    registry.counter("things", "Things")
+    assert registry.counter("things", "Things") is registry.counter("things", "Things")
+    with pytest.raises(ValueError):
+        registry.gauge("things", "Things")
+
+def test_span_and_timed_record_stages():
+    """Test span and timed record into the stage histogram"""
+    from src.common.metrics import STAGE_DURATION
+
+    before = STAGE_DURATION.labels("test.stage").count
+    with span("test.stage"):
+        pass
+
+    @timed("test.stage")
+    def work():
+        return 42
+
+    assert work() == 42
+    assert STAGE_DURATION.labels("test.stage").count == before + 2
+
+def test_metrics_endpoint_reports_route_templates():
+    """Test the middleware labels requests by route template and /metrics exposes them"""
+    app = FastAPI()
+    install_metrics(app)
+
+    @app.get("/alerts/{user_id}")
+    async def alerts(user_id: str):
+        return {"user_id": user_id}
+
+    with TestClient(app) as client:
+        client.get("/alerts/test_user_1")
+        client.get("/alerts/test_user_2")
+        body = client.get("/metrics").text
+
+    assert 'http_requests_total{method="GET",route="/alerts/{user_id}",status="200"}' in body
+    assert "test_user_1" not in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/alerts/{user_id}"}' in body
+
+def test_service_metrics_endpoints(ai_client, geo_client, alert_client, test_geofence_data):
+    """Test each service exposes its stage metrics"""
+    geo_client.post("/fence", json=test_geofence_data)
+    geo_client.post("/check", json={
+        "user_id": "test_user_1", "latitude": 12.97, "longitude": 77.59,
+        "timestamp": "2025-08-30T00:00:00Z"
+    })
+    geo_metrics = geo_client.get("/metrics").text
+    assert 'stage_duration_seconds_count{stage="geofence.check"}' in geo_metrics
+    assert "geofence_fences_active 1.0" in geo_metrics
+
+    for client in (ai_client, alert_client):
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
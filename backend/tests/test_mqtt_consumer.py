@@ -0,0 +1,266 @@
+import asyncio
+import json
+
+import msgpack
+import numpy as np
+import pytest
+
+from src.ai_engine.main import AnomalyDetector
+from src.alert_system.main import AlertService
+from src.geo_service.main import GeoFence, GeoFenceService
+from src.ingest.main import PingPipeline
+from src.ingest.mqtt_consumer import (
+    InProcessBroker, InProcessTransport, MqttIngestConsumer, PahoTransport, topic_matches
+)
+from src.common.wire import PingColumns
+
+def _payload(latitude=12.9716, **extra):
+    return json.dumps(dict({
+        "latitude": latitude, "longitude": 77.5946,
+        "timestamp": "2025-08-30T00:00:00Z", "speed": 5.0
+    }, **extra)).encode()
+
+class _Recorder:
+    def __init__(self, fail=False, failures=0):
+        self.batches = []
+        self.fail = fail
+        self.failures = failures
+
+    async def __call__(self, columns: PingColumns):
+        if self.fail or self.failures:
+            self.failures = max(self.failures - 1, 0)
+            raise RuntimeError("store unavailable")
+        self.batches.append(columns)
+
+async def _consume(consumer, until):
+    task = asyncio.create_task(consumer.run())
+    try:
+        for _ in range(200):
+            if until():
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+def test_topic_matches():
+    """Test MQTT wildcard matching"""
+    assert topic_matches("tourists/+/location", "tourists/u1/location")
+    assert not topic_matches("tourists/+/location", "tourists/u1/status")
+    assert topic_matches("tourists/#", "tourists/u1/location")
+    assert not topic_matches("tourists/+", "tourists/u1/location")
+
+def test_messages_are_batched_and_acked():
+    """Test messages are micro-batched, user ids come from topics, and QoS 1 is acked after processing"""
+    async def run():
+        broker = InProcessBroker()
+        recorder = _Recorder()
+        consumer = MqttIngestConsumer(
+            InProcessTransport(broker), recorder, batch_size=10, batch_interval=0.05
+        )
+        await consumer.start()
+        for i in range(25):
+            payload = _payload() if i % 2 else msgpack.packb(json.loads(_payload()))
+            await broker.publish(f"tourists/user_{i}/location", payload, qos=1)
+        assert len(broker.unacked) == 25
+        await _consume(consumer, lambda: sum(len(b) for b in recorder.batches) == 25)
+        return broker, recorder
+
+    broker, recorder = asyncio.run(run())
+    assert [len(b) for b in recorder.batches] == [10, 10, 5]
+    assert recorder.batches[0].user_ids[:2] == ["user_0", "user_1"]
+    assert broker.unacked == {}
+
+def test_failed_batches_stay_unacked_and_bad_messages_are_rejected(tmp_path):
+    """Test processing failures leave messages for redelivery while poison messages are acked"""
+    async def run():
+        broker = InProcessBroker()
+        consumer = MqttIngestConsumer(
+            InProcessTransport(broker), _Recorder(fail=True), batch_interval=0.01,
+            dead_letter_path=str(tmp_path / "mqtt.ndjson")
+        )
+        await consumer.start()
+        await broker.publish("tourists/u1/location", _payload(), qos=1)
+        await broker.publish("tourists/u2/location", b"\xc1garbage", qos=1)
+        await broker.publish("tourists/u3/location", _payload(latitude=123), qos=1)
+        await _consume(consumer, lambda: consumer.batches_processed or len(broker.unacked) == 1)
+        return broker
+
+    broker = asyncio.run(run())
+    assert [m.topic for m in broker.unacked.values()] == ["tourists/u1/location"]
+
+def test_failed_batches_are_retried_until_processed():
+    """Test a transient processing failure is retried with backoff and acked once it succeeds"""
+    async def run():
+        broker = InProcessBroker()
+        recorder = _Recorder(failures=2)
+        consumer = MqttIngestConsumer(
+            InProcessTransport(broker), recorder, batch_interval=0.01, retry_initial=0.01, retry_max=0.02
+        )
+        await consumer.start()
+        await broker.publish("tourists/u1/location", _payload(), qos=1)
+        await _consume(consumer, lambda: not broker.unacked)
+        return broker, recorder, consumer
+
+    broker, recorder, consumer = asyncio.run(run())
+    assert broker.unacked == {} and len(recorder.batches) == 1
+    assert consumer.batches_failed == 2
+
+def test_batches_failing_every_attempt_are_dead_lettered(tmp_path):
+    """Test a batch that keeps failing is written to the dead-letter file and acked after max_attempts"""
+    dead_letters = tmp_path / "dead" / "mqtt.ndjson"
+
+    async def run():
+        broker = InProcessBroker()
+        consumer = MqttIngestConsumer(
+            InProcessTransport(broker), _Recorder(fail=True), batch_interval=0.01,
+            retry_initial=0.001, max_attempts=3, dead_letter_path=str(dead_letters)
+        )
+        await consumer.start()
+        await broker.publish("tourists/u1/location", _payload(), qos=1)
+        await _consume(consumer, lambda: consumer.batches_processed)
+        return broker, consumer
+
+    broker, consumer = asyncio.run(run())
+    assert broker.unacked == {} and consumer.batches_failed == 3
+    (letter,) = [json.loads(line) for line in dead_letters.read_text().splitlines()]
+    assert letter["topic"] == "tourists/u1/location" and letter["reason"] == "failed"
+    assert json.loads(letter["payload"])["latitude"] == 12.9716
+
+def test_out_of_range_rows_are_rejected_individually(tmp_path):
+    """Test a value overflowing its column rejects only that message, not the batch"""
+    async def run():
+        broker = InProcessBroker()
+        recorder = _Recorder()
+        consumer = MqttIngestConsumer(
+            InProcessTransport(broker), recorder, batch_interval=0.02,
+            dead_letter_path=str(tmp_path / "mqtt.ndjson")
+        )
+        await consumer.start()
+        await broker.publish("tourists/u1/location", _payload(battery_level=40000), qos=1)
+        await broker.publish("tourists/u2/location", _payload(), qos=1)
+        await _consume(consumer, lambda: recorder.batches)
+        return broker, recorder
+
+    broker, recorder = asyncio.run(run())
+    assert broker.unacked == {}
+    assert [b.user_ids for b in recorder.batches] == [["u2"]]
+    assert json.loads((tmp_path / "mqtt.ndjson").read_text())["reason"] == "invalid"
+
+def test_paho_transport_keeps_session_and_resubscribes(monkeypatch):
+    """Test the paho client uses a persistent session and restores subscriptions on every connect"""
+    import paho.mqtt.client as mqtt
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.kwargs = kwargs
+            self.subscribed = []
+            clients.append(self)
+
+        def connect_async(self, host, port):
+            self.on_connect(self, None, {}, type("Ok", (), {"is_failure": False})(), None)
+
+        def loop_start(self):
+            pass
+
+        def subscribe(self, topic, qos):
+            self.subscribed.append((topic, qos))
+
+    clients = []
+    monkeypatch.setattr(mqtt, "Client", FakeClient)
+
+    async def run():
+        transport = PahoTransport("mqtt://broker:1883", username="", client_id="ingest-1")
+        await transport.connect(lambda message: None)
+        await transport.subscribe("tourists/+/location", 1)
+        client = clients[0]
+        # paho reconnecting by itself calls on_connect again
+        client.on_connect(client, None, {}, type("Ok", (), {"is_failure": False})(), None)
+        return client
+
+    client = asyncio.run(run())
+    assert client.kwargs["client_id"] == "ingest-1" and client.kwargs["clean_session"] is False
+    assert client.subscribed == [("tourists/+/location", 1)] * 2
+
+def test_qos0_overflow_is_dropped():
+    """Test QoS 0 messages beyond the queue capacity are dropped rather than blocking"""
+    async def run():
+        broker = InProcessBroker()
+        consumer = MqttIngestConsumer(InProcessTransport(broker), _Recorder(), qos=0, queue_size=5)
+        await consumer.start()
+        for i in range(20):
+            await broker.publish("tourists/u1/location", _payload(), qos=0)
+        await asyncio.sleep(0.05)
+        size = consumer._queue.qsize()
+        await consumer.stop()
+        return size
+
+    assert asyncio.run(run()) == 5
+
+def test_consumer_feeds_pipeline_in_bulk():
+    """Test batches flow through the pipeline's bulk path and raise fence alerts"""
+    detector = AnomalyDetector(model_path="/nonexistent/model.joblib")
+    rng = np.random.default_rng(0)
+    features = np.column_stack([
+        rng.uniform(12.85, 13.05, 300), rng.uniform(77.5, 77.7, 300),
+        np.full(300, 5.0), np.zeros(300)
+    ])
+    detector.model.fit(features)
+    fences = GeoFenceService()
+    fences.add_fence(GeoFence(
+        id="market", name="Night Market", risk_level="high",
+        coordinates=[[12.95, 77.58], [12.95, 77.60], [12.99, 77.60], [12.99, 77.58], [12.95, 77.58]]
+    ))
+    pipeline = PingPipeline(detector, fences, AlertService(), store_detections=False)
+
+    async def run():
+        broker = InProcessBroker()
+        consumer = MqttIngestConsumer(InProcessTransport(broker), pipeline.process_batch, batch_interval=0.02)
+        await consumer.start()
+        await broker.publish("tourists/u1/location", _payload(latitude=12.90), qos=1)
+        await broker.publish("tourists/u1/location", _payload(), qos=1)
+        await broker.publish("tourists/u2/location", _payload(), qos=1)
+        await _consume(consumer, lambda: not broker.unacked)
+
+    asyncio.run(run())
+    geofence_alerts = [a for a in pipeline.alerts.alerts if a.alert_type == "geofence"]
+    assert sorted(a.user_id for a in geofence_alerts) == ["u1", "u2"]
+
+def test_failed_insert_is_not_reprocessed(memory_databases, monkeypatch, tmp_path):
+    """Test a transient insert failure neither repeats alerts nor duplicates stored detections"""
+    from src.ai_engine import main as ai_engine
+    from src.common.database.connection import get_mongo_database
+
+    monkeypatch.setattr(ai_engine, "trajectories", None)
+    monkeypatch.setattr(ai_engine, "_unwritten", type(ai_engine._unwritten)(maxlen=100))
+    detector = AnomalyDetector(model_path=str(tmp_path / "model.joblib"))
+    detector.model.fit(np.column_stack([
+        np.full(50, 40.0), np.full(50, 10.0), np.full(50, 5.0), np.zeros(50)
+    ]))
+    pipeline = PingPipeline(detector, GeoFenceService(), AlertService())
+    collection = get_mongo_database().anomaly_detections
+    insert_many = collection.insert_many
+    failures = [ConnectionError("mongo unavailable")]
+
+    async def flaky_insert_many(documents, ordered=True):
+        if failures:
+            raise failures.pop()
+        return await insert_many(documents, ordered=ordered)
+
+    monkeypatch.setattr(collection, "insert_many", flaky_insert_many)
+
+    async def run():
+        broker = InProcessBroker()
+        consumer = MqttIngestConsumer(InProcessTransport(broker), pipeline.process_batch, batch_interval=0.02)
+        await consumer.start()
+        for i in range(3):
+            await broker.publish(f"tourists/u{i}/location", _payload(), qos=1)
+        await _consume(consumer, lambda: not broker.unacked)
+        await ai_engine.flush_storage(final=True)
+        return consumer
+
+    consumer = asyncio.run(run())
+    assert consumer.batches_failed == 0
+    assert len(collection.documents) == 3
+    assert sorted(a.user_id for a in pipeline.alerts.alerts) == ["u0", "u1", "u2"]
@@ -0,0 +1,169 @@
+import asyncio
+import copy
+from collections import Counter
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import HTMLResponse
+from fastapi.testclient import TestClient
+
+from src.common.config import config
+from src.places_proxy import main as places
+from src.places_proxy.cache import TieredCache
+from src.places_proxy.main import PlacesProxy
+
+class _HtmlPage(Exception):
+    pass
+
+def _fake_upstream():
+    """Stands in for Nominatim, Open-Meteo and OSRM, counting calls per path"""
+    upstream = FastAPI()
+    upstream.state.calls = Counter()
+    upstream.state.delay = 0.0
+    upstream.state.fail = False
+    upstream.state.html = False
+
+    async def record(name):
+        upstream.state.calls[name] += 1
+        await asyncio.sleep(upstream.state.delay)
+        if upstream.state.fail:
+            raise HTTPException(status_code=429, detail="rate limited")
+        if upstream.state.html:
+            raise _HtmlPage()
+
+    @upstream.get("/reverse")
+    async def reverse(lat: float, lon: float):
+        await record("reverse")
+        return {"lat": lat, "lon": lon, "address": {"city": "Bengaluru"}}
+
+    @upstream.get("/search")
+    async def search(q: str, limit: int):
+        await record("search")
+        return [{"display_name": q, "lat": "12.97", "lon": "77.59"}][:limit]
+
+    @upstream.get("/v1/forecast")
+    async def forecast(latitude: float, longitude: float):
+        await record("weather")
+        return {"current_weather": {"temperature": 27.5}}
+
+    @upstream.get("/route/v1/{mode}/{coordinates}")
+    async def route(mode: str, coordinates: str):
+        await record("route")
+        return {"routes": [{"distance": 1200.0, "duration": 600.0, "mode": mode}]}
+
+    @upstream.exception_handler(_HtmlPage)
+    async def html_page(request, exc):
+        return HTMLResponse("<html>Down for maintenance</html>")
+
+    return upstream
+
+@pytest.fixture
+def upstream():
+    return _fake_upstream()
+
+@pytest.fixture
+def settings():
+    settings = copy.deepcopy(config.get('services.places_proxy'))
+    settings['upstreams'] = {name: "http://upstream" for name in settings['upstreams']}
+    return settings
+
+def _proxy(upstream, settings, cache_path=None):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=upstream))
+    return PlacesProxy(client, TieredCache(100, cache_path), settings)
+
+def test_nearby_lookups_share_a_cell(upstream, settings):
+    """Test coordinates in the same cell hit upstream once and are served from memory after"""
+    async def run():
+        proxy = _proxy(upstream, settings)
+        first = await proxy.reverse(12.97160, 77.59460)
+        second = await proxy.reverse(12.97165, 77.59455)
+        far = await proxy.reverse(13.05, 77.70)
+        await proxy.aclose()
+        return first, second, far
+
+    (first, first_source), (second, second_source), (_, far_source) = asyncio.run(run())
+    assert (first_source, second_source, far_source) == ("upstream", "memory", "upstream")
+    assert first == second and first["address"]["city"] == "Bengaluru"
+    assert upstream.state.calls["reverse"] == 2
+
+def test_concurrent_misses_are_coalesced(upstream, settings):
+    """Test identical in-flight lookups share one upstream call"""
+    upstream.state.delay = 0.05
+
+    async def run():
+        proxy = _proxy(upstream, settings)
+        results = await asyncio.gather(*(proxy.weather(12.97, 77.59) for _ in range(20)))
+        await proxy.aclose()
+        return results
+
+    sources = Counter(source for _, source in asyncio.run(run()))
+    assert sources == {"upstream": 1, "coalesced": 19}
+    assert upstream.state.calls["weather"] == 1
+
+def test_disk_tier_survives_restart(upstream, settings, tmp_path):
+    """Test a new proxy instance is answered from the SQLite tier"""
+    path = str(tmp_path / "places.sqlite3")
+
+    async def lookup():
+        proxy = _proxy(upstream, settings, path)
+        result = await proxy.search("  Cubbon   PARK ")
+        again = await proxy.search("cubbon park")
+        await proxy.aclose()
+        return result[1], again[1]
+
+    assert asyncio.run(lookup()) == ("upstream", "memory")
+    assert asyncio.run(lookup()) == ("disk", "memory")
+    assert upstream.state.calls["search"] == 1
+
+def test_expired_entries_are_refetched(upstream, settings, tmp_path):
+    """Test entries past their TTL go back upstream"""
+    settings['ttl']['route'] = 0
+
+    async def run():
+        proxy = _proxy(upstream, settings, str(tmp_path / "places.sqlite3"))
+        sources = [(await proxy.route("walking", (12.97, 77.59), (12.98, 77.60)))[1] for _ in range(2)]
+        await proxy.aclose()
+        return sources
+
+    assert asyncio.run(run()) == ["upstream", "upstream"]
+    assert upstream.state.calls["route"] == 2
+
+def test_endpoints_and_upstream_errors(upstream, settings, monkeypatch):
+    """Test a failed lookup surfaces as 502 and is retried on the next request"""
+    monkeypatch.setattr(places, "proxy", _proxy(upstream, settings))
+    upstream.state.fail = True
+    with TestClient(places.app) as client:
+        response = client.get("/weather", params={"lat": 12.97, "lon": 77.59})
+        assert response.status_code == 502
+
+        upstream.state.fail = False
+        response = client.get("/weather", params={"lat": 12.97, "lon": 77.59})
+        assert response.status_code == 200
+        assert response.headers["X-Cache"] == "upstream"
+        assert response.json()["current_weather"]["temperature"] == 27.5
+
+        response = client.get("/weather", params={"lat": 12.97, "lon": 77.59})
+        assert response.headers["X-Cache"] == "memory"
+
+        route = client.get("/route/driving", params={
+            "from_lat": 12.97, "from_lon": 77.59, "to_lat": 12.98, "to_lon": 77.60
+        })
+        assert route.status_code == 200 and route.json()["routes"][0]["mode"] == "driving"
+        assert client.get("/route/DRIVING!", params={
+            "from_lat": 12.97, "from_lon": 77.59, "to_lat": 12.98, "to_lon": 77.60
+        }).status_code == 422
+        assert client.get("/reverse", params={"lat": 95, "lon": 0}).status_code == 422
+    assert upstream.state.calls["weather"] == 2
+
+def test_non_json_upstream_body_is_an_upstream_error(upstream, settings, monkeypatch):
+    """Test a 200 HTML page from upstream surfaces as 502, is counted and is not cached"""
+    monkeypatch.setattr(places, "proxy", _proxy(upstream, settings))
+    upstream.state.html = True
+    with TestClient(places.app) as client:
+        response = client.get("/weather", params={"lat": 12.97, "lon": 77.59})
+        assert response.status_code == 502
+        assert 'places_upstream_requests_total{upstream="open_meteo",outcome="invalid"}' in client.get("/metrics").text
+
+        upstream.state.html = False
+        assert client.get("/weather", params={"lat": 12.97, "lon": 77.59}).headers["X-Cache"] == "upstream"
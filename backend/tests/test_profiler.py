@@ -0,0 +1,122 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import pytest
+
+from src.common.auth import get_token_verifier
+from src.common.config import config
+from src.common.profiler import ProfilerMiddleware, SamplingProfiler, install_profiler, profiler
+
+def _spin(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def _app(sampler: SamplingProfiler) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware, profiler=sampler)
+
+    @app.get("/spin/{ms}")
+    async def spin(ms: int):
+        _spin(ms / 1000)
+        return JSONResponse({"ms": ms}, headers={"x-request-id": f"req-{ms}"})
+
+    return app
+
+def test_samples_are_attributed_to_routes():
+    """Test loop samples land under the route template and export as collapsed and speedscope"""
+    sampler = SamplingProfiler(interval=0.002)
+    with TestClient(_app(sampler)) as client:
+        sampler.start('all')
+        try:
+            assert client.get("/spin/300").status_code == 200
+        finally:
+            sampler.stop()
+
+    counts = sampler.window(route="GET /spin/{ms}")
+    assert sum(counts.values()) >= 20
+    collapsed = sampler.collapsed(route="GET /spin/{ms}")
+    top = collapsed.splitlines()[0]
+    assert top.startswith("GET /spin/{ms};") and "_spin (tests/test_profiler.py:" in top
+    assert int(top.rsplit(" ", 1)[1]) > 0
+
+    document = sampler.speedscope()
+    frames = document["shared"]["frames"]
+    spin_profile = next(p for p in document["profiles"] if p["name"] == "GET /spin/{ms}")
+    assert len(spin_profile["samples"]) == len(spin_profile["weights"])
+    assert any(frames[stack[-1]]["name"] == "_spin" for stack in spin_profile["samples"])
+    assert abs(spin_profile["endValue"] - sum(spin_profile["weights"])) < 1e-9
+
+def test_slow_mode_keeps_only_slow_requests():
+    """Test slow mode records requests over the threshold with their request id"""
+    sampler = SamplingProfiler(interval=0.002)
+    with TestClient(_app(sampler)) as client:
+        sampler.start('slow', slow_threshold=0.15)
+        try:
+            client.get("/spin/20")
+            client.get("/spin/250")
+        finally:
+            sampler.stop()
+
+    assert [r["request_id"] for r in sampler.slow_requests] == ["req-250"]
+    slow = sampler.slow_requests[0]
+    assert slow["route"] == "GET /spin/{ms}" and slow["path"] == "/spin/250"
+    assert slow["duration_ms"] >= 250 and slow["samples"] > 0 and slow["stacks"]
+    assert all(label == "GET /spin/{ms}" for label, _ in sampler.window())
+
+@pytest.fixture
+def endpoints_enabled(monkeypatch):
+    monkeypatch.setitem(config._config["profiling"], "endpoints", True)
+    monkeypatch.setitem(config._config["jwt"], "secret", "test-secret-key-with-at-least-32-bytes!")
+
+def test_admin_endpoints_are_off_by_default(monkeypatch):
+    """Test the endpoints need the flag and a non-default JWT secret"""
+    monkeypatch.setitem(config._config["profiling"], "enabled", True)
+    app = FastAPI()
+    install_profiler(app)
+    with TestClient(app) as client:
+        assert client.get("/admin/profiler").status_code == 404
+    assert not profiler.running
+
+    monkeypatch.setitem(config._config["profiling"], "endpoints", True)
+    monkeypatch.setitem(config._config["jwt"], "secret", "your-secret-key")
+    app = FastAPI()
+    install_profiler(app)
+    with TestClient(app) as client:
+        assert client.get("/admin/profiler").status_code == 404
+
+def test_admin_endpoints_require_admin_role(endpoints_enabled):
+    """Test the profiler endpoints check the bearer token role and serve profiles"""
+    app = FastAPI()
+    install_profiler(app)
+
+    @app.get("/work")
+    async def work():
+        _spin(0.1)
+        return {}
+
+    verifier = get_token_verifier()
+    admin = {"Authorization": f"Bearer {verifier.generate({'sub': 'ops', 'role': 'admin'}, expires_in=60)}"}
+    tourist = {"Authorization": f"Bearer {verifier.generate({'sub': 't1', 'role': 'tourist'}, expires_in=60)}"}
+
+    with TestClient(app) as client:
+        assert client.get("/admin/profiler").status_code == 401
+        assert client.post("/admin/profiler/start", headers=tourist).status_code == 403
+        assert client.post("/admin/profiler/start?mode=sometimes", headers=admin).status_code == 422
+        try:
+            started = client.post("/admin/profiler/start?interval_ms=2&reset=true", headers=admin)
+            assert started.status_code == 200 and started.json()["running"] is True
+            client.get("/work")
+            collapsed = client.get("/admin/profiler/profile?seconds=60", headers=admin)
+            assert collapsed.status_code == 200 and "GET /work;" in collapsed.text
+            speedscope = client.get("/admin/profiler/profile?format=speedscope&route=/work", headers=admin).json()
+            assert [p["name"] for p in speedscope["profiles"]] == ["GET /work"]
+            assert client.get("/admin/profiler/profile?format=pprof", headers=admin).status_code == 422
+            assert client.get("/admin/profiler/slow", headers=admin).json()["requests"] == []
+        finally:
+            stopped = client.post("/admin/profiler/stop", headers=admin)
+        assert stopped.json()["running"] is False
+    assert not profiler.running
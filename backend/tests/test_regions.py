@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.ai_engine.main import AnomalyDetector, LocationData
+from src.ai_engine.regions import RegionIndex, RegionModelStore
+from src.common.errors import ValidationError
+from src.common.utils import geohash
+from src.common.wire import PingColumns
+
+def _points(test_location_data, lat_range, lon_range, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        LocationData(**dict(test_location_data, latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(*lat_range, n), rng.uniform(*lon_range, n))
+    ]
+
+@pytest.fixture
+def detector(tmp_path, test_location_data):
+    store = RegionModelStore(str(tmp_path / "regions"), RegionIndex(precision=3))
+    detector = AnomalyDetector(model_path=str(tmp_path / "global.joblib"), regions=store)
+    detector.region_min_samples = 50
+    return detector
+
+def test_geohash_known_values():
+    """Test geohash encoding and cell bounds against reference values"""
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash.encode_many([12.97, 12.98, -33.8], [77.59, 77.6, 151.2], 5) == ["tdr1v", "tdr1v", "r3gx8"]
+    min_lat, min_lon, max_lat, max_lon = geohash.bounds("u4pruydqqvj")
+    assert min_lat <= 57.64911 <= max_lat and min_lon <= 10.40744 <= max_lon
+
+def test_region_index_prefers_polygons():
+    """Test points inside a configured polygon map to it, others to their geohash"""
+    index = RegionIndex(precision=3, polygons={
+        "bengaluru": [[12.8, 77.4], [12.8, 77.8], [13.2, 77.8], [13.2, 77.4], [12.8, 77.4]]
+    })
+    assert index.regions_for([12.97, 28.61], [77.59, 77.21]) == ["bengaluru", geohash.encode(28.61, 77.21, 3)]
+    with pytest.raises(ValidationError):
+        RegionIndex(polygons={"../escape": [[0, 0], [0, 1], [1, 1]]})
+
+def test_train_routes_pings_to_region_models(detector, test_location_data):
+    """Test regions with enough samples get their own model and others fall back to the global one"""
+    bengaluru = _points(test_location_data, (12.85, 13.05), (77.5, 77.7), 200)
+    sparse = _points(test_location_data, (48.80, 48.90), (2.30, 2.40), 10, seed=1)
+    detector.train(bengaluru + sparse)
+
+    assert detector.regions.available() == ["tdr"]
+    assert detector.detect_anomaly(bengaluru[0]).region == "tdr"
+    assert detector.detect_anomaly(sparse[0]).region is None
+
+    columns = PingColumns.from_records([p.model_dump() for p in (bengaluru[:3] + sparse[:2])])
+    scored = detector.detect_batch(columns)
+    assert scored["region"] == ["tdr", "tdr", "tdr", None, None]
+    single = [detector.detect_anomaly(p).details["anomaly_score"] for p in bengaluru[:3] + sparse[:2]]
+    np.testing.assert_allclose(scored["anomaly_score"], single)
+
+def test_region_models_load_lazily_and_evict(detector, tmp_path, test_location_data):
+    """Test a fresh store loads models on first use and stays within its memory budget"""
+    detector.train(
+        _points(test_location_data, (12.85, 13.05), (77.5, 77.7), 100)
+        + _points(test_location_data, (28.50, 28.70), (77.1, 77.3), 100, seed=1)
+    )
+    regions = detector.regions.available()
+    assert len(regions) == 2
+
+    model_size = os.path.getsize(detector.regions.path_for(regions[0]))
+    store = RegionModelStore(detector.regions.model_dir, RegionIndex(precision=3), int(model_size * 1.5))
+    assert store.available() == regions and store.resident() == []
+
+    assert store.get(regions[0]) is not None
+    assert store.resident() == [regions[0]]
+    assert store.get(regions[1]) is not None
+    assert store.resident() == [regions[1]]
+    assert store.resident_bytes <= store.memory_budget_bytes
+    assert store.get("unknown") is None
+
+def test_train_single_region(detector, test_location_data):
+    """Test retraining one region leaves the global model and other regions alone"""
+    delhi = _points(test_location_data, (28.50, 28.70), (77.1, 77.3), 100)
+    detector.train(_points(test_location_data, (12.85, 13.05), (77.5, 77.7), 100) + delhi)
+    global_model = detector.model
+    bengaluru_model = detector.regions.get("tdr")
+
+    detector.train(delhi, region="ttn")
+    assert detector.model is global_model
+    assert detector.regions.get("tdr") is bengaluru_model
+
+    with pytest.raises(ValidationError):
+        detector.train(delhi[:10], region="ttn")
+    with pytest.raises(ValidationError):
+        detector.train(delhi, region="tdr")
+
+def test_train_endpoint_rejects_sparse_region(ai_client, test_location_data):
+    """Test /train reports a region without enough samples instead of training nothing"""
+    from src.ai_engine import main as ai_engine
+
+    sparse = [p.model_dump() for p in _points(test_location_data, (28.50, 28.70), (77.1, 77.3), 3)]
+    region = ai_engine.detector.regions.index.regions_for([28.6], [77.2])[0]
+    response = ai_client.post("/train", params={"region": region}, json=sparse)
+    assert response.status_code == 422 and "at least" in response.json()["detail"]
@@ -0,0 +1,57 @@
+"""Cold-import budgets for the Python services
+
+Each service is imported in a fresh interpreter after FastAPI and Pydantic,
+which every service pays for regardless, so the measured time is the
+service's own import cost. Override the budget with STARTUP_BUDGET_MS.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds of import time allowed on top of the web framework
+IMPORT_BUDGET_MS = {
+    "src.ai_engine.main": 250,
+    "src.geo_service.main": 250,
+    "src.alert_system.main": 250,
+}
+
+# Modules that must only load during lifespan startup or on first use
+DEFERRED_MODULES = ("numpy", "sklearn", "joblib", "shapely", "motor", "pymongo", "asyncpg", "torch", "tensorflow")
+
+_PROBE = """
+import json, sys, time
+import fastapi, pydantic
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"elapsed_ms": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+def _cold_import(module: str) -> dict:
+    best = None
+    for _ in range(3):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result["elapsed_ms"] < best["elapsed_ms"]:
+            best = result
+    return best
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGET_MS))
+def test_service_cold_import_budget(module):
+    """Test a service imports within budget without loading heavy dependencies"""
+    result = _cold_import(module)
+    loaded = [m for m in DEFERRED_MODULES if m in result["modules"]]
+    assert not loaded, f"{module} imports {loaded} at module load"
+
+    budget = float(os.getenv("STARTUP_BUDGET_MS", IMPORT_BUDGET_MS[module]))
+    assert result["elapsed_ms"] <= budget, (
+        f"{module} cold import took {result['elapsed_ms']:.0f} ms (budget {budget:.0f} ms)"
+    )
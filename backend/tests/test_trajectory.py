@@ -0,0 +1,212 @@
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from src.ai_engine import main as ai_engine
+from src.ai_engine.main import LocationData
+from src.common.database.connection import get_mongo_database
+from src.common.utils.geodesy import haversine
+from src.common.utils.trajectory import (
+    TrajectoryCompressor,
+    TrajectoryCompressors,
+    TrajectoryPoint,
+    interpolate,
+    resample,
+)
+from src.common.wire import PingColumns
+
+START = 1756512000.0  # 2025-08-30T00:00:00Z
+
+def _compress(points, **kwargs):
+    compressor = TrajectoryCompressor(**kwargs)
+    retained = []
+    for point in points:
+        retained.extend(compressor.push(point))
+    retained.extend(compressor.flush())
+    return retained
+
+def _max_error_m(points, retained):
+    lats, lons = interpolate(
+        [p.timestamp for p in retained],
+        [p.latitude for p in retained],
+        [p.longitude for p in retained],
+        [p.timestamp for p in points]
+    )
+    return float(np.max(haversine(lats, lons, [p.latitude for p in points], [p.longitude for p in points]))) * 1000
+
+def _walk(n=600, seed=0, step_m=8.0, noise_m=2.0):
+    """A tourist strolling with occasional turns and stops, one ping per second"""
+    rng = np.random.default_rng(seed)
+    heading = rng.uniform(0, 2 * np.pi)
+    lat, lon = 12.9716, 77.5946
+    points = []
+    for i in range(n):
+        if rng.random() < 0.02:
+            heading += rng.normal(0, 1.0)
+        moving = (i // 100) % 3 != 2  # every third stretch of 100 s is a stop
+        if moving:
+            lat += step_m * np.cos(heading) / 111195.0
+            lon += step_m * np.sin(heading) / (111195.0 * np.cos(np.radians(lat)))
+        points.append(TrajectoryPoint(
+            START + i,
+            lat + rng.normal(0, noise_m) / 111195.0,
+            lon + rng.normal(0, noise_m) / 111195.0
+        ))
+    return points
+
+def test_straight_line_keeps_endpoints_only():
+    """Test constant-velocity movement collapses to its endpoints"""
+    points = [TrajectoryPoint(START + i, 12.9 + i * 1e-4, 77.5) for i in range(50)]
+    retained = _compress(points, tolerance_m=5.0)
+    assert [p.timestamp for p in retained] == [START, START + 49]
+
+@pytest.mark.parametrize("tolerance_m", [5.0, 10.0, 25.0])
+def test_error_is_bounded_by_tolerance(tolerance_m):
+    """Test replaying retained points reproduces every ping within the tolerance"""
+    points = _walk()
+    retained = _compress(points, tolerance_m=tolerance_m)
+    # Small slack for the local flat-earth approximation
+    assert _max_error_m(points, retained) <= tolerance_m * 1.01
+    assert len(retained) * 3 < len(points)
+
+def test_stationary_user_keeps_heartbeats():
+    """Test jitter inside the dead-band is dropped except for max_interval heartbeats"""
+    rng = np.random.default_rng(1)
+    points = [
+        TrajectoryPoint(START + i, 12.9716 + rng.normal(0, 1e-6), 77.5946 + rng.normal(0, 1e-6))
+        for i in range(0, 1200, 5)
+    ]
+    retained = _compress(points, tolerance_m=10.0, max_interval=300.0)
+    assert [p.timestamp - START for p in retained] == [0, 300, 600, 900, 1195]
+
+def test_keep_and_late_points():
+    """Test forced and out-of-order pings are returned immediately and repeats are dropped"""
+    compressor = TrajectoryCompressor(tolerance_m=10.0)
+    assert compressor.push(TrajectoryPoint(START, 12.9, 77.5)) == [TrajectoryPoint(START, 12.9, 77.5)]
+    assert compressor.push(TrajectoryPoint(START, 12.9, 77.5)) == []
+    assert compressor.push(TrajectoryPoint(START + 10, 12.9, 77.5)) == []
+    assert compressor.push(TrajectoryPoint(START + 10, 13.0, 77.5), keep=True) == []
+    assert compressor._window == [TrajectoryPoint(START + 10, 12.9, 77.5)]
+    assert compressor.push(TrajectoryPoint(START + 20, 12.9, 77.5), keep=True) == [TrajectoryPoint(START + 20, 12.9, 77.5)]
+    late = TrajectoryPoint(START + 5, 12.8, 77.4)
+    assert compressor.push(late) == [late]
+    assert compressor.anchor.timestamp == START + 20
+
+def test_compressors_idle_flush():
+    """Test per-user state and idle flushing"""
+    compressors = TrajectoryCompressors(tolerance_m=10.0, idle_seconds=60)
+    for i in range(5):
+        compressors.push("a", TrajectoryPoint(START + i, 12.9, 77.5))
+    compressors.push("b", TrajectoryPoint(START, 13.0, 77.6))
+    assert len(compressors) == 2
+
+    assert compressors.take_idle() == []
+    idle = compressors.take_idle(now=float("inf"))
+    assert [p.timestamp - START for p in idle] == [4]  # user b has nothing held back
+    assert len(compressors) == 0
+
+def test_interpolate_and_resample():
+    """Test replay across the antimeridian and at a fixed step"""
+    lats, lons = interpolate([0, 10], [0.0, 1.0], [179.5, -179.5], [5])
+    assert lats[0] == pytest.approx(0.5)
+    assert abs(lons[0]) == pytest.approx(180.0)
+
+    times, lats, lons = resample([TrajectoryPoint(START + 10, 1.0, 2.0), TrajectoryPoint(START, 0.0, 0.0)], 4)
+    assert (times - START).tolist() == [0, 4, 8, 10]
+    np.testing.assert_allclose(lats, [0.0, 0.4, 0.8, 1.0])
+    np.testing.assert_allclose(lons, [0.0, 0.8, 1.6, 2.0])
+
+class _FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.fail = False
+
+    async def insert_one(self, document):
+        await self.insert_many([document])
+
+    async def insert_many(self, documents, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo unavailable")
+        self.documents.extend(documents)
+
+class _FakeDatabase:
+    def __init__(self):
+        self.anomaly_detections = _FakeCollection()
+
+def test_store_detection_compresses(monkeypatch, test_location_data):
+    """Test stored detections are compressed, anomalies are kept and tails flushed"""
+    db = _FakeDatabase()
+    monkeypatch.setattr(ai_engine, "get_mongo_database", lambda: db)
+    monkeypatch.setattr(ai_engine, "trajectories", TrajectoryCompressors(tolerance_m=10.0, max_interval=3600))
+    monkeypatch.setattr(ai_engine.tiles, "add", lambda *args: None)
+
+    def result(is_anomaly=False):
+        return {"is_anomaly": is_anomaly, "confidence": 0.5, "details": {"anomaly_score": -0.4, "threshold": -0.5}}
+
+    async def run():
+        for i in range(60):
+            ping = LocationData(**dict(
+                test_location_data,
+                latitude=12.9 + i * 1e-4,
+                timestamp=f"2025-08-30T00:{i:02d}:00Z"
+            ))
+            await ai_engine.store_detection(ping, result(is_anomaly=(i == 30)))
+        stored = len(db.anomaly_detections.documents)
+        await ai_engine.flush_storage(final=True)
+        return stored
+
+    stored_before_flush = asyncio.run(run())
+    kept = [d["timestamp"].minute for d in db.anomaly_detections.documents]
+    assert stored_before_flush == 2
+    assert kept == [0, 30, 59]
+
+def test_failed_insert_keeps_retained_points(monkeypatch, test_location_data):
+    """Test points already released by the compressor are written by the next insert after a failure"""
+    db = _FakeDatabase()
+    monkeypatch.setattr(ai_engine, "get_mongo_database", lambda: db)
+    monkeypatch.setattr(ai_engine, "trajectories", TrajectoryCompressors(tolerance_m=10.0, max_interval=3600))
+    monkeypatch.setattr(ai_engine, "_unwritten", type(ai_engine._unwritten)(maxlen=100))
+    monkeypatch.setattr(ai_engine.tiles, "add", lambda *args: None)
+
+    def ping(minute, latitude=12.9):
+        return LocationData(**dict(test_location_data, latitude=latitude, timestamp=f"2025-08-30T00:{minute:02d}:00Z"))
+
+    result = {"is_anomaly": False, "confidence": 0.5, "details": {"anomaly_score": -0.4, "threshold": -0.5}}
+
+    async def run():
+        await ai_engine.store_detection(ping(0), result)
+        db.anomaly_detections.fail = True
+        await ai_engine.store_detection(ping(1), result)
+        # Turning north releases the held-back ping at minute 1, but the insert fails
+        with pytest.raises(ConnectionError):
+            await ai_engine.store_detection(ping(2, latitude=13.0), result)
+        db.anomaly_detections.fail = False
+        await ai_engine.flush_storage(final=True)
+
+    asyncio.run(run())
+    assert [d["timestamp"].minute for d in db.anomaly_detections.documents] == [0, 1, 2]
+
+def test_restored_detections_are_written_once(memory_databases, monkeypatch, test_location_data):
+    """Test storing the same pings again hits their deterministic _ids instead of duplicating them"""
+    monkeypatch.setattr(ai_engine, "trajectories", None)
+    monkeypatch.setattr(ai_engine.tiles, "add_batch", lambda *args: None)
+    monkeypatch.setattr(ai_engine.tiles, "add", lambda *args: None)
+    records = [dict(test_location_data, timestamp=f"2025-08-30T00:0{i}:00Z") for i in range(3)]
+    result = {"is_anomaly": False, "confidence": 0.5, "details": {"anomaly_score": -0.4, "threshold": -0.5}}
+
+    async def store(rows):
+        await ai_engine.store_detections_batch(PingColumns.from_records(rows), [result] * len(rows))
+
+    async def run():
+        await store(records[:2])
+        await store(records[:2])
+        await store(records)
+        await ai_engine.store_detection(LocationData(**records[0]), result)
+
+    asyncio.run(run())
+    stored = get_mongo_database().anomaly_detections.documents
+    assert list(stored) == [
+        ai_engine.detection_id("test_user_1", datetime(2025, 8, 30, 0, i, tzinfo=timezone.utc)) for i in range(3)
+    ]
@@ -0,0 +1,137 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.common.errors import ValidationError
+from src.common.wire import (
+    MSGPACK, NDJSON, PACKED, PingColumns, decode_pings,
+    encode_msgpack_frames, encode_packed, parse_timestamp
+)
+
+PINGS = [
+    {"user_id": "test_user_1", "latitude": 12.9716, "longitude": 77.5946,
+     "timestamp": "2025-08-30T00:00:00Z", "speed": 5.0, "accuracy": 10.0, "battery_level": 85},
+    {"user_id": "test_user_2", "latitude": -33.8688, "longitude": 151.2093,
+     "timestamp": "2025-08-30T00:00:05+00:00"},
+]
+
+def _encode(content_type):
+    if content_type == NDJSON:
+        return "\n".join(json.dumps(p) for p in PINGS).encode()
+    if content_type == MSGPACK:
+        return encode_msgpack_frames(PINGS)
+    return encode_packed(PINGS)
+
+@pytest.mark.parametrize("content_type", [NDJSON, MSGPACK, PACKED])
+def test_decode_formats_into_columns(content_type):
+    """Test every wire format decodes to the same columns"""
+    columns = decode_pings(_encode(content_type), content_type + "; charset=utf-8")
+    assert columns.user_ids == ["test_user_1", "test_user_2"]
+    np.testing.assert_allclose(columns.latitude, [12.9716, -33.8688])
+    np.testing.assert_allclose(columns.timestamp, [1756512000.0, 1756512005.0])
+    assert columns.optional("speed") == [5.0, None]
+    assert columns.optional("battery_level") == [85, None]
+    assert columns.datetimes()[1].isoformat() == "2025-08-30T00:00:05+00:00"
+
+def test_decode_rejects_invalid_batches():
+    """Test range checks, malformed bodies and unknown content types"""
+    bad = dict(PINGS[0], latitude=100)
+    with pytest.raises(ValidationError) as exc:
+        PingColumns.from_records([PINGS[1], bad])
+    assert exc.value.details["rows"] == [1]
+
+    with pytest.raises(ValidationError):
+        decode_pings(b"\x00" * 10, PACKED)
+    with pytest.raises(ValidationError):
+        decode_pings(encode_msgpack_frames(PINGS)[:-3], MSGPACK)
+    with pytest.raises(ValidationError):
+        decode_pings(b"{}", "text/csv")
+    with pytest.raises(ValidationError):
+        PingColumns.from_records([dict(PINGS[0], battery_level=40000)])
+
+def test_batch_endpoints_reject_out_of_range_columns(ai_client: TestClient, geo_client: TestClient):
+    """Test a value that overflows its column dtype is a 422, not a 500"""
+    body = json.dumps(dict(PINGS[0], battery_level=40000)).encode()
+    for client, path in ((ai_client, "/detect/batch"), (geo_client, "/check/batch")):
+        response = client.post(path, content=body, headers={"Content-Type": NDJSON})
+        assert response.status_code == 422
+
+def test_packed_user_ids_must_fit_and_decode():
+    """Test over-long user ids are refused when packing and broken UTF-8 is a validation error"""
+    with pytest.raises(ValidationError):
+        encode_packed([dict(PINGS[0], user_id="ü" * 17)])
+
+    body = bytearray(encode_packed([PINGS[0]]))
+    body[:32] = ("x" * 31).encode() + "ü".encode()[:1]
+    with pytest.raises(ValidationError):
+        decode_pings(bytes(body), PACKED)
+
+def test_batch_detection_timestamps_are_utc(ai_client: TestClient):
+    """Test fast-path responses carry an explicit UTC offset and broken packed ids are a 422"""
+    from src.ai_engine import main as ai_engine
+
+    rng = np.random.default_rng(0)
+    ai_engine.detector.model.fit(np.column_stack([
+        rng.normal(12.97, 0.01, 100), rng.normal(77.59, 0.01, 100), np.full(100, 5.0), np.zeros(100)
+    ]))
+    response = ai_client.post("/detect/batch", content=_encode(NDJSON), headers={"Content-Type": NDJSON})
+    assert response.status_code == 200
+    assert response.json()["timestamp"].endswith("+00:00")
+
+    body = bytearray(encode_packed([PINGS[0]]))
+    body[:32] = ("x" * 31).encode() + b"\xc3"
+    response = ai_client.post("/detect/batch", content=bytes(body), headers={"Content-Type": PACKED})
+    assert response.status_code == 422
+
+def test_parse_timestamp():
+    """Test ISO strings, naive strings and epoch numbers"""
+    assert parse_timestamp("2025-08-30T00:00:00Z") == 1756512000.0
+    assert parse_timestamp("2025-08-30T00:00:00") == 1756512000.0
+    assert parse_timestamp(1756512000) == 1756512000.0
+
+def test_geo_check_batch(geo_client: TestClient):
+    """Test vectorized batch fence checks over the packed format"""
+    fence = {
+        "id": "wire_fence", "name": "Wire Zone", "risk_level": "high",
+        "coordinates": [[12.9, 77.5], [12.9, 77.7], [13.1, 77.7], [13.1, 77.5], [12.9, 77.5]]
+    }
+    geo_client.post("/fence", json=fence)
+    try:
+        response = geo_client.post(
+            "/check/batch", content=_encode(PACKED), headers={"Content-Type": PACKED}
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert body["count"] == 2
+        assert [f["fence_id"] for f in body["in_fences"][0]] == ["wire_fence"]
+        assert body["in_fences"][1] == []
+
+        response = geo_client.post("/check/batch", content=b"not json", headers={"Content-Type": NDJSON})
+        assert response.status_code == 422
+    finally:
+        geo_client.delete("/fence/wire_fence")
+
+def test_detector_batch_matches_single(test_location_data):
+    """Test batch scoring agrees with single-ping scoring"""
+    from src.ai_engine.main import AnomalyDetector, LocationData
+
+    detector = AnomalyDetector(model_path="/nonexistent/model.joblib")
+    rng = np.random.default_rng(0)
+    training = [
+        LocationData(**dict(test_location_data, latitude=12.97 + d, longitude=77.59 + d))
+        for d in rng.normal(0, 0.01, 50)
+    ]
+    detector.model.fit(detector._extract_features(training))
+
+    columns = PingColumns.from_records(PINGS)
+    batch = detector.detect_batch(columns)
+    single = detector.detect_anomaly(LocationData(**PINGS[0]))
+    assert batch["anomaly_score"][0] == pytest.approx(single.details["anomaly_score"])
+    assert bool(batch["is_anomaly"][0]) == single.is_anomaly
+
+def test_location_data_rejects_bad_timestamp(ai_client: TestClient, test_location_data):
+    """Test timestamps are parsed during validation"""
+    response = ai_client.post("/detect", json=dict(test_location_data, timestamp="yesterday"))
+    assert response.status_code == 422